@@ -7,32 +7,15 @@ import importlib
 import sys
 import json
 import re
+import logging
+from contextlib import nullcontext
 from typing import Any, Dict, List, Callable, Union
 
-# --- Helper function for type conversion ---
-def get_python_type_to_json_type(py_type: Any) -> str:
-    """Converts Python type annotations to JSON schema types."""
-    if py_type is str:
-        return "string"
-    if py_type is int:
-        return "integer"
-    if py_type is float:
-        return "number"
-    if py_type is bool:
-        return "boolean"
-    # Basic support for list and dict; could be enhanced for typed lists/dicts
-    if py_type is list or getattr(py_type, '__origin__', None) is list:
-        return "array"
-    if py_type is dict or getattr(py_type, '__origin__', None) is dict:
-        return "object"
-    
-    # Default for unmapped or complex types (e.g., custom classes, Any, Union)
-    # The model might handle 'string' representation for these, or you might need more specific mapping.
-    return "string"
-
+logger = logging.getLogger(__name__)
 
 class OllamaHandler:
-    def __init__(self, base_url="http://localhost:11434/v1", api_key="ollama", tools_dir="tools"):
+    def __init__(self, base_url="http://localhost:11434/v1", api_key="ollama", tools_dir="tools", usage_tracker=None,
+                 runtime=None):
         """
         Initializes the OllamaHandler.
 
@@ -40,105 +23,39 @@ class OllamaHandler:
             base_url (str): The base URL for the Ollama OpenAI-compatible API.
             api_key (str): The API key for Ollama (conventionally 'ollama').
             tools_dir (str): The directory name where tool Python files are located.
+            usage_tracker (UsageTracker, optional): Receives the token usage of every turn.
+            runtime (OllamaRuntime, optional): Preloads and keeps the models warm and bounds concurrent requests.
         """
         try:
             self.client = openai.OpenAI(base_url=base_url, api_key=api_key)
             # Test connection
             self.client.models.list() 
-            print(f"Successfully connected to Ollama at {base_url}")
+            logger.info("Successfully connected to Ollama at %s", base_url)
         except openai.APIConnectionError as e:
-            print(f"Fatal: Could not connect to Ollama at {base_url}. Please ensure Ollama is running.")
-            print(f"Error details: {e}")
+            logger.error("Fatal: Could not connect to Ollama at %s. Please ensure Ollama is running.", base_url)
+            logger.error("Error details: %s", e)
             sys.exit(1)
             
         self.tools_dir = tools_dir
+        self.usage_tracker = usage_tracker
+        self.runtime = runtime
+        if runtime is not None:
+            # Pay the model load time now rather than on the first chat
+            runtime.start()
         self.tool_schemas = []
         self.callable_tools = {}  # Stores name -> function object
+        self.tool_specs = {}  # Stores name -> ToolSpec (schema and argument validator)
         self.reload_tools()
 
-    def _get_parameter_descriptions_from_docstring(self, docstring: str) -> Dict[str, str]:
-        """
-        Parses a docstring to extract parameter descriptions.
-        Assumes an "Args:" section like:
-        Args:
-            param_name (type): Description of param.
-            param_name: Description of param. (if type is omitted in description line)
-        """
-        if not docstring:
-            return {}
-        
-        descriptions = {}
-        # Regex to find "Args:" section and capture its content
-        args_section_match = re.search(r"Args:\s*\n((?:.|\n)*?)(?=\n\s*\w+:|$)", docstring, re.DOTALL)
-        
-        if args_section_match:
-            args_content = args_section_match.group(1)
-            # Regex for each parameter line: captures name and description
-            # Handles "param_name (type): description" or "param_name: description"
-            # Updated regex to better handle complex type hints like List[str] or Union[int, float]
-            param_matches = re.finditer(r"^\s*(\w+)\s*(?:\([\w.:\s,\[\]\<\>\|]+\))?:\s*(.+)$", args_content, re.MULTILINE)
-            for match in param_matches:
-                param_name = match.group(1)
-                description = match.group(2).strip()
-                descriptions[param_name] = description
-        return descriptions
-
     def convert_function_to_ollama_tool_schema(self, func: Callable) -> Dict[str, Any]:
         """
-        Converts a Python function into the Ollama/OpenAI tool JSON schema.
-        Parses the function's signature for parameters and types, and its
-        docstring for overall description and parameter descriptions.
+        Converts a Python function into the Ollama/OpenAI tool JSON schema, with nested types
+        (Optional, Union, Literal, typed lists and dicts) and the parameter descriptions of its docstring.
         """
-        func_name = func.__name__
-        docstring = inspect.getdoc(func)
-        
-        main_description = ""
-        if docstring:
-            # Use the first paragraph of the docstring as the main description
-            main_description = docstring.split('\n\n')[0].strip()
-
-        param_descriptions_from_docstring = self._get_parameter_descriptions_from_docstring(docstring)
-
-        sig = inspect.signature(func)
-        parameters = sig.parameters
-        
-        schema_parameters_properties = {}
-        required_params = []
-
-        for name, param in parameters.items():
-            param_type_annotation = param.annotation
-            if param_type_annotation is inspect.Parameter.empty:
-                # If no type hint, default to string or try to infer if possible.
-                # For simplicity, defaulting to string.
-                json_param_type = "string"
-                print(f"Warning: Parameter '{name}' in function '{func_name}' has no type hint. Defaulting to 'string'.")
-            else:
-                json_param_type = get_python_type_to_json_type(param_type_annotation)
-
-            param_description = param_descriptions_from_docstring.get(name, f"Parameter '{name}'")
-
-            schema_parameters_properties[name] = {
-                "type": json_param_type,
-                "description": param_description,
-            }
-            if param.default is inspect.Parameter.empty:
-                required_params.append(name)
-        
-        tool_parameters_schema = {
-            "type": "object",
-            "properties": schema_parameters_properties
-        }
-        if required_params:
-            tool_parameters_schema["required"] = required_params
-
-        return {
-            "type": "function",
-            "function": {
-                "name": func_name,
-                "description": main_description,
-                "parameters": tool_parameters_schema,
-            },
-        }
+        from tool_schema import ToolSpec
+        spec = ToolSpec(func)
+        self.tool_specs[spec.name] = spec
+        return spec.openai_tool()
 
     def reload_tools(self):
         """
@@ -147,9 +64,10 @@ class OllamaHandler:
         """
         self.tool_schemas = []
         self.callable_tools = {}
+        self.tool_specs = {}
         
         if not os.path.exists(self.tools_dir) or not os.path.isdir(self.tools_dir):
-            print(f"Tools directory '{self.tools_dir}' not found or is not a directory. No tools will be loaded.")
+            logger.warning("Tools directory '%s' not found or is not a directory. No tools will be loaded.", self.tools_dir)
             return
 
         # Ensure tools_dir is in sys.path to allow direct import if needed
@@ -181,31 +99,32 @@ class OllamaHandler:
                 try:
                     if full_module_path in sys.modules:
                         module = importlib.reload(sys.modules[full_module_path])
-                        print(f"Reloaded tool module: {full_module_path}")
+                        logger.debug("Reloaded tool module: %s", full_module_path)
                     else:
                         module = importlib.import_module(full_module_path)
-                        print(f"Loaded tool module: {full_module_path}")
+                        logger.debug("Loaded tool module: %s", full_module_path)
 
                     for name, obj in inspect.getmembers(module, inspect.isfunction):
                         # Ensure the function is defined in the loaded module, not imported into it.
-                        if obj.__module__ == module.__name__:
-                            print(f"  Found function: {name} in {module_name_on_disk}")
+                        if obj.__module__ == module.__name__ and not name.startswith("_"):
+                            logger.debug("Found function: %s in %s", name, module_name_on_disk)
                             try:
                                 schema = self.convert_function_to_ollama_tool_schema(obj)
                                 self.tool_schemas.append(schema)
                                 self.callable_tools[obj.__name__] = obj
-                                print(f"    Converted and added tool: {obj.__name__}")
+                                logger.debug("Converted and added tool: %s", obj.__name__)
                             except Exception as e_convert:
-                                print(f"    Error converting function {name} to schema: {e_convert}")
+                                logger.error("Error converting function %s to schema: %s", name, e_convert)
                 except ImportError as e_import:
-                    print(f"Error importing module {full_module_path} from {file_name}: {e_import}")
-                    print(f"  Ensure '{self.tools_dir}' and its parent directory are structured correctly and in PYTHONPATH if needed.")
+                    logger.error("Error importing module %s from %s: %s", full_module_path, file_name, e_import)
+                    logger.error("Ensure '%s' and its parent directory are structured correctly and in PYTHONPATH if needed.", self.tools_dir)
                 except Exception as e_load:
-                    print(f"Error loading tools from {file_name}: {e_load}")
+                    logger.error("Error loading tools from %s: %s", file_name, e_load)
         
-        print(f"Tools reloaded. {len(self.tool_schemas)} tools available: {list(self.callable_tools.keys())}")
+        logger.info("Tools reloaded. %d tools available: %s", len(self.tool_schemas), list(self.callable_tools.keys()))
 
-    def chat_with_tools(self, prompt: str, model: str = "llama3.1", system_message: str = None, max_tool_iterations: int = 5):
+    def chat_with_tools(self, prompt: str, model: str = "llama3.1", system_message: str = None, max_tool_iterations: int = 5,
+                        monitor=None):
         """
         Sends a prompt to the Ollama model, manages tool calls, and returns the final response.
 
@@ -214,6 +133,7 @@ class OllamaHandler:
             model (str): The Ollama model to use (e.g., "llama3.1").
             system_message (str, optional): An optional system message to guide the assistant.
             max_tool_iterations (int): Maximum number of tool call iterations to prevent infinite loops.
+            monitor (ProgressMonitor, optional): Stops repeated or stalled tool loops before max_tool_iterations.
 
         Returns:
             str: The final textual response from the assistant.
@@ -224,41 +144,50 @@ class OllamaHandler:
         messages.append({"role": "user", "content": prompt})
 
         print(f"\nUser: {prompt}")
+        if monitor is not None:
+            from progress_monitor import ESCALATE, HINT
+            monitor.start()
 
+        tool_failed = False
         for iteration in range(max_tool_iterations):
-            print(f"\n--- Iteration {iteration + 1} ---")
+            logger.debug("--- Iteration %d ---", iteration + 1)
             try:
                 current_tools = self.tool_schemas if self.tool_schemas else openai.NOT_GIVEN
                 # print(f"DEBUG: Sending to Ollama - Messages: {json.dumps(messages, indent=2)}")
                 # print(f"DEBUG: Sending to Ollama - Tools: {json.dumps(current_tools, indent=2) if current_tools is not openai.NOT_GIVEN else 'None'}")
 
-                response = self.client.chat.completions.create(
-                    model=model,
-                    messages=messages,
-                    tools=current_tools,
-                    tool_choice="auto" 
-                )
+                with self.runtime.slot(model) if self.runtime is not None else nullcontext():
+                    response = self.client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        tools=current_tools,
+                        tool_choice="auto" 
+                    )
             except openai.APIError as e: # Catches various API errors from Ollama
-                print(f"Error calling Ollama API: {e}")
+                logger.error("Error calling Ollama API: %s", e)
                 return f"Sorry, I encountered an API error while processing your request: {e.type if hasattr(e, 'type') else type(e).__name__}"
             except Exception as e: # Catch any other unexpected error during API call
-                print(f"An unexpected error occurred calling Ollama: {e}")
+                logger.error("An unexpected error occurred calling Ollama: %s", e)
                 return "Sorry, an unexpected error occurred."
 
             response_message = response.choices[0].message
+            if self.usage_tracker is not None and getattr(response, "usage", None) is not None:
+                from usage_tracker import usage_from_openai
+                self.usage_tracker.record(usage_from_openai(response.usage), model, session=f"ollama-{id(self):x}",
+                                          tool_triggered=iteration > 0, tool_failed=tool_failed)
             # print(f"DEBUG: Ollama Raw Response Message: {response_message}")
 
             messages.append(response_message) # Add assistant's response (or tool_calls) to history
 
             if response_message.tool_calls:
-                print(f"Assistant requested tool calls: {[tc.function.name for tc in response_message.tool_calls]}")
+                logger.info("Assistant requested tool calls: %s", [tc.function.name for tc in response_message.tool_calls])
                 
                 for tool_call in response_message.tool_calls:
                     function_name = tool_call.function.name
                     function_args_json = tool_call.function.arguments
                     
                     if function_name not in self.callable_tools:
-                        print(f"  Error: Model tried to call unknown function '{function_name}'")
+                        logger.error("Model tried to call unknown function '%s'", function_name)
                         tool_response_content = f"Error: Tool '{function_name}' not found or not callable."
                         messages.append({
                             "tool_call_id": tool_call.id,
@@ -268,41 +197,33 @@ class OllamaHandler:
                         })
                         continue 
 
+                    from tool_schema import ToolArgumentError
                     actual_function = self.callable_tools[function_name]
-                    print(f"  Executing tool: {function_name}")
-                    print(f"    Arguments (raw JSON from model): {function_args_json}")
+                    logger.info("Executing tool: %s", function_name)
+                    logger.debug("Arguments (raw JSON from model): %s", function_args_json)
 
                     try:
                         function_args = json.loads(function_args_json)
-                        # Validate arguments against function signature (optional but good practice)
-                        sig = inspect.signature(actual_function)
-                        valid_args = {}
-                        missing_required_args = []
-                        for p_name, p_val in sig.parameters.items():
-                            if p_name in function_args:
-                                valid_args[p_name] = function_args[p_name]
-                            elif p_val.default is inspect.Parameter.empty:
-                                missing_required_args.append(p_name)
-                        
-                        if missing_required_args:
-                            raise ValueError(f"Missing required arguments: {', '.join(missing_required_args)}")
-
-                        # Only pass arguments defined in the function signature
-                        # This prevents errors if the LLM hallucinates extra arguments.
-                        filtered_args = {k: v for k, v in function_args.items() if k in sig.parameters}
+                        # Checked and coerced against the tool's type hints before running it, every
+                        # problem is reported at once so the model can fix them in one turn
+                        filtered_args = self.tool_specs[function_name].validate(function_args)
 
                         function_response = actual_function(**filtered_args)
                         tool_response_content = str(function_response) # Ensure response is a string
-                        print(f"    Tool '{function_name}' executed. Response: {tool_response_content[:200]}{'...' if len(tool_response_content) > 200 else ''}")
+                        logger.debug("Tool '%s' executed. Response (%d chars): %.200s", function_name,
+                                     len(tool_response_content), tool_response_content)
                         
                     except json.JSONDecodeError:
-                        print(f"    Error: Could not decode arguments for {function_name}: {function_args_json}")
+                        logger.error("Could not decode arguments for %s: %s", function_name, function_args_json)
                         tool_response_content = f"Error: Invalid arguments format for {function_name}. Expected valid JSON."
+                    except ToolArgumentError as e:
+                        logger.warning("Invalid arguments for %s: %s", function_name, function_args)
+                        tool_response_content = f"Error: {e}"
                     except TypeError as e: # Catches issues with missing/extra arguments if not pre-validated thoroughly
-                         print(f"    Error: Type error calling function {function_name} with args {function_args}: {e}")
+                         logger.error("Type error calling function %s with args %s: %s", function_name, function_args, e)
                          tool_response_content = f"Error: Mismatch in arguments for tool {function_name}: {str(e)}"
                     except Exception as e:
-                        print(f"    Error executing function {function_name} with args {function_args}: {e}")
+                        logger.error("Error executing function %s with args %s: %s", function_name, function_args, e)
                         tool_response_content = f"Error: Failed to execute tool {function_name}: {str(e)}"
 
                     messages.append({
@@ -312,6 +233,23 @@ class OllamaHandler:
                         "content": tool_response_content, # Result from the function
                     })
                 # After processing all tool calls for this turn, loop back to send results to model
+                tool_failed = any(m["content"].startswith("Error") for m in messages[-len(response_message.tool_calls):])
+                if monitor is not None:
+                    turn_calls = [(tc.function.name, tc.function.arguments, m["content"])
+                                  for tc, m in zip(response_message.tool_calls, messages[-len(response_message.tool_calls):])]
+                    usage = getattr(response, "usage", None)
+                    verdict = monitor.observe(response_message.content, turn_calls, getattr(usage, "total_tokens", 0) or 0)
+                    if verdict is not None:
+                        action, detail = verdict
+                        if action == HINT:
+                            logger.warning("No progress detected, injecting a hint")
+                            messages.append({"role": "user", "content": detail})
+                        elif action == ESCALATE:
+                            logger.warning("No progress detected, escalating from %s to %s", model, detail)
+                            model = detail
+                        else:
+                            logger.warning("Stopping early: %s", detail)
+                            break
             
             elif response_message.content:
                 # No tool calls, model provided a direct textual answer
@@ -321,16 +259,21 @@ class OllamaHandler:
             
             else:
                 # No tool_calls and no content, unusual state.
-                print("Warning: Model response had no tool calls and no content. Ending interaction.")
+                logger.warning("Model response had no tool calls and no content. Ending interaction.")
                 return "I'm sorry, I could not produce a response."
 
-        print("Max tool iterations reached. Unable to complete the request fully.")
+        logger.warning("Max tool iterations reached. Unable to complete the request fully.")
         # Try to get the last message from the assistant if available
-        last_assistant_message = next((m['content'] for m in reversed(messages) if m['role'] == 'assistant' and m['content']), None)
+        # Assistant turns are stored as the message objects returned by the client, not as dicts
+        last_assistant_message = next((m.content for m in reversed(messages) if not isinstance(m, dict) and m.content), None)
         return last_assistant_message or "Sorry, I couldn't complete the request using tools within the allowed iterations."
 
 
 if __name__ == "__main__":
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+    from agent_logging import setup_logging
+    setup_logging()
+
     # --- Setup: Create dummy tools directory and tool files for testing ---
     TOOLS_DIR_NAME = "my_ollama_tools" # Using a distinct name for clarity
     if not os.path.exists(TOOLS_DIR_NAME):
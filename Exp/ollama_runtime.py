@@ -0,0 +1,169 @@
+# ollama_runtime.py
+# Keeps local Ollama models warm and bounds the number of concurrent requests.
+#
+# - preload(): loads every configured model at startup through the native API (an empty /api/generate
+#   request), so the first chat does not pay the model load time
+# - a background thread re-sends that request every ping_interval with keep_alive, so idle models are
+#   not unloaded between tasks (no cold starts later)
+# - slot(): at most `parallel` requests run at once (the server's OLLAMA_NUM_PARALLEL), the others queue
+# - load, queue and generation latencies are reported separately by stats()
+#
+# Only the standard library is used. Exp/ollama_stub_server.py can stand in for a real server.
+
+import json
+import logging
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyStats:
+    def __init__(self, window=500):
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def add(self, metric, model, seconds):
+        with self._lock:
+            self._samples[(metric, model)].append(seconds)
+
+    def summary(self):
+        with self._lock:
+            items = {key: sorted(samples) for key, samples in self._samples.items() if samples}
+        report = defaultdict(dict)
+        for (metric, model), ordered in items.items():
+            report[model][metric] = {
+                "count": len(ordered),
+                "p50": round(ordered[len(ordered) // 2], 4),
+                "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+                "max": round(ordered[-1], 4),
+            }
+        return dict(report)
+
+
+class OllamaRuntime:
+    def __init__(self, models, host="http://localhost:11434", keep_alive="30m", ping_interval=240.0,
+                 parallel=None, request_timeout=600.0):
+        """
+        Args:
+            models: Names of the models to preload and keep resident (e.g. ["llama3.1"]).
+            host: Base URL of the Ollama server (native API, without /v1).
+            keep_alive: How long the server keeps a model loaded after each request (Ollama duration string).
+            ping_interval: Seconds between keep-alive pings, must be shorter than keep_alive.
+            parallel: Concurrent requests allowed, defaults to OLLAMA_NUM_PARALLEL or 1.
+            request_timeout: Timeout of the HTTP requests sent by the runtime itself.
+        """
+        self.models = list(models)
+        self.host = host.rstrip("/")
+        self.keep_alive = keep_alive
+        self.ping_interval = ping_interval
+        self.parallel = parallel or int(os.environ.get("OLLAMA_NUM_PARALLEL", "1"))
+        self.request_timeout = request_timeout
+        self.stats = LatencyStats()
+        self._slots = threading.BoundedSemaphore(self.parallel)
+        self._queued = 0
+        self._active = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._pinger = None
+
+    def _post(self, path, payload):
+        request = urllib.request.Request(f"{self.host}{path}", data=json.dumps(payload).encode(),
+                                         headers={"Content-Type": "application/json"}, method="POST")
+        with urllib.request.urlopen(request, timeout=self.request_timeout) as response:
+            return json.loads(response.read() or b"{}")
+
+    def _get(self, path):
+        with urllib.request.urlopen(f"{self.host}{path}", timeout=self.request_timeout) as response:
+            return json.loads(response.read() or b"{}")
+
+    def load(self, model):
+        """Loads model (or refreshes its keep_alive if already loaded) and returns the load time in seconds."""
+        start = time.monotonic()
+        with self.slot(model, record=False):
+            result = self._post("/api/generate", {"model": model, "keep_alive": self.keep_alive})
+        # The server reports the time spent loading, in nanoseconds (0 when it was already resident)
+        load_seconds = result.get("load_duration", 0) / 1e9 if "load_duration" in result else time.monotonic() - start
+        return load_seconds
+
+    def preload(self):
+        for model in self.models:
+            try:
+                seconds = self.load(model)
+                self.stats.add("load", model, seconds)
+                logger.info("Preloaded %s in %.2fs", model, seconds)
+            except (urllib.error.URLError, OSError, ValueError) as e:
+                logger.error("Could not preload %s: %s", model, e)
+
+    def resident_models(self):
+        """Names of the models currently loaded by the server."""
+        try:
+            return {m["name"] for m in self._get("/api/ps").get("models", [])}
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            logger.warning("Could not list resident models: %s", e)
+            return set()
+
+    def _ping_loop(self):
+        while not self._stop.wait(self.ping_interval):
+            resident = self.resident_models()
+            for model in self.models:
+                try:
+                    seconds = self.load(model)
+                    if model not in resident and not any(name.split(":")[0] == model for name in resident):
+                        # The model had been unloaded anyway, this ping paid a full load
+                        self.stats.add("load", model, seconds)
+                        logger.info("Reloaded %s after it was unloaded (%.2fs)", model, seconds)
+                except (urllib.error.URLError, OSError, ValueError) as e:
+                    logger.warning("Keep-alive ping for %s failed: %s", model, e)
+
+    def start(self):
+        """Preloads the models and starts the keep-alive thread."""
+        self.preload()
+        if self.ping_interval and self._pinger is None:
+            self._pinger = threading.Thread(target=self._ping_loop, name="ollama-keepalive", daemon=True)
+            self._pinger.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._pinger is not None:
+            self._pinger.join(timeout=1)
+            self._pinger = None
+
+    @contextmanager
+    def slot(self, model, record=True):
+        """
+        Waits for one of the `parallel` server slots and holds it for the duration of the block.
+        The time spent waiting is recorded as "queue" and the time inside the block as "generation".
+        """
+        with self._lock:
+            self._queued += 1
+        start = time.monotonic()
+        self._slots.acquire()
+        waited = time.monotonic() - start
+        with self._lock:
+            self._queued -= 1
+            self._active += 1
+        if record:
+            self.stats.add("queue", model, waited)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            if record:
+                self.stats.add("generation", model, time.monotonic() - start)
+            with self._lock:
+                self._active -= 1
+            self._slots.release()
+
+    def load_state(self):
+        with self._lock:
+            return {"active": self._active, "queued": self._queued, "parallel": self.parallel}
+
+    def report(self):
+        return {"slots": self.load_state(), "latency": self.stats.summary()}
@@ -0,0 +1,135 @@
+# ollama_stub_server.py
+# Minimal stand-in for an Ollama server, to exercise OllamaHandler and OllamaRuntime without a GPU.
+# It implements the few endpoints they use, simulates model loading (the first request for a model,
+# or the first after its keep_alive expired, sleeps load_seconds) and generation time, and handles
+# at most `parallel` requests at once like a real server.
+#
+# Usage:
+#   python Exp/ollama_stub_server.py --port 11435 --load-seconds 2 --generate-seconds 0.5
+#   or StubOllamaServer(port=0).start() from Python (port 0 picks a free port, see .url)
+
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _parse_duration(value, default=300.0):
+    if value is None:
+        return default
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([smh]?)", str(value))
+    if not match:
+        return default
+    return float(match.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600}[match.group(2)]
+
+
+class StubOllamaServer:
+    def __init__(self, host="127.0.0.1", port=0, load_seconds=1.0, generate_seconds=0.2, parallel=1,
+                 reply="Hello from the stub server."):
+        self.load_seconds = load_seconds
+        self.generate_seconds = generate_seconds
+        self.reply = reply
+        self.loaded = {}  # model -> expiry timestamp
+        self.requests = []
+        self._slots = threading.Semaphore(parallel)
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.url = f"http://{host}:{self.httpd.server_address[1]}"
+        self._thread = None
+
+    def _ensure_loaded(self, model, keep_alive):
+        with self._lock:
+            resident = self.loaded.get(model, 0) > time.time()
+        load = 0.0
+        if not resident:
+            time.sleep(self.load_seconds)
+            load = self.load_seconds
+        with self._lock:
+            self.loaded[model] = time.time() + _parse_duration(keep_alive)
+        return load
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, payload, status=200):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _body(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(length) or b"{}")
+
+            def do_GET(self):
+                server.requests.append(("GET", self.path))
+                if self.path == "/api/ps":
+                    with server._lock:
+                        now = time.time()
+                        models = [{"name": m, "expires_at": e} for m, e in server.loaded.items() if e > now]
+                    self._send({"models": models})
+                elif self.path == "/v1/models":
+                    self._send({"object": "list", "data": [{"id": m, "object": "model"} for m in server.loaded]})
+                else:
+                    self._send({"error": "not found"}, 404)
+
+            def do_POST(self):
+                body = self._body()
+                server.requests.append(("POST", self.path))
+                model = body.get("model", "stub")
+                with server._slots:
+                    load = server._ensure_loaded(model, body.get("keep_alive"))
+                    if self.path == "/api/generate":
+                        if body.get("prompt"):
+                            time.sleep(server.generate_seconds)
+                        self._send({"model": model, "response": server.reply if body.get("prompt") else "",
+                                    "done": True, "load_duration": int(load * 1e9)})
+                    elif self.path == "/v1/chat/completions":
+                        time.sleep(server.generate_seconds)
+                        self._send({
+                            "id": f"chatcmpl-{uuid.uuid4().hex[:8]}", "object": "chat.completion",
+                            "created": int(time.time()), "model": model,
+                            "choices": [{"index": 0, "finish_reason": "stop",
+                                         "message": {"role": "assistant", "content": server.reply}}],
+                            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+                        })
+                    else:
+                        self._send({"error": "not found"}, 404)
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="ollama-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub Ollama server")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--load-seconds", type=float, default=1.0)
+    parser.add_argument("--generate-seconds", type=float, default=0.2)
+    parser.add_argument("--parallel", type=int, default=1)
+    args = parser.parse_args()
+    stub = StubOllamaServer(port=args.port, load_seconds=args.load_seconds,
+                            generate_seconds=args.generate_seconds, parallel=args.parallel)
+    print(f"Stub Ollama server listening on {stub.url}")
+    try:
+        stub.httpd.serve_forever()
+    except KeyboardInterrupt:
+        stub.stop()
@@ -0,0 +1,98 @@
+# Central logging setup for the agent.
+# Every module gets its own logger with logging.getLogger(__name__); this file only decides
+# where records go. Records are pushed onto a queue and written by a background listener
+# thread, so tool hot loops (read_directory, edit_file_lines, ...) never block on terminal I/O.
+#
+# Environment variables:
+#   EVOLVE_LOG_LEVEL  DEBUG / INFO / WARNING / ERROR (default INFO)
+#   EVOLVE_QUIET      if set to 1/true, only warnings and errors are shown (production mode)
+#   EVOLVE_LOG_FILE   optional file that receives every record at DEBUG level
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+LOG_FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+DATE_FORMAT = "%H:%M:%S"
+
+# Third party loggers that are too chatty at INFO (httpx logs every single request)
+NOISY_LOGGERS = ("httpx", "httpcore", "urllib3", "google_genai", "openai")
+
+_listener = None
+
+
+def _env_flag(name):
+    return os.environ.get(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def setup_logging(level=None, quiet=None, log_file=None):
+    """
+    Configures the root logger with a queue-based asynchronous handler.
+    Safe to call more than once, later calls replace the previous configuration.
+
+    Args:
+        level: Console log level name or number. Defaults to EVOLVE_LOG_LEVEL or INFO.
+        quiet: If True only warnings and errors reach the console. Defaults to EVOLVE_QUIET.
+        log_file: Optional path of a file receiving all records. Defaults to EVOLVE_LOG_FILE.
+
+    Returns:
+        The QueueListener that writes the records.
+    """
+    global _listener
+    if quiet is None:
+        quiet = _env_flag("EVOLVE_QUIET")
+    if level is None:
+        level = os.environ.get("EVOLVE_LOG_LEVEL", "INFO")
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+        if not isinstance(level, int):
+            level = logging.INFO
+    if quiet:
+        level = max(level, logging.WARNING)
+    if log_file is None:
+        log_file = os.environ.get("EVOLVE_LOG_FILE")
+
+    shutdown_logging()
+
+    formatter = logging.Formatter(LOG_FORMAT, DATE_FORMAT)
+    # Diagnostics go to stderr so they never mix with the model output on stdout
+    console = logging.StreamHandler(sys.stderr)
+    console.setLevel(level)
+    console.setFormatter(formatter)
+    handlers = [console]
+    root_level = level
+    if log_file:
+        file_handler = logging.FileHandler(log_file, encoding="utf-8")
+        file_handler.setLevel(logging.DEBUG)
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+        root_level = logging.DEBUG
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(root_level)
+    for name in NOISY_LOGGERS:
+        logging.getLogger(name).setLevel(max(level, logging.WARNING))
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """Flushes pending records and stops the background listener, if running."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,205 @@
+# Batch runner: streams tasks from a JSONL file and solves them with several concurrent agent sessions
+# sharing one client and one rate limit.
+#
+# Every input line is a JSON object. The task id is taken from "request_id" (or "id", or the line number)
+# and the prompt from "prompt", or from "title" and "body" like the entries of requests.jsonl.
+# Results are appended to the output JSONL as soon as each task ends; with --resume the tasks that
+# already have an "ok" result in the output file are skipped.
+#
+# Usage:
+#   python batch_runner.py requests.jsonl -o results.jsonl --concurrency 4 --resume
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from agent_logging import setup_logging
+from rate_limiter import RateLimiter
+from scheduler import BATCH, RequestScheduler
+from singleflight import SingleFlight
+from usage_tracker import UsageTracker
+
+logger = logging.getLogger(__name__)
+
+
+def iter_tasks(path):
+    """Yields (task_id, prompt, raw_task) from a JSONL file without loading it all in memory."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                task = json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.error("Skipping invalid JSON on line %d of %s: %s", line_number, path, e)
+                continue
+            task_id = str(task.get("request_id") or task.get("id") or line_number)
+            prompt = task.get("prompt")
+            if not prompt:
+                prompt = "\n\n".join(part for part in (task.get("title"), task.get("body")) if part)
+            yield task_id, prompt, task
+
+
+def load_completed(path):
+    """Returns the ids of the tasks that already have a successful result in the output file."""
+    completed = set()
+    if not os.path.exists(path):
+        return completed
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if result.get("status") == "ok":
+                completed.add(result["task_id"])
+    return completed
+
+
+class BatchStats:
+    def __init__(self):
+        self.start = time.monotonic()
+        self.done = 0
+        self.failed = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self._lock = threading.Lock()
+
+    def add(self, ok, usage):
+        with self._lock:
+            if ok:
+                self.done += 1
+            else:
+                self.failed += 1
+            self.prompt_tokens += usage.get("prompt_tokens", 0)
+            self.output_tokens += usage.get("output_tokens", 0)
+
+    def summary(self):
+        elapsed = max(time.monotonic() - self.start, 1e-9)
+        tasks = self.done + self.failed
+        tokens = self.prompt_tokens + self.output_tokens
+        return (f"{tasks} tasks ({self.failed} failed) in {elapsed:.1f}s | "
+                f"{tasks / elapsed * 60:.2f} tasks/min | "
+                f"{tokens / elapsed:.1f} tokens/s ({self.prompt_tokens} prompt, {self.output_tokens} output)")
+
+
+class BatchRunner:
+    def __init__(self, input_path, output_path, concurrency=2, model="gemini-2.0-flash",
+                 requests_per_minute=30, tokens_per_minute=None, resume=False, stats_interval=30.0,
+                 usage_log_path=None, scheduler=None):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.concurrency = concurrency
+        self.model = model
+        self.requests_per_minute = requests_per_minute
+        self.resume = resume
+        self.stats_interval = stats_interval
+        self.stats = BatchStats()
+        # Batch sessions only use the quota left over by interactive sessions sharing the same scheduler
+        self.scheduler = scheduler or RequestScheduler(
+            RateLimiter(requests_per_minute=requests_per_minute, tokens_per_minute=tokens_per_minute))
+        self.rate_limiter = self.scheduler.rate_limiter
+        self.usage_tracker = UsageTracker(log_path=usage_log_path)
+        # Sessions starting from the same prompt share their identical in-flight requests
+        self.singleflight = SingleFlight()
+        self._write_lock = threading.Lock()
+        self._report_lock = threading.Lock()
+        self._last_report = time.monotonic()
+        self._handler_lock = threading.Lock()
+        self._client = None
+        self._local = threading.local()
+
+    def _handler(self):
+        # One handler (one session) per worker thread, all sharing the client and the rate limiter
+        handler = getattr(self._local, "handler", None)
+        if handler is None:
+            from gemini_handler import GeminiHandler
+            with self._handler_lock:
+                handler = GeminiHandler(client=self._client, scheduler=self.scheduler, priority=BATCH,
+                                        usage_tracker=self.usage_tracker, singleflight=self.singleflight)
+                self._client = handler.client
+            self._local.handler = handler
+        return handler
+
+    def _write(self, record):
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._write_lock:
+            with open(self.output_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def _report_progress(self, force=False):
+        with self._report_lock:
+            if not force and time.monotonic() - self._last_report < self.stats_interval:
+                return
+            self._last_report = time.monotonic()
+        logger.info("Progress: %s", self.stats.summary())
+
+    def _run_one(self, task_id, prompt):
+        handler = None
+        start = time.monotonic()
+        record = {"task_id": task_id}
+        try:
+            # Inside the try: a session that cannot be created fails this task, it is not lost with the future
+            handler = self._handler()
+            output = handler.solve_task(prompt, model=self.model)
+            record.update(status="ok", output=output)
+        except Exception as e:
+            logger.exception("Task %s failed", task_id)
+            record.update(status="error", error=f"{type(e).__name__}: {e}")
+        record.update(session_id=handler.session_id if handler else None,
+                      duration=round(time.monotonic() - start, 3),
+                      usage=dict(handler.last_task_usage) if handler else {})
+        self._write(record)
+        self.stats.add(record["status"] == "ok", record["usage"])
+        logger.info("Task %s %s in %.1fs", task_id, record["status"], record["duration"])
+        self._report_progress()
+
+    def run(self):
+        completed = load_completed(self.output_path) if self.resume else set()
+        if completed:
+            logger.info("Resuming: %d tasks already completed", len(completed))
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="session") as pool:
+            pending = set()
+            for task_id, prompt, _ in iter_tasks(self.input_path):
+                if task_id in completed:
+                    continue
+                # Only read ahead a few tasks so huge input files are streamed, not loaded
+                while len(pending) >= self.concurrency * 2:
+                    _, pending = wait(pending, return_when=FIRST_COMPLETED)
+                pending.add(pool.submit(self._run_one, task_id, prompt))
+            wait(pending)
+        print(self.stats.summary())
+        print(self.usage_tracker.summary())
+        return self.stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve every task of a JSONL file with concurrent agent sessions.")
+    parser.add_argument("input", help="JSONL file with one task per line (e.g. requests.jsonl)")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="JSONL file receiving one result per task")
+    parser.add_argument("-c", "--concurrency", type=int, default=2, help="Number of concurrent agent sessions")
+    parser.add_argument("-m", "--model", default="gemini-2.0-flash")
+    parser.add_argument("--rpm", type=int, default=30, help="Requests per minute shared by all sessions")
+    parser.add_argument("--tpm", type=int, default=None, help="Tokens per minute shared by all sessions")
+    parser.add_argument("--usage-log", default=None, help="JSONL file receiving the token usage of every turn")
+    parser.add_argument("--resume", action="store_true", help="Skip the tasks already completed in the output file")
+    parser.add_argument("--stats-interval", type=float, default=30.0, help="Seconds between progress reports")
+    parser.add_argument("--quiet", action="store_true", help="Only log warnings and errors")
+    args = parser.parse_args(argv)
+
+    setup_logging(quiet=args.quiet or None)
+    runner = BatchRunner(args.input, args.output, concurrency=args.concurrency, model=args.model,
+                         requests_per_minute=args.rpm, tokens_per_minute=args.tpm, resume=args.resume,
+                         stats_interval=args.stats_interval, usage_log_path=args.usage_log)
+    stats = runner.run()
+    return 1 if stats.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,22 +1,46 @@
 # pip install google-genai
 
 import base64
+import json
+import logging
 import os
 import time
-from google import genai
-from google.genai import types
-from typing import Union
-from google.genai.types import FinishReason
-
-from Prompts.system_prompt_tool_calling import sys_promp_tool_calling
-from Prompts.system_prompt_main import prompt_main
+from typing import Any, Dict, List, Optional, Union
 
 import sys
 import inspect  # for finding functions
 import types as py_types  # to avoid conflict with `google.genai.types`
 import importlib # for dynamic import
+import importlib.util
 #  importlib.reload(config_module)  # This reloads the module from disk
 
+from agent_logging import setup_logging
+from lazy_import import lazy_functions, lazy_module
+from session_store import SessionStore
+from history_store import HistoryEntry, HistoryStore
+from tool_sandbox import ToolSandbox
+from rate_limiter import RateLimiter
+from prompt_cache import GeminiCacheBackend, PromptCache, tools_fingerprint
+from tool_selector import ToolSelector
+from hedging import Hedger
+from progress_monitor import ESCALATE, HINT, ProgressMonitor, STOP
+from usage_tracker import UsageTracker, usage_from_gemini
+from singleflight import SingleFlight, canonical_key
+from snapshot_store import default_store
+from tool_archive import default_archive, enable_tool_archive
+from tool_schema import ToolArgumentError, ToolSpec
+import tool_preflight
+from subagents import DEFAULT_OPTIONS as SUBAGENT_DEFAULTS, TokenBudget, run_subagents
+
+logger = logging.getLogger(__name__)
+
+# The SDK takes most of the startup time and the prompt is only needed for the first request, both are
+# imported on first use (python gemini_handler.py --profile-startup shows what importing this module costs)
+genai = lazy_module("google.genai")
+types = lazy_module("google.genai.types")
+prompts = lazy_module("Prompts.system_prompt_main")
+tool_benchmarks = lazy_module("tool_benchmarks")
+
 
 # Tips for Writing Effective Docstrings (usefull for automatic tool for gemini)
 # Start with a clear, concise summary of what the function does.
@@ -25,70 +49,293 @@ import importlib # for dynamic import
 # Mention examples when helpful.
 
 
+# Tools without side effects, concurrent identical calls to them are run only once
+COALESCED_TOOLS = ("create_structure", "read_directory", "read_file_range", "search_file", "read_terminal_output",
+                   "recall_memories", "read_archive")
+# Tool modules only loaded when the handler feature they go with (the attribute) is on
+FEATURE_TOOL_MODULES = {"snapshot_tools": "snapshot_store", "archive_tools": "tool_archive",
+                        "memory_tools": "memory"}
+# Tools that may change files, the workspace is snapshotted before a turn calling any of them
+WRITE_TOOLS = ("create_file", "edit_file_lines", "write_files", "run_shell_command", "restore_snapshot")
+
+
 class GeminiHandler:
-    def __init__(self):
-        self.client = genai.Client(
-            api_key=os.environ.get("GEMINI_API_KEY"),
-        )
-        self.rate_limit_per_minute = 30
-        self.last_request_time = time.time()
-        self.request_count = 0
+    def __init__(self, sessions_dir="sessions", history_size=5, history_spill_path=None,
+                 sandbox_tools=False, sandbox_options=None, client=None, rate_limiter=None, prompt_cache=None,
+                 tool_top_k=None, remember_tasks=False, hedging=False, hedge_options=None,
+                 progress_options=None, usage_tracker=None, scheduler=None, priority="interactive",
+                 max_queue_wait=None, singleflight=None, coalesced_tools=None, snapshots=False, subagents=None,
+                 depth=0, subagent_budget=None, preflight_tools=True, benchmark_tools=False,
+                 archive=False, memory=False, tools_from=None):
+        # Several handlers (concurrent sessions) can share one client and one rate limiter. Without one,
+        # the client (and the SDK) is only created when first needed
+        self._client = client
+        self.rate_limiter = rate_limiter or RateLimiter(requests_per_minute=30)
+        # With a shared RequestScheduler requests are admitted by priority class and fair share between
+        # sessions instead of first come first served (see scheduler.py)
+        self.scheduler = scheduler
+        self.priority = priority
+        self.max_queue_wait = max_queue_wait  # seconds a request may wait for admission before failing
+        if scheduler is not None:
+            self.rate_limiter = scheduler.rate_limiter
         # Retry configuration
         self.max_retries = 5
         self.initial_retry_delay = 5  # seconds
         self.max_retry_delay = 60  # seconds
+        # Identical concurrent model calls and read-only tool calls share one execution; pass the same
+        # SingleFlight to several handlers to coalesce across sessions
+        self.singleflight = singleflight or SingleFlight()
+        self.coalesced_tools = set(COALESCED_TOOLS if coalesced_tools is None else coalesced_tools)
+        # Optionally duplicate generate calls slower than the recent latency percentile (see hedging.py)
+        self.hedger = Hedger(**(hedge_options or {})) if hedging else None
 
+        # System prompt + tool declarations cached server side once per session (True for the Gemini backend,
+        # or a PromptCache instance, e.g. one backed by LocalCacheBackend)
+        if prompt_cache is True:
+            # The backend gets the client on its first cache, the SDK is not loaded at startup
+            prompt_cache = PromptCache(GeminiCacheBackend(client_factory=lambda: self.client))
+        self.prompt_cache = prompt_cache or None
+        self.tools_key = None
+        # With tool_top_k set only the most relevant tools (plus the pinned core ones) are attached per turn
+        self.tool_selector = ToolSelector(top_k=tool_top_k) if tool_top_k else None
+        self._task_tools = None
+        self._task_tools_scanned = 0
+
+        # Tool outputs longer than the archive's inline_chars are stored compressed outside the conversation,
+        # the model gets a preview and a handle for read_archive (True for the archive the tools read, which
+        # is the one to use, or a ToolArchive instance)
+        self.tool_archive = default_archive() if archive is True else (archive or None)
+        if self.tool_archive is not None:
+            # Before the sandbox workers start: they inherit the environment
+            enable_tool_archive()
+
+        # Optionally run tools in warm worker processes with CPU, memory and wall clock limits
+        # (True for a new sandbox, or a ToolSandbox shared with other handlers)
+        if isinstance(sandbox_tools, ToolSandbox):
+            self.tool_sandbox = sandbox_tools
+        else:
+            self.tool_sandbox = ToolSandbox(**(sandbox_options or {})) if sandbox_tools else None
+        # With subagents set (True or a dict overriding subagents.DEFAULT_OPTIONS) the model can split a task
+        # between concurrent child sessions with the spawn_subagents tool; depth is this handler's level
+        self.subagent_options = dict(SUBAGENT_DEFAULTS, **(subagents if isinstance(subagents, dict) else {})) \
+            if subagents else None
+        self.depth = depth
+        self.subagent_budget = subagent_budget
+        self.current_model = None
+        # Reloads are staged: new and changed tool modules are first imported in a subprocess with a time limit
+        # (preflight_tools: True for tool_preflight.PREFLIGHT_TIMEOUT, or seconds) and, with benchmark_tools
+        # (True, or the path of a baseline), benchmarked. One that fails keeps its last good version
+        self.preflight_timeout = tool_preflight.PREFLIGHT_TIMEOUT if preflight_tools is True else preflight_tools
+        self.benchmark_baseline = tool_benchmarks.BASELINE_PATH if benchmark_tools is True else (benchmark_tools or None)
+        self._tool_sources = {}  # module name -> source of the version loaded
+        self._rejected_sources = {}  # module name -> source of the last version that failed the check
+        self.tool_errors = {}  # module name -> why its current file is not the one loaded
+        # With memory the model gets the save_memory / recall_memories tools, and with remember_tasks the
+        # outcome of every task is saved to that long-term memory too (see tools/memory_tools.py)
+        self.remember_tasks = remember_tasks
+        self.memory = memory or remember_tasks
+        self.memory_store = None
+        # Workspace snapshot before every turn that writes files, so changes can be rolled back
+        # (True for the store the snapshot tools use, or a SnapshotStore instance)
+        self.snapshot_store = default_store() if snapshots is True else (snapshots or None)
+        if self.tool_selector is not None:
+            # Archived outputs and snapshots are referred to by handle whatever the task is about
+            self.tool_selector.pinned |= {name for name, feature in (("read_archive", self.tool_archive),
+                                                                     ("restore_snapshot", self.snapshot_store))
+                                          if feature is not None}
         self.tools_functions = []
-        self.reload_tools()
-        self.history = []  # Store last 5 model responses
+        if tools_from is not None:
+            # Sub-agents use the tools their parent loaded (tools_from is that handler)
+            self._share_tools(tools_from)
+        else:
+            self.reload_tools()
+        # Last `history_size` model turns, older ones are spilled to history_spill_path if given
+        self.history = HistoryStore(maxlen=history_size, spill_path=history_spill_path)
+        # Every solve_task is checkpointed here so it can be resumed with solve_task(resume=session_id)
+        self.session_store = SessionStore(sessions_dir)
+        self.session_id = None
+        # Per task loop/stall detection and turn, token and time budgets (see progress_monitor.py)
+        self.progress_options = progress_options or {}
+        # Token accounting per turn, task, session and model, can be shared between handlers
+        self.usage_tracker = usage_tracker or UsageTracker()
+        self.usage_session = f"handler-{id(self):x}"
+        # Token usage of the last solve_task call
+        self.last_task_usage = self.usage_tracker.task(None)
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = genai.Client(
+                api_key=os.environ.get("GEMINI_API_KEY"),
+            )
+        return self._client
 
     def reload_tools(self):
-        tools_functions = []
-        for file in os.listdir("tools"):
+        sources = {}
+        for file in sorted(os.listdir("tools")):
             if file.endswith(".py") and file != "__init__.py":
-                module_name = file[:-3]  # Remove .py
-                full_module_path = f"tools.{module_name}"
+                with open(os.path.join("tools", file), "r", encoding="utf-8") as f:
+                    sources[file[:-3]] = f.read()
+        for module_name, feature in FEATURE_TOOL_MODULES.items():
+            if not getattr(self, feature) and sources.pop(module_name, None) is not None:
+                logger.debug("Not loading tools/%s.py, %s is off", module_name, feature)
+        rejected = self._stage_tools(sources)
 
-                    # Import the module dynamically
+        tools_functions = []
+        for module_name, source in sources.items():
+            full_module_path = f"tools.{module_name}"
+            if module_name in rejected:
+                tools_functions.extend(self._previous_tools(module_name))
+                continue
+            self.tool_errors.pop(module_name, None)
+
+            try:
                 if full_module_path in sys.modules:
                     mod = importlib.reload(sys.modules[full_module_path])
                 else:
+                    # Modules not used yet are described from their source and imported on first call
+                    functions = lazy_functions(os.path.join("tools", f"{module_name}.py"), full_module_path)
+                    if functions is not None:
+                        logger.debug("Found %d functions in %s (not imported)", len(functions), full_module_path)
+                        tools_functions.extend(sorted(functions, key=lambda f: f.__name__))
+                        self._tool_sources[module_name] = source
+                        continue
                     mod = importlib.import_module(full_module_path)
+            except Exception as e:
+                # Only reached without a pre-flight check (or on the first load): the module is left out
+                logger.error("Could not load tools/%s.py: %s", module_name, e)
+                self.tool_errors[module_name] = f"{type(e).__name__}: {e}"
+                tools_functions.extend(self._previous_tools(module_name))
+                continue
+            self._tool_sources[module_name] = source
+
+            logger.debug("Reloaded %s", full_module_path)
 
-                print(f"Reloaded {full_module_path}")
+            # Get all public functions defined in that module (helpers are prefixed with _ and
+            # functions imported from elsewhere are not tools of this module)
+            for name, obj in inspect.getmembers(mod, inspect.isfunction):
+                if name.startswith("_") or obj.__module__ != mod.__name__:
+                    continue
+                logger.debug("Found function: %s", name)
+                tools_functions.append(obj)
 
-                # Get all functions defined in that module
-                for name, obj in inspect.getmembers(mod, inspect.isfunction):
-                    print(f"Found function: {name}")
-                    tools_functions.append(obj)
+        self._set_tools(tools_functions)
+        if self.tool_sandbox is not None:
+            # Also a sandbox shared with other handlers: its workers would keep running the old tool code
+            self.tool_sandbox.restart()
+        logger.info("Tools reloaded: %d functions available", len(tools_functions))
 
+    def _set_tools(self, tools_functions, specs=None):
+        """Installs the tool functions, reusing the ToolSpec of a function found in specs."""
+        if self.subagent_options and self.depth < self.subagent_options["max_depth"]:
+            tools_functions.append(self.spawn_subagents)
         self.tools_functions = tools_functions
-        print("Tools reloaded")
+        # Schemas and argument validators are built once here, not on every turn or call
+        self.tool_specs = {}
+        for func in tools_functions:
+            spec = (specs or {}).get(func.__name__)
+            if spec is not None and spec.func is func:
+                self.tool_specs[func.__name__] = spec
+                continue
+            try:
+                self.tool_specs[func.__name__] = ToolSpec(func)
+            except Exception as e:
+                logger.warning("Could not build the schema of %s: %s", func.__name__, e)
+        self._declarations = {}
+        # A different fingerprint makes the prompt cache create a new cached content on the next turn
+        self.tools_key = tools_fingerprint(tools_functions)
+        if self.tool_selector is not None:
+            self.tool_selector.build(tools_functions)
+
+    def _share_tools(self, other):
+        # The modules are neither reloaded nor imported again: they may be running tools for other sessions
+        self._tool_sources = dict(other._tool_sources)
+        self._rejected_sources = dict(other._rejected_sources)
+        self.tool_errors = dict(other.tool_errors)
+        self._set_tools([func for func in other.tools_functions
+                         if not isinstance(getattr(func, '__self__', None), GeminiHandler)], other.tool_specs)
+
+    def _stage_tools(self, sources):
+        """
+        Checks the new and changed tool modules before they replace the loaded ones: each is imported in a
+        short-lived subprocess (see tool_preflight.py), then benchmarked if benchmark_tools is set.
+
+        Returns:
+            The modules that failed, they keep their last good version (new ones are not loaded).
+        """
+        if not self._tool_sources:
+            return set()  # first load, there is no previous version to fall back to
+        changed = {m for m, source in sources.items() if source != self._tool_sources.get(m)}
+        rejected = {m for m in changed if self._rejected_sources.get(m) == sources[m]}  # already checked
+        failures = {}
+        if self.preflight_timeout and changed - rejected:
+            results = tool_preflight.preflight({m: sources[m] for m in changed - rejected},
+                                               timeout=self.preflight_timeout)
+            failures.update((m, [error]) for m, error in results.items() if error)
+        candidates = (changed - rejected - set(failures)) & set(self._tool_sources)
+        if self.benchmark_baseline and candidates:
+            regressions = tool_benchmarks.check_modules(candidates, self.benchmark_baseline)
+            failures.update((m, problems) for m, problems in regressions.items() if m in candidates)
+        for module_name, problems in failures.items():
+            action = "Keeping the previous version of" if module_name in self._tool_sources else "Not loading"
+            logger.warning("%s tools/%s.py, the new file failed its check:\n  %s",
+                           action, module_name, "\n  ".join(problems))
+            self._rejected_sources[module_name] = sources[module_name]
+            self.tool_errors[module_name] = "; ".join(problems)
+            rejected.add(module_name)
+        return rejected
+
+    def _previous_tools(self, module_name):
+        full_module_path = f"tools.{module_name}"
+        if module_name not in self._tool_sources:
+            return []
+        if full_module_path not in sys.modules:
+            # The functions are stand-ins that import the module on first call, it must not load the new file
+            importlib.import_module("tools")
+            path = os.path.abspath(os.path.join("tools", f"{module_name}.py"))
+            module = importlib.util.module_from_spec(importlib.util.spec_from_file_location(full_module_path, path))
+            sys.modules[full_module_path] = module
+            exec(compile(self._tool_sources[module_name], path, "exec"), module.__dict__)
+        return [f for f in self.tools_functions if f.__module__ == full_module_path]
     
-    def handle_rate_limit(self):
-        if time.time() - self.last_request_time > 60:
-            self.last_request_time = time.time()
-            self.request_count = 0
-        if self.request_count >= self.rate_limit_per_minute:
-            wait_time = 60 - (time.time() - self.last_request_time)
-            if wait_time > 0:
-                print(f"Rate limit reached. Waiting {wait_time:.2f} seconds...")
-                time.sleep(wait_time)
-            self.last_request_time = time.time()
-            self.request_count = 0
+    def handle_rate_limit(self, estimated_tokens=0):
+        if self.scheduler is not None:
+            deadline = time.monotonic() + self.max_queue_wait if self.max_queue_wait else None
+            return self.scheduler.acquire(self.usage_session, self.priority, estimated_tokens, deadline)
+        return self.rate_limiter.acquire(estimated_tokens)
     
-    def generate(self, model, contents, generate_content_config):
-        self.handle_rate_limit()
-        self.request_count += 1
+    def generate(self, model, contents, generate_content_config, estimated_tokens=0):
+        """
+        Returns (response, shared): callers waiting on an identical in-flight request neither send it again nor
+        take quota, and get shared=True so they do not account its usage a second time.
+        """
+        key = canonical_key("generate", model, contents, generate_content_config)
+        return self.singleflight.do_shared(
+            key, lambda: self._generate(model, contents, generate_content_config, estimated_tokens))
+
+    def _generate(self, model, contents, generate_content_config, estimated_tokens=0):
+        # Admission is based on the projected token cost, corrected with the real one afterwards
+        reservation = self.handle_rate_limit(estimated_tokens)
         retry_count = 0
         retry_delay = self.initial_retry_delay
         while True:
             try:
-                response = self.client.models.generate_content(
-                    model=model,
-                    contents=contents,
-                    config=generate_content_config,
-                )
+                def request():
+                    return self.client.models.generate_content(
+                        model=model,
+                        contents=contents,
+                        config=generate_content_config,
+                    )
+                if self.hedger is not None:
+                    # A hedge is a real request, it takes its own slot from the rate limiter and its tokens count
+                    response = self.hedger.call(
+                        request, before_hedge=lambda: self.handle_rate_limit(estimated_tokens),
+                        after_hedge=lambda hedge_reservation, hedge_response: self._settle_hedge(
+                            model, hedge_reservation, hedge_response))
+                else:
+                    response = request()
+                usage = usage_from_gemini(getattr(response, 'usage_metadata', None))
+                self.rate_limiter.settle(reservation, usage['total_tokens'] or estimated_tokens)
                 return response
             except (genai.errors.ServerError, genai.errors.ClientError) as e:
                 error_str = str(e)
@@ -108,24 +355,30 @@ class GeminiHandler:
                     # Use suggested delay if available, otherwise use exponential backoff
                     if suggested_delay:
                         retry_delay = suggested_delay
-                        print(f"\n⚠️ Quota exceeded. API suggested waiting {retry_delay} seconds.")
+                        logger.warning("Quota exceeded. API suggested waiting %s seconds.", retry_delay)
                     else:
-                        print(f"\n⚠️ {'Model overloaded' if is_overloaded else 'Quota exceeded'}. Waiting {retry_delay} seconds before retry {retry_count}/{self.max_retries}...")
+                        logger.warning("%s. Waiting %s seconds before retry %d/%d...",
+                                       'Model overloaded' if is_overloaded else 'Quota exceeded',
+                                       retry_delay, retry_count, self.max_retries)
                     time.sleep(retry_delay)
                     # Exponential backoff with maximum cap for next retry (if needed)
                     if not suggested_delay:
                         retry_delay = min(retry_delay * 1.5, self.max_retry_delay)
-                    print("Retrying...")
+                    logger.info("Retrying...")
                 else:
                     # Re-raise if error type not handled or we've exceeded max retries
                     error_type = "model overload" if is_overloaded else "quota exceeded" if is_quota_exceeded else "API"
-                    print(f"\n❌ {error_type.capitalize()} error after {retry_count} retries: {e}")
+                    logger.error("%s error after %d retries: %s", error_type.capitalize(), retry_count, e)
                     raise
    
+    def _settle_hedge(self, model, reservation, response):
+        usage = usage_from_gemini(getattr(response, 'usage_metadata', None))
+        self.rate_limiter.settle(reservation, usage['total_tokens'])
+        if response is not None:
+            self.usage_tracker.record(usage, model, task=self.session_id, session=self.usage_session, hedge=True)
+
     def _add_to_history(self, entry):
         self.history.append(entry)
-        if len(self.history) > 5:
-            self.history = self.history[-5:]
 
     def _extract_text_from_candidate(self, candidate):
         # Extract all text parts from the candidate
@@ -143,82 +396,346 @@ class GeminiHandler:
             parts = candidate.parts
         return [p for p in parts if hasattr(p, 'function_call') and p.function_call]
 
+    @staticmethod
+    def _to_response_payload(result):
+        # function_response parts carry a JSON object: dicts are sent as they are, anything else is wrapped
+        payload = result if isinstance(result, dict) else {'result': result}
+        return json.loads(json.dumps(payload, default=str))
+
+    def _call_tool(self, func, args):
+        # Tools that are methods of the handler (spawn_subagents) always run in process
+        if self.tool_sandbox is not None and getattr(func, '__self__', None) is not self:
+            return self.tool_sandbox.call(func.__module__, func.__name__, dict(args))
+        return func(**args)
+
     def _run_tool(self, function_call):
-        # Find the function by name
+        # Find the function by name, the result is the JSON payload of the function_response part
         func_name = function_call.name
         args = function_call.args or {}
         for func in self.tools_functions:
             if func.__name__ == func_name:
+                spec = self.tool_specs.get(func_name)
+                if spec is not None:
+                    # Bad arguments are reported (all at once) without running the tool
+                    try:
+                        args = spec.validate(args)
+                    except ToolArgumentError as e:
+                        return {'error': str(e)}
                 try:
-                    result = func(**args)
-                    return str(result)
+                    if func_name in self.coalesced_tools:
+                        key = canonical_key("tool", func.__module__, func_name, dict(args))
+                        result = self.singleflight.do(key, lambda: self._call_tool(func, args))
+                    else:
+                        result = self._call_tool(func, args)
+                    return self._to_response_payload(result)
                 except Exception as e:
-                    return f"Tool '{func_name}' failed: {e}"
-        return f"Tool '{func_name}' not found."
+                    return {'error': f"Tool '{func_name}' failed: {e}"}
+        return {'error': f"Tool '{func_name}' not found."}
 
-    def solve_task(self, prompt, model="gemini-2.0-flash"):
-        print("Generating response to: ", prompt, "\n...")
-        conversation = []
-        finished = False
-        while not finished:
-            # Compose contents from conversation history
-            contents = []
-            for entry in conversation:
-                if entry['role'] == 'user':
-                    contents.append(types.Content(role="user", parts=[types.Part.from_text(text=entry['content'])]))
-                elif entry['role'] == 'model':
-                    # Model response may be text or tool result
-                    contents.append(types.Content(role="model", parts=[types.Part.from_text(text=entry['content'])]))
-            if not conversation:
-                contents.append(types.Content(role="user", parts=[types.Part.from_text(text=prompt)]))
-
-            generate_content_config = types.GenerateContentConfig(
+    @staticmethod
+    def _entry_to_content(entry):
+        # Conversation entries are plain JSON (so they can be checkpointed) holding text,
+        # function_call and function_response parts
+        if 'content' in entry:
+            # Sessions recorded before tool results were sent as native parts
+            return types.Content(role=entry['role'], parts=[types.Part.from_text(text=entry['content'])])
+        parts = []
+        for part in entry['parts']:
+            if 'text' in part:
+                parts.append(types.Part.from_text(text=part['text']))
+            elif 'function_call' in part:
+                call = part['function_call']
+                parts.append(types.Part.from_function_call(name=call['name'], args=call['args']))
+            elif 'function_response' in part:
+                response = part['function_response']
+                parts.append(types.Part.from_function_response(name=response['name'], response=response['response']))
+        return types.Content(role=entry['role'], parts=parts)
+
+    def _select_tools(self, prompt, conversation):
+        # The subset is chosen once per task from the prompt and afterwards only grows with the tools the model
+        # calls, so the declarations (and the prompt cache keyed on them) stay the same from turn to turn
+        if self.tool_selector is None:
+            return self.tools_functions
+        called = set()
+        for entry in conversation[self._task_tools_scanned:]:
+            for part in entry.get('parts', []):
+                if 'function_call' in part:
+                    called.add(part['function_call']['name'])
+        self._task_tools_scanned = len(conversation)
+        if self._task_tools is None:
+            self._task_tools = {func.__name__ for func in self.tool_selector.select(prompt or "", called)}
+        self._task_tools |= called
+        return [func for func in self.tools_functions if func.__name__ in self._task_tools]
+
+    def _tool_declarations(self, tools):
+        # One types.Tool per distinct tool selection, built from the precomputed JSON schemas
+        key = tuple(func.__name__ for func in tools)
+        if key not in self._declarations:
+            declarations = []
+            for func in tools:
+                spec = self.tool_specs.get(func.__name__)
+                if spec is None:
+                    declarations.append(types.FunctionDeclaration.from_callable(client=self.client, callable=func))
+                else:
+                    declaration = spec.declaration()
+                    declarations.append(types.FunctionDeclaration(
+                        name=declaration['name'], description=declaration['description'],
+                        parameters_json_schema=declaration['parameters']))
+            self._declarations[key] = [types.Tool(function_declarations=declarations)] if declarations else None
+        return self._declarations[key]
+
+    def _build_config(self, model, tools=None):
+        if tools is None:
+            tools = self.tools_functions
+        cached_content = None
+        if self.prompt_cache is not None:
+            tools_key = self.tools_key if tools is self.tools_functions else tools_fingerprint(tools)
+            cached_content = self.prompt_cache.get(model, prompts.prompt_main, tools, tools_key)
+        if cached_content:
+            # System instruction and tools are already part of the cached content
+            return types.GenerateContentConfig(
                 stop_sequences=[
                     """!FINISHED_TASK!""",
                 ],
-                tools=self.tools_functions,
-                system_instruction=[
-                    types.Part.from_text(text=prompt_main),
-                ],
+                cached_content=cached_content,
+                automatic_function_calling=types.AutomaticFunctionCallingConfig(disable=True),
             )
+        return types.GenerateContentConfig(
+            stop_sequences=[
+                """!FINISHED_TASK!""",
+            ],
+            tools=self._tool_declarations(tools),
+            system_instruction=[
+                types.Part.from_text(text=prompts.prompt_main),
+            ],
+            # Tool calls are run by solve_task so their results stay in the conversation
+            automatic_function_calling=types.AutomaticFunctionCallingConfig(disable=True),
+        )
+
+    def _remember_outcome(self, prompt, outcome):
+        try:
+            if self.memory_store is None:
+                from memory_store import MemoryStore
+                self.memory_store = MemoryStore()
+            self.memory_store.add(f"Task: {prompt}\nOutcome: {outcome}", kind="task_outcome",
+                                  metadata={"session_id": self.session_id, "turns": self.last_task_usage['turns']})
+        except Exception as e:
+            logger.warning("Could not save the task outcome to memory: %s", e)
+
+    def _estimate_tokens(self, conversation, last_usage, new_from):
+        # Projected prompt of the next request: the previous prompt, the model's answer to it (its output)
+        # and the entries added after that answer, tool results and hints (roughly 4 characters per token)
+        added = sum(len(json.dumps(entry.get('parts', entry), default=str)) // 4
+                    for entry in conversation[new_from:] if entry.get('role') != 'model')
+        if last_usage:
+            return last_usage['prompt_tokens'] + last_usage['output_tokens'] + added
+        return (len(prompts.prompt_main) // 4) + added + 256 * len(self.tools_functions) + 512
 
-            response = self.generate(model, contents, generate_content_config)
+    def spawn_subagents(self, tasks: List[str], context: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Splits work between sub-agents: every task is solved by a separate agent session, all running at the same
+        time, and their concise answers are returned. Use it for large jobs made of independent parts (e.g. reviewing
+        every module of a project), each task must be understandable on its own.
+
+        Args:
+            tasks: The independent tasks, one per sub-agent, each a complete self-contained instruction.
+            context: Optional information all the sub-agents need (e.g. the goal of the overall task, paths, conventions).
+
+        Returns:
+            One entry per task, in the same order, with the task, its status ('ok', 'error' or 'skipped'), the
+            sub-agent's answer (result) or error, and the turns and tokens it used.
+        """
+        return run_subagents(self, tasks, context)
+
+    @staticmethod
+    def _emit(on_event, event_type, **data):
+        if on_event is None:
+            return
+        try:
+            on_event({'type': event_type, **data})
+        except Exception as e:
+            logger.warning("on_event callback failed: %s", e)
+
+    def solve_task(self, prompt=None, model="gemini-2.0-flash", resume=None, on_event=None):
+        """
+        Runs the agent loop until the model finishes the task.
+
+        on_event, if given, is called from this thread with a dict for every step of the task: 'start'
+        (session_id, prompt, model), 'turn' (turn, text, tool_calls, usage), 'monitor' (action, detail)
+        and 'finished' (session_id, result, usage).
+        """
+        conversation = []
+        turn = 0
+        estimated_from = 0  # conversation entries from here on are not counted in last_usage
+        text = None
+        last_usage = None
+        tool_triggered = False
+        tool_failed = False
+        if resume:
+            # Continue from the last completed turn without replaying any model call
+            session = self.session_store.load(resume)
+            prompt = session["prompt"]
+            model = session["model"] or model
+            conversation = session["conversation"]
+            turn = session["turns"]
+            # The task may have been escalated to another model before the interruption
+            model = session["state"].get("model", model)
+            last_usage = session["state"].get("usage")
+            # The entries not covered by last_usage are the ones of the last turn
+            estimated_from = session["state"].get("usage_from", len(conversation) if last_usage else 0)
+            self.session_id = resume
+            if session["finished"]:
+                logger.info("Session %s is already finished", resume)
+                last = conversation[-1] if conversation else {}
+                result = last.get('content') or "".join(p.get('text', '') for p in last.get('parts', [])) or None
+                self._emit(on_event, 'finished', session_id=resume, result=result, usage=None)
+                return result
+            if not conversation or conversation[0]['role'] != 'user':
+                conversation.insert(0, {'role': 'user', 'parts': [{'text': prompt}]})
+            logger.info("Resuming session %s at turn %d: %s", resume, turn, prompt)
+        else:
+            conversation = [{'role': 'user', 'parts': [{'text': prompt}]}]
+            self.session_id = self.session_store.new_session_id()
+            self.session_store.start(self.session_id, prompt, model)
+            logger.info("Generating response to: %s (session %s)", prompt, self.session_id)
+        self._emit(on_event, 'start', session_id=self.session_id, prompt=prompt, model=model, resumed=bool(resume))
+        self.current_model = model
+        self._task_tools = None  # names of the tools attached during this task (see _select_tools)
+        self._task_tools_scanned = 0
+        if self.subagent_options and self.depth == 0:
+            # The sub-agent token budget is shared by the whole tree of this task
+            self.subagent_budget = TokenBudget(self.subagent_options["token_budget"])
+        # Entries not yet written to the session log (the prompt, for a new session)
+        new_entries = list(conversation) if not resume else []
+        monitor = ProgressMonitor(**self.progress_options)
+        if resume:
+            # The budgets cover the whole task, not just the part after the interruption
+            monitor.restore(session["state"].get("monitor", {}))
+        self.last_task_usage = self.usage_tracker.task(self.session_id)
+        finished = False
+        while not finished:
+            contents = [self._entry_to_content(entry) for entry in conversation]
+            estimated_tokens = self._estimate_tokens(conversation, last_usage, estimated_from)
+            estimated_from = len(conversation)
+
+            generate_content_config = self._build_config(model, self._select_tools(prompt, conversation))
+
+            request_start = time.time()
+            response, shared = self.generate(model, contents, generate_content_config, estimated_tokens)
+            request_duration = time.time() - request_start
+            last_usage = usage_from_gemini(getattr(response, 'usage_metadata', None))
+            if not shared:
+                # The tokens of a coalesced request are recorded once, by the session that sent it
+                self.usage_tracker.record(last_usage, model, task=self.session_id, session=self.usage_session,
+                                          tool_triggered=tool_triggered, tool_failed=tool_failed)
+            self.last_task_usage = self.usage_tracker.task(self.session_id)
             candidate = response.candidates[0]
             finish_reason = candidate.finish_reason
             text = self._extract_text_from_candidate(candidate)
             function_calls = self._extract_function_calls(candidate)
 
+            model_parts = [{'text': text}] if text else []
+            tool_results = []
+            snapshot_id = None
+            if self.snapshot_store is not None and any(fc.function_call.name in WRITE_TOOLS for fc in function_calls):
+                try:
+                    snapshot_id = self.snapshot_store.snapshot(
+                        label=f"session {self.session_id} turn {turn}: before "
+                              f"{', '.join(fc.function_call.name for fc in function_calls)}")
+                except Exception as e:
+                    logger.warning("Could not snapshot the workspace: %s", e)
             if function_calls:
-                # There may be multiple tool calls in one response
-                tool_results = []
+                # There may be multiple tool calls in one response, each gets its own function_response part
+                response_parts = []
+                tool_summaries = []
                 for fc in function_calls:
+                    args = dict(fc.function_call.args or {})
                     tool_result = self._run_tool(fc.function_call)
-                    tool_results.append(f"Tool call: {fc.function_call.name}({fc.function_call.args})\nResult: {tool_result}")
-                # Combine tool call and model follow-up as one history entry
-                combined = (text + "\n" if text else "") + "\n".join(tool_results)
-                print(combined)
-                conversation.append({'role': 'model', 'content': combined})
-                self._add_to_history(combined)
+                    if self.tool_archive is not None and fc.function_call.name != "read_archive":
+                        tool_result = self.tool_archive.shrink(fc.function_call.name, tool_result)
+                    model_parts.append({'function_call': {'name': fc.function_call.name, 'args': args}})
+                    response_parts.append({'function_response': {'name': fc.function_call.name, 'response': tool_result}})
+                    tool_results.append({'name': fc.function_call.name, 'args': args, 'result': tool_result})
+                    tool_summaries.append(f"Tool call: {fc.function_call.name}({json.dumps(args, default=str)})\n"
+                                          f"Result: {json.dumps(tool_result, separators=(',', ':'))}")
+                summary = (text + "\n" if text else "") + "\n".join(tool_summaries)
+                entries = [{'role': 'model', 'parts': model_parts}, {'role': 'user', 'parts': response_parts}]
             else:
-                print(text)
-                conversation.append({'role': 'model', 'content': text})
-                self._add_to_history(text)
+                summary = text
+                entries = [{'role': 'model', 'parts': model_parts or [{'text': ''}]}]
+            print(summary)
+            self._emit(on_event, 'turn', turn=turn, text=text,
+                       tool_calls=[{'name': r['name'], 'args': r['args']} for r in tool_results], usage=last_usage)
+            self._add_to_history(HistoryEntry(
+                role='model',
+                content=summary,
+                tool_calls=[r['name'] for r in tool_results],
+                duration=request_duration,
+                prompt_tokens=last_usage['prompt_tokens'],
+                output_tokens=last_usage['output_tokens'],
+            ))
+            conversation.extend(entries)
+            new_entries.extend(entries)
 
-            if finish_reason == FinishReason.STOP or (text and "!FINISHED_TASK!" in text):
+            # A turn that called tools also ends with STOP, the model must still see the results
+            if not function_calls and (finish_reason == types.FinishReason.STOP or (text and "!FINISHED_TASK!" in text)):
                 finished = True
             else:
+                verdict = monitor.observe(text, [(r['name'], r['args'], r['result']) for r in tool_results],
+                                          last_usage['total_tokens'])
+                if verdict is not None:
+                    action, detail = verdict
+                    self._emit(on_event, 'monitor', action=action, detail=detail)
+                    if action == HINT:
+                        logger.warning("No progress detected, injecting a hint")
+                        hint_part = {'text': detail}
+                        if conversation[-1]['role'] == 'user':
+                            # Keep user/model turns alternating: the hint joins the function responses
+                            conversation[-1]['parts'].append(hint_part)
+                        else:
+                            hint_entry = {'role': 'user', 'parts': [hint_part]}
+                            conversation.append(hint_entry)
+                            new_entries.append(hint_entry)
+                    elif action == ESCALATE:
+                        logger.warning("No progress detected, escalating from %s to %s", model, detail)
+                        model = detail
+                        self.current_model = model
+                    elif action == STOP:
+                        logger.warning("Stopping task early: %s", detail)
+                        finished = True
+            self.session_store.append_turn(self.session_id, turn, new_entries, tool_results, finished,
+                                           state={'model': model, 'usage': last_usage, 'usage_from': estimated_from,
+                                                  'snapshot': snapshot_id, 'monitor': monitor.state()})
+            # The next request exists only to hand the tool results back to the model
+            tool_triggered = bool(function_calls)
+            tool_failed = any('error' in r['result'] for r in tool_results)
+            new_entries = []
+            turn += 1
+            if not finished:
                 # Continue the loop, possibly after a short delay
                 time.sleep(0.5)
 
-        print("Finished")
-        print("\n--- Last 5 model responses (history) ---")
-        for idx, h in enumerate(self.history, 1):
-            print(f"[{idx}] {h}\n")
+        logger.info("Finished")
+        self._emit(on_event, 'finished', session_id=self.session_id, result=text, usage=dict(self.last_task_usage))
+        if self.remember_tasks:
+            self._remember_outcome(prompt, text)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("--- Last %d model responses (history) ---", len(self.history))
+            for idx, h in enumerate(self.history, 1):
+                logger.debug("[%d] %s", idx, h.content)
+        return text
             
 
 if __name__ == "__main__":
+    if "--profile-startup" in sys.argv:
+        from startup_profile import main
+        sys.exit(main(sys.argv[1:]))
+    setup_logging()
     #generate("Repeat !FINISHED_TASK!")
     gemini_handler = GeminiHandler()
     #gemini_handler.solve_task("Calculate 5 * 4, then add 3 to the result. Use tools i don't want you to calculate alone.")
     #gemini_handler.solve_task("You want to create a memory system for yourself. This is a one shot operation so you can't talk to anybody to ask confirmation")
-    gemini_handler.solve_task("You are now alive")
\ No newline at end of file
+    if len(sys.argv) > 2 and sys.argv[1] == "--resume":
+        gemini_handler.solve_task(resume=sys.argv[2])
+    else:
+        gemini_handler.solve_task("You are now alive")
\ No newline at end of file
@@ -0,0 +1,147 @@
+# Hedged requests.
+# Most generate calls answer in a few seconds but a few take much longer. Hedger tracks a rolling
+# latency percentile; when a call is still running past it, a duplicate is sent and whichever answer
+# arrives first is used (the other one is ignored, a running HTTP call cannot be cancelled). A budget
+# caps hedges to a fraction of all requests so a slow period cannot double the quota usage.
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, p):
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+class Hedger:
+    def __init__(self, percentile=0.95, budget=0.1, min_samples=10, window=200, min_delay=1.0, max_workers=8):
+        """
+        Args:
+            percentile: A call still running after this latency percentile gets hedged.
+            budget: Maximum fraction of requests that may be hedged (0.1 = at most 1 hedge every 10 calls).
+            min_samples: No hedging until this many latencies were observed.
+            window: Number of recent latencies the percentile is computed on.
+            min_delay: Never hedge before this many seconds, whatever the percentile says.
+            max_workers: Threads used to run the calls and their hedges.
+        """
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.latencies = LatencyTracker(window)
+        self._credit = 1.0  # allows one hedge right after warm-up
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def threshold(self):
+        if len(self.latencies) < self.min_samples:
+            return None
+        return max(self.min_delay, self.latencies.percentile(self.percentile))
+
+    def _take_budget(self):
+        with self._lock:
+            if self._credit >= 1.0:
+                self._credit -= 1.0
+                return True
+            return False
+
+    def _timed(self, fn):
+        start = time.monotonic()
+        result = fn()
+        return result, time.monotonic() - start
+
+    def call(self, fn, before_hedge=None, after_hedge=None):
+        """
+        Runs fn(), hedging it with a second fn() if it is slower than the threshold.
+
+        Args:
+            fn: Callable doing the request.
+            before_hedge: Called before sending a hedge (e.g. to take a slot from the rate limiter), what it
+                returns is passed to after_hedge.
+            after_hedge: Called as after_hedge(reservation, result) once the hedge is over, even if it lost
+                the race (possibly after call() returned, from a worker thread). result is None if the hedge
+                failed or was not sent because the call finished while before_hedge was waiting.
+
+        Returns:
+            The result of the first call that succeeds. If every call fails the first error is raised.
+        """
+        with self._lock:
+            self.requests += 1
+            self._credit = min(self._credit + self.budget, 1.0 + self.budget)
+        threshold = self.threshold()
+        primary = self._executor.submit(self._timed, fn)
+        if threshold is None:
+            result, latency = primary.result()
+            self.latencies.add(latency)
+            return result
+        done, _ = wait([primary], timeout=threshold)
+        if done or not self._take_budget():
+            result, latency = primary.result()
+            self.latencies.add(latency)
+            return result
+
+        logger.info("Request slower than %.2fs (p%d), sending a hedge", threshold, int(self.percentile * 100))
+        reservation = before_hedge() if before_hedge is not None else None
+        if primary.done():
+            # Waiting for the rate limiter can take longer than the call itself
+            if after_hedge is not None:
+                after_hedge(reservation, None)
+            result, latency = primary.result()
+            self.latencies.add(latency)
+            return result
+        with self._lock:
+            self.hedges += 1
+        hedge = self._executor.submit(self._timed, fn)
+        if after_hedge is not None:
+            hedge.add_done_callback(lambda future: self._after_hedge(after_hedge, reservation, future))
+        pending = {primary, hedge}
+        first_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    first_error = first_error or future.exception()
+                    continue
+                result, latency = future.result()
+                if future is hedge:
+                    with self._lock:
+                        self.hedge_wins += 1
+                    # The primary took at least threshold + latency, record that rather than the hedge alone
+                    latency += threshold
+                self.latencies.add(latency)
+                return result
+        raise first_error
+
+    @staticmethod
+    def _after_hedge(after_hedge, reservation, future):
+        try:
+            after_hedge(reservation, None if future.exception() is not None else future.result()[0])
+        except Exception as e:
+            logger.warning("after_hedge callback failed: %s", e)
+
+    def stats(self):
+        return {"requests": self.requests, "hedges": self.hedges, "hedge_wins": self.hedge_wins,
+                "threshold": self.threshold()}
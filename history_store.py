@@ -0,0 +1,112 @@
+# Bounded history of model turns.
+# The most recent entries live in a fixed size ring buffer (deque with maxlen), so adding a turn is
+# O(1) and never reallocates. Entries pushed out of the buffer can optionally be spilled to a JSONL
+# file, where they stay queryable without costing any memory.
+
+import json
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+@dataclass(slots=True)
+class HistoryEntry:
+    role: str
+    content: str
+    tool_calls: List[str] = field(default_factory=list)  # names of the tools called during the turn
+    timestamp: float = field(default_factory=time.time)
+    duration: float = 0.0  # seconds spent waiting for the model
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "HistoryEntry":
+        return cls(**data)
+
+
+class HistoryStore:
+    def __init__(self, maxlen: int = 5, spill_path: Optional[str] = None):
+        """
+        Args:
+            maxlen: Number of entries kept in memory (0 to keep them all on disk only).
+            spill_path: Optional JSONL file receiving the entries evicted from memory.
+        """
+        self.maxlen = maxlen
+        self.spill_path = spill_path
+        self._entries = deque(maxlen=maxlen)
+
+    def append(self, entry: HistoryEntry):
+        if self.spill_path and len(self._entries) == self.maxlen:
+            # With maxlen=0 nothing is kept in memory, the new entry goes straight to disk
+            self._spill(self._entries[0] if self._entries else entry)
+        self._entries.append(entry)
+
+    def _spill(self, entry: HistoryEntry):
+        with open(self.spill_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry.to_dict(), separators=(",", ":"), ensure_ascii=False) + "\n")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[HistoryEntry]:
+        return iter(self._entries)
+
+    def recent(self, n: Optional[int] = None) -> List[HistoryEntry]:
+        """Returns the last n in-memory entries, oldest first."""
+        if n is None or n >= len(self._entries):
+            return list(self._entries)
+        if n <= 0:
+            return []
+        return list(self._entries)[-n:]
+
+    def iter_spilled(self) -> Iterator[HistoryEntry]:
+        """Streams the evicted entries from disk, oldest first."""
+        if not self.spill_path:
+            return
+        try:
+            f = open(self.spill_path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                if line.strip():
+                    yield HistoryEntry.from_dict(json.loads(line))
+
+    def query(self, role: Optional[str] = None, tool: Optional[str] = None, since: Optional[float] = None,
+              predicate: Optional[Callable[[HistoryEntry], bool]] = None, limit: Optional[int] = None,
+              include_spilled: bool = True) -> List[HistoryEntry]:
+        """
+        Searches the spilled and in-memory entries, oldest first.
+
+        Args:
+            role: Only entries with this role.
+            tool: Only entries that called this tool.
+            since: Only entries with a timestamp greater or equal to this one.
+            predicate: Any extra filter.
+            limit: Maximum number of entries returned (the most recent ones are kept).
+            include_spilled: If False only the in-memory entries are searched.
+
+        Returns:
+            The matching entries.
+        """
+        matches = deque(maxlen=limit)
+        sources = [self.iter_spilled(), iter(self._entries)] if include_spilled else [iter(self._entries)]
+        for source in sources:
+            for entry in source:
+                if role is not None and entry.role != role:
+                    continue
+                if tool is not None and tool not in entry.tool_calls:
+                    continue
+                if since is not None and entry.timestamp < since:
+                    continue
+                if predicate is not None and not predicate(entry):
+                    continue
+                matches.append(entry)
+        return list(matches)
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,133 @@
+# Deferred imports, to keep startup fast.
+# lazy_module("google.genai") returns a placeholder that imports the real module the first time one of
+# its attributes is used, so modules that only need a heavy dependency on some code paths (the SDK for
+# the first request, numpy for the first memory search) do not pay for it when they are imported.
+# lazy_functions() does the same for tool modules: their functions are described from the source and
+# the module is only imported when one of them is called.
+
+import ast
+import builtins
+import importlib
+import inspect
+import sys
+import threading
+import typing
+
+_lock = threading.Lock()
+
+
+class LazyModule:
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            with _lock:
+                module = self.__dict__["_module"]
+                if module is None:
+                    module = importlib.import_module(self.__dict__["_name"])
+                    self.__dict__["_module"] = module
+        return module
+
+    @property
+    def is_loaded(self):
+        return self.__dict__["_module"] is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self.is_loaded else "not loaded"
+        return f"<lazy module '{self.__dict__['_name']}' ({state})>"
+
+
+def lazy_module(name):
+    """Returns the module if it is already imported, otherwise a LazyModule that imports it on first use."""
+    module = sys.modules.get(name)
+    return module if module is not None else LazyModule(name)
+
+
+def _annotation_namespace(tree):
+    # Annotations of tools only use builtins and typing, anything else makes the module load eagerly
+    namespace = {"__builtins__": builtins}
+    for node in tree.body:
+        if isinstance(node, ast.ImportFrom) and node.module == "typing":
+            for alias in node.names:
+                namespace[alias.asname or alias.name] = getattr(typing, alias.name)
+        elif isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.name == "typing":
+                    namespace[alias.asname or "typing"] = typing
+    return namespace
+
+
+def _evaluate(node, namespace):
+    return eval(compile(ast.Expression(node), "<annotation>", "eval"), namespace)
+
+
+def _signature(func_node, namespace):
+    args = func_node.args
+    if args.vararg or args.kwarg or args.posonlyargs:
+        raise ValueError("unsupported parameters")
+    defaults = [inspect.Parameter.empty] * (len(args.args) - len(args.defaults)) + list(args.defaults)
+    parameters = []
+    for kind, arguments, argument_defaults in (
+            (inspect.Parameter.POSITIONAL_OR_KEYWORD, args.args, defaults),
+            (inspect.Parameter.KEYWORD_ONLY, args.kwonlyargs, args.kw_defaults)):
+        for arg, default in zip(arguments, argument_defaults):
+            if default is None:  # keyword-only argument without default
+                default = inspect.Parameter.empty
+            elif default is not inspect.Parameter.empty:
+                default = ast.literal_eval(default)
+            annotation = _evaluate(arg.annotation, namespace) if arg.annotation else inspect.Parameter.empty
+            parameters.append(inspect.Parameter(arg.arg, kind, default=default, annotation=annotation))
+    returns = _evaluate(func_node.returns, namespace) if func_node.returns else inspect.Signature.empty
+    return inspect.Signature(parameters, return_annotation=returns)
+
+
+def _proxy(module_name, name, signature, doc):
+    def tool(*args, **kwargs):
+        return getattr(importlib.import_module(module_name), name)(*args, **kwargs)
+
+    tool.__name__ = tool.__qualname__ = name
+    tool.__module__ = module_name
+    tool.__doc__ = doc
+    tool.__signature__ = signature
+    tool.__annotations__ = {p.name: p.annotation for p in signature.parameters.values()
+                            if p.annotation is not inspect.Parameter.empty}
+    if signature.return_annotation is not inspect.Signature.empty:
+        tool.__annotations__["return"] = signature.return_annotation
+    return tool
+
+
+def lazy_functions(path, module_name):
+    """
+    Describes the public functions of a module from its source, without importing it.
+
+    Returns:
+        Stand-ins with the name, signature, annotations and docstring of every public top level function;
+        calling one imports the module and calls the real function. None if the module cannot be described
+        statically (it must then be imported).
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=path)
+        namespace = _annotation_namespace(tree)
+        functions = []
+        for node in tree.body:
+            if isinstance(node, ast.FunctionDef) and not node.name.startswith("_"):
+                if node.decorator_list:
+                    return None
+                functions.append(_proxy(module_name, node.name, _signature(node, namespace),
+                                        ast.get_docstring(node, clean=False)))
+        return functions
+    except Exception:
+        return None
@@ -0,0 +1,175 @@
+# Long-term vector memory.
+# Notes and task outcomes are embedded locally (signed feature hashing of words and word pairs, no model
+# call) and appended to three files:
+#   vectors.f32  float32 matrix, one L2-normalized row per memory, read back as a numpy memmap
+#   records.jsonl  the text and metadata of every memory
+#   records.idx  int64 byte offset of every record in records.jsonl
+# A query is a brute-force cosine (dot product of normalized rows) over the memmap, scanned in chunks, so
+# memory use stays flat and only the top-k records are ever turned into Python objects. 100k memories of
+# dimension 256 are ~100MB on disk and are scanned in a few tens of milliseconds.
+
+import importlib.util
+import json
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from array import array
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows, writers are then only serialized within one process
+    fcntl = None
+
+from lazy_import import lazy_module
+
+# numpy is only imported when a store is opened; without it the memory tools report that it is needed
+# instead of breaking the tool reload
+np = lazy_module("numpy")
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MEMORY_DIR = "memory"
+DEFAULT_DIM = 256
+SCAN_CHUNK_ROWS = 65536
+
+
+def _features(text):
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    features = list(words)
+    features.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+    return features
+
+
+class MemoryStore:
+    def __init__(self, directory=DEFAULT_MEMORY_DIR, dim=DEFAULT_DIM):
+        if importlib.util.find_spec("numpy") is None:
+            raise RuntimeError("The memory store needs numpy (pip install numpy)")
+        self.directory = directory
+        self.dim = dim
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.records_path = os.path.join(directory, "records.jsonl")
+        self.index_path = os.path.join(directory, "records.idx")
+        self.lock_path = os.path.join(directory, "store.lock")
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._matrix_rows = 0
+
+    def embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in _features(text):
+            h = zlib.crc32(feature.encode())
+            # The top bit picks the sign, so colliding features cancel out instead of piling up
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector
+
+    def __len__(self):
+        try:
+            return os.path.getsize(self.vectors_path) // (self.dim * 4)
+        except FileNotFoundError:
+            return 0
+
+    def add(self, text, kind="note", metadata=None):
+        """
+        Stores a memory and returns its id.
+
+        Args:
+            text: The content to remember (it is also what gets embedded).
+            kind: Category of the memory, e.g. "note" or "task_outcome".
+            metadata: Optional JSON serializable dict stored with the memory.
+        """
+        vector = self.embed(text)
+        # The handler, the memory tools and every sandbox worker have their own store on the same files: the
+        # id and the three appends are serialized between processes by a lock on the directory
+        with self._lock, open(self.lock_path, "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            memory_id = len(self)
+            record = {"id": memory_id, "kind": kind, "text": text, "ts": time.time(), "metadata": metadata or {}}
+            with open(self.records_path, "ab") as f:
+                offset = f.tell()
+                f.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+            with open(self.index_path, "ab") as f:
+                # Drops the offsets of a writer that died before writing its vector, row i is offset i
+                f.truncate(memory_id * 8)
+                array("q", [offset]).tofile(f)
+            # The vector is written last: a memory only becomes visible once its record exists
+            with open(self.vectors_path, "ab") as f:
+                f.write(vector.tobytes())
+        return memory_id
+
+    def _rows(self):
+        rows = len(self)
+        if rows != self._matrix_rows:
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim)) if rows else None
+            self._matrix_rows = rows
+        return self._matrix
+
+    def get(self, memory_id):
+        with open(self.index_path, "rb") as f:
+            f.seek(memory_id * 8)
+            offsets = array("q")
+            offsets.fromfile(f, 1)
+        with open(self.records_path, "rb") as f:
+            f.seek(offsets[0])
+            return json.loads(f.readline())
+
+    def search(self, query, top_k=5, kind=None, min_score=0.0):
+        """
+        Returns the top_k memories most similar to query, best first, each with its "score".
+
+        Args:
+            query: Free text.
+            top_k: Number of memories to return.
+            kind: If given only memories of this kind are returned.
+            min_score: Memories with a lower cosine similarity are dropped.
+        """
+        matrix = self._rows()
+        if matrix is None or top_k <= 0:
+            return []
+        q = self.embed(query)
+        # Oversample when filtering by kind (the filter needs the records, which live on disk) and scan again
+        # with a larger sample until top_k memories of that kind are found or every memory was seen
+        wanted = top_k if kind is None else top_k * 8
+        while True:
+            best_ids, best_scores = self._top(matrix, q, wanted)
+            results = []
+            for i in np.argsort(-best_scores):
+                score = float(best_scores[i])
+                if score < min_score:
+                    break
+                record = self.get(int(best_ids[i]))
+                if kind is not None and record["kind"] != kind:
+                    continue
+                record["score"] = round(score, 4)
+                results.append(record)
+                if len(results) == top_k:
+                    break
+            if len(results) == top_k or wanted >= matrix.shape[0] or \
+                    (len(best_scores) and float(best_scores.min()) < min_score):
+                return results
+            wanted *= 4
+
+    @staticmethod
+    def _top(matrix, q, wanted):
+        """Ids and scores of the `wanted` rows of matrix most similar to q, in no particular order."""
+        best_ids = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start in range(0, matrix.shape[0], SCAN_CHUNK_ROWS):
+            scores = matrix[start:start + SCAN_CHUNK_ROWS] @ q
+            if scores.shape[0] > wanted:
+                top = np.argpartition(scores, -wanted)[-wanted:]
+            else:
+                top = np.arange(scores.shape[0])
+            best_ids = np.concatenate([best_ids, top + start])
+            best_scores = np.concatenate([best_scores, scores[top]])
+            if best_ids.shape[0] > wanted:
+                keep = np.argpartition(best_scores, -wanted)[-wanted:]
+                best_ids, best_scores = best_ids[keep], best_scores[keep]
+        return best_ids, best_scores
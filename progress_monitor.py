@@ -0,0 +1,171 @@
+# Loop and no-progress detection for the agent loop.
+# Every turn is fingerprinted (the tool calls with their results, and the normalized model text). A turn
+# that repeats a fingerprint of the last few turns, a short cycle (A B A B ...) or a run of turns bringing nothing new
+# is a problem. Problems are answered with an escalation ladder: first a corrective hint is injected,
+# then the task is moved to a stronger model (if one is configured), then it is stopped. Per task turn,
+# token and wall clock budgets stop the task outright.
+
+import hashlib
+import json
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+HINT = "hint"
+ESCALATE = "escalate"
+STOP = "stop"
+
+DEFAULT_HINT = ("You seem to be repeating yourself: {reason}. Repeating the same actions will give the same "
+                "results. Change approach, use a different tool or different arguments, and if the task is "
+                "already done conclude with !FINISHED_TASK!")
+
+
+def _normalize(text):
+    # Numbers, ids and timestamps change between otherwise identical answers
+    return re.sub(r"\s+", " ", re.sub(r"\d+", "0", (text or "").lower())).strip()
+
+
+def _shingles(text, size=4):
+    words = text.split()
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class ProgressMonitor:
+    def __init__(self, max_turns=50, max_tokens=None, max_seconds=None, repeat_threshold=3, repeat_window=10,
+                 stall_turns=4, max_cycle_length=3, text_similarity=0.9, escalation_model=None, max_hints=1,
+                 hint=DEFAULT_HINT):
+        """
+        Args:
+            max_turns: Turns allowed per task (None for no limit).
+            max_tokens: Prompt + output tokens allowed per task (None for no limit).
+            max_seconds: Wall clock seconds allowed per task (None for no limit).
+            repeat_threshold: A fingerprint seen this many times within the last repeat_window turns is a loop.
+            repeat_window: Number of recent turns in which repeats are counted.
+            stall_turns: This many consecutive turns without any new fingerprint is a stall.
+            max_cycle_length: Longest cycle of turns (A B A B ...) that is detected.
+            text_similarity: Jaccard similarity above which two texts count as the same.
+            escalation_model: Model the task is moved to once hints did not help (None to skip this step).
+            max_hints: Number of hints injected before escalating or stopping.
+            hint: Message injected as hint, {reason} is replaced by what was detected.
+        """
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+        self.repeat_threshold = repeat_threshold
+        self.repeat_window = repeat_window
+        self.stall_turns = stall_turns
+        self.max_cycle_length = max_cycle_length
+        self.text_similarity = text_similarity
+        self.escalation_model = escalation_model
+        self.max_hints = max_hints
+        self.hint = hint
+        self.start()
+
+    def start(self):
+        """Resets the monitor for a new task."""
+        self.started = time.monotonic()
+        self.turns = 0
+        self.tokens = 0
+        self.fingerprints = []  # the last repeat_window turns, cleared after every step of the ladder
+        self.seen = set()
+        self.recent_texts = []
+        self.turns_without_progress = 0
+        self.hints = 0
+        self.escalated = False
+        self.problems = []
+
+    def state(self):
+        """The budgets used and the ladder steps taken so far, as JSON, to be checkpointed with the task."""
+        return {"turns": self.turns, "tokens": self.tokens, "seconds": time.monotonic() - self.started,
+                "hints": self.hints, "escalated": self.escalated}
+
+    def restore(self, state):
+        """Continues the budgets and the ladder of a resumed task from a state() checkpoint."""
+        self.turns = state.get("turns", 0)
+        self.tokens = state.get("tokens", 0)
+        self.started = time.monotonic() - state.get("seconds", 0)
+        self.hints = state.get("hints", 0)
+        self.escalated = state.get("escalated", False)
+
+    def fingerprint(self, text, tool_calls):
+        payload = json.dumps([[name, args, result] for name, args, result in tool_calls],
+                             sort_keys=True, default=str)
+        digest = hashlib.sha1(payload.encode())
+        if not tool_calls:
+            digest.update(_normalize(text).encode())
+        return digest.hexdigest()[:16]
+
+    def _similar_text(self, text):
+        shingles = _shingles(_normalize(text))
+        if not shingles:
+            return False
+        for previous in self.recent_texts:
+            union = len(shingles | previous)
+            if union and len(shingles & previous) / union >= self.text_similarity:
+                return True
+        return False
+
+    def _cycle(self):
+        history = self.fingerprints
+        for length in range(1, self.max_cycle_length + 1):
+            if len(history) >= 2 * length and history[-length:] == history[-2 * length:-length]:
+                return length
+        return 0
+
+    def observe(self, text, tool_calls=(), tokens=0):
+        """
+        Records a completed turn and decides what to do next.
+
+        Args:
+            text: Text produced by the model during the turn.
+            tool_calls: (name, args, result) of every tool call of the turn.
+            tokens: Tokens used by the turn.
+
+        Returns:
+            None to continue, or (action, detail) where action is HINT (detail is the message to inject),
+            ESCALATE (detail is the model to switch to) or STOP (detail is the reason).
+        """
+        self.turns += 1
+        self.tokens += tokens
+        fp = self.fingerprint(text, tool_calls)
+        new = fp not in self.seen
+        self.seen.add(fp)
+        self.fingerprints = (self.fingerprints + [fp])[-self.repeat_window:]
+        repeats = self.fingerprints.count(fp)
+        similar_text = not tool_calls and self._similar_text(text)
+        if text:
+            self.recent_texts = (self.recent_texts + [_shingles(_normalize(text))])[-5:]
+        self.turns_without_progress = 0 if new and not similar_text else self.turns_without_progress + 1
+
+        if self.max_turns is not None and self.turns >= self.max_turns:
+            return STOP, f"turn budget of {self.max_turns} reached"
+        if self.max_tokens is not None and self.tokens >= self.max_tokens:
+            return STOP, f"token budget of {self.max_tokens} reached"
+        if self.max_seconds is not None and time.monotonic() - self.started >= self.max_seconds:
+            return STOP, f"time budget of {self.max_seconds}s reached"
+
+        reason = None
+        cycle = self._cycle()
+        if repeats >= self.repeat_threshold:
+            reason = f"the same turn was repeated {repeats} times"
+        elif cycle:
+            reason = f"the last {cycle} turn(s) repeat the {cycle} before them"
+        elif self.turns_without_progress >= self.stall_turns:
+            reason = f"{self.turns_without_progress} turns in a row brought nothing new"
+        if reason is None:
+            return None
+        self.problems.append(reason)
+        # Give the next step of the ladder a clean slate to show progress
+        self.turns_without_progress = 0
+        self.fingerprints.clear()
+        if self.hints < self.max_hints:
+            self.hints += 1
+            return HINT, self.hint.format(reason=reason)
+        if self.escalation_model and not self.escalated:
+            self.escalated = True
+            return ESCALATE, self.escalation_model
+        return STOP, reason
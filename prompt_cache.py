@@ -0,0 +1,181 @@
+# Prompt prefix caching.
+# The system prompt and the tool declarations never change within a session but are sent (and billed)
+# on every generate call. PromptCache registers them once as cached content and hands back the cache
+# name to reference on later turns. The cache key is a fingerprint of the model, the prompt text and
+# the tool set, so a new cache is created automatically when reload_tools changes the tools or the
+# prompt is edited; the last few of them are kept per model (least recently used ones are deleted).
+# A prefix the API refuses (4xx, e.g. under the minimum cacheable size) is sent inline for good, other
+# failures (network, 5xx, 429) are retried with a growing delay. LocalCacheBackend is an in-memory
+# stand-in for tests and offline runs.
+
+import hashlib
+import inspect
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+RETRY_DELAY = 30.0  # seconds before retrying a prefix after a transient failure, doubled every time
+MAX_RETRY_DELAY = 900.0
+
+
+def _permanent(error):
+    """True for errors retrying cannot fix: a 4xx from the API other than 429 (rate limited)."""
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return isinstance(code, int) and 400 <= code < 500 and code != 429
+
+
+def tools_fingerprint(functions):
+    """Hash of the name, signature and docstring of every tool, which is all the declarations contain."""
+    digest = hashlib.sha256()
+    for func in sorted(functions, key=lambda f: (f.__module__, f.__name__)):
+        digest.update(f"{func.__module__}.{func.__name__}{inspect.signature(func)}".encode())
+        digest.update((inspect.getdoc(func) or "").encode())
+    return digest.hexdigest()
+
+
+def prompt_version(text):
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+class LocalCacheBackend:
+    """Keeps cached contents in memory, it never talks to the API."""
+
+    def __init__(self):
+        self.contents = {}
+        self.created = 0
+        self.deleted = 0
+
+    def create(self, model, system_prompt, tools, ttl_seconds):
+        name = f"cachedContents/local-{uuid.uuid4().hex[:12]}"
+        self.contents[name] = {"model": model, "system_prompt": system_prompt, "tools": list(tools),
+                               "expire_time": time.time() + ttl_seconds}
+        self.created += 1
+        return name
+
+    def delete(self, name):
+        if self.contents.pop(name, None) is not None:
+            self.deleted += 1
+
+
+class GeminiCacheBackend:
+    """Stores the prefix as Gemini cached content through client.caches."""
+
+    def __init__(self, client=None, client_factory=None):
+        """
+        Args:
+            client: A genai.Client.
+            client_factory: Called for the client on first use instead, so the SDK is not loaded at startup.
+        """
+        self._client = client
+        self._client_factory = client_factory
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self._client_factory()
+        return self._client
+
+    def create(self, model, system_prompt, tools, ttl_seconds):
+        from google.genai import types
+        from tool_schema import ToolSpec
+        declarations = []
+        for func in tools:
+            declaration = ToolSpec(func).declaration()
+            declarations.append(types.FunctionDeclaration(name=declaration["name"], description=declaration["description"],
+                                                          parameters_json_schema=declaration["parameters"]))
+        cache = self.client.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                display_name="evolve-system-prompt",
+                system_instruction=system_prompt,
+                tools=[types.Tool(function_declarations=declarations)] if declarations else None,
+                ttl=f"{int(ttl_seconds)}s",
+            ),
+        )
+        return cache.name
+
+    def delete(self, name):
+        self.client.caches.delete(name=name)
+
+
+class PromptCache:
+    def __init__(self, backend, ttl_seconds=3600, refresh_margin=60, max_per_model=4):
+        """
+        Args:
+            backend: LocalCacheBackend or GeminiCacheBackend.
+            ttl_seconds: Lifetime of each cached content.
+            refresh_margin: A cache this close (in seconds) to its expiry is replaced by a new one.
+            max_per_model: Cached contents kept alive per model (one per prompt and tool set in use), the least
+                recently used one is deleted beyond that.
+        """
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin = refresh_margin
+        self.max_per_model = max_per_model
+        self._entries = OrderedDict()  # key -> (name, expire_time), least recently used first
+        self._failed = set()  # keys the backend refused (e.g. prompt under the minimum cacheable size)
+        self._retry = {}  # key -> (failures, time of the next attempt) after transient failures
+        self._lock = threading.Lock()
+
+    def key(self, model, system_prompt, tools, tools_key=None):
+        return f"{model}:{prompt_version(system_prompt)}:{tools_key or tools_fingerprint(tools)}"
+
+    def get(self, model, system_prompt, tools, tools_key=None):
+        """
+        Returns the name of a cached content holding system_prompt and tools for model,
+        creating it if needed, or None if caching is not possible (the caller then sends them inline).
+
+        Args:
+            tools_key: Precomputed tools_fingerprint(tools), to avoid hashing the tools on every turn.
+        """
+        key = self.key(model, system_prompt, tools, tools_key)
+        with self._lock:
+            if key in self._failed:
+                return None
+            if key in self._retry and self._retry[key][1] > time.time():
+                return None
+            entry = self._entries.get(key)
+            if entry and entry[1] - self.refresh_margin > time.time():
+                self._entries.move_to_end(key)
+                return entry[0]
+            if entry:
+                self._delete(self._entries.pop(key)[0])
+            # A few caches per model stay alive, so alternating tool sets do not recreate them every turn
+            same_model = [k for k in self._entries if k.split(":", 1)[0] == model]
+            for old_key in same_model[:max(len(same_model) - self.max_per_model + 1, 0)]:
+                self._delete(self._entries.pop(old_key)[0])
+            try:
+                name = self.backend.create(model, system_prompt, tools, self.ttl_seconds)
+            except Exception as e:
+                if _permanent(e):
+                    logger.warning("Could not cache the system prompt for %s, sending it inline: %s", model, e)
+                    self._failed.add(key)
+                    return None
+                failures = self._retry.get(key, (0, 0))[0] + 1
+                delay = min(RETRY_DELAY * 2 ** (failures - 1), MAX_RETRY_DELAY)
+                self._retry[key] = (failures, time.time() + delay)
+                logger.warning("Could not cache the system prompt for %s, sending it inline and retrying in %.0fs: %s",
+                               model, delay, e)
+                return None
+            self._retry.pop(key, None)
+            self._entries[key] = (name, time.time() + self.ttl_seconds)
+            logger.info("Created prompt cache %s for %s", name, model)
+            return name
+
+    def _delete(self, name):
+        try:
+            self.backend.delete(name)
+        except Exception as e:
+            logger.debug("Could not delete prompt cache %s: %s", name, e)
+
+    def invalidate(self):
+        with self._lock:
+            for name, _ in self._entries.values():
+                self._delete(name)
+            self._entries.clear()
+            self._failed.clear()
+            self._retry.clear()
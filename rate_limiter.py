@@ -0,0 +1,112 @@
+# Request rate limiter that can be shared by several GeminiHandler instances (and threads),
+# so concurrent agent sessions running on the same API key stay under one common quota.
+# Besides the request count it can enforce a tokens per minute quota: each request is admitted with
+# its projected token cost, which is replaced by the real cost once the response arrives.
+
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    def __init__(self, requests_per_minute=30, tokens_per_minute=None, window=60.0):
+        """
+        Args:
+            requests_per_minute: Maximum number of requests admitted in any sliding window.
+            tokens_per_minute: Maximum number of tokens (projected, then actual) in any sliding window.
+            window: Length of the window in seconds.
+        """
+        if requests_per_minute < 1:
+            raise ValueError(f"requests_per_minute must be at least 1, got {requests_per_minute}")
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.window = window
+        self._events = deque()  # [timestamp, tokens] per admitted request
+        self._tokens = 0
+        self._lock = threading.Condition()
+
+    def _prune(self, now):
+        while self._events and now - self._events[0][0] >= self.window:
+            self._tokens -= self._events.popleft()[1]
+
+    def _wait_time(self, now, estimated_tokens):
+        if len(self._events) >= self.requests_per_minute:
+            return self.window - (now - self._events[0][0])
+        if self.tokens_per_minute and self._events and self._tokens + estimated_tokens > self.tokens_per_minute:
+            # Wait until enough of the oldest requests leave the window (a request bigger than the
+            # whole quota is admitted alone once the window is empty)
+            freed = 0
+            for timestamp, tokens in self._events:
+                freed += tokens
+                if self._tokens - freed + estimated_tokens <= self.tokens_per_minute:
+                    return self.window - (now - timestamp)
+            return self.window - (now - self._events[-1][0])
+        return 0
+
+    def acquire(self, estimated_tokens=0):
+        """
+        Blocks until a request can be sent without going over the limits, then records it.
+
+        Args:
+            estimated_tokens: Projected token cost of the request.
+
+        Returns:
+            A reservation to pass to settle() with the real token cost.
+        """
+        with self._lock:
+            while True:
+                reservation, wait_time = self.try_acquire(estimated_tokens)
+                if reservation is not None:
+                    return reservation
+                logger.warning("Rate limit reached. Waiting %.2f seconds...", wait_time)
+                self._lock.wait(wait_time)
+
+    def try_acquire(self, estimated_tokens=0, headroom=0):
+        """
+        Non blocking acquire.
+
+        Args:
+            estimated_tokens: Projected token cost of the request.
+            headroom: Number of requests that must stay free in the window after this one (at most
+                requests_per_minute - 1, otherwise nothing could ever be admitted).
+
+        Returns:
+            (reservation, 0) if the request was admitted, (None, seconds to wait) otherwise.
+        """
+        headroom = min(headroom, self.requests_per_minute - 1)
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            wait_time = self._wait_time(now, estimated_tokens)
+            if wait_time <= 0 and headroom and len(self._events) + 1 + headroom > self.requests_per_minute:
+                # Capacity is only there for the reserved headroom: wait for the next slot to free up
+                wait_time = self.window - (now - self._events[0][0]) if self._events else self.window
+            if wait_time > 0:
+                return None, wait_time
+            reservation = [now, estimated_tokens]
+            self._events.append(reservation)
+            self._tokens += estimated_tokens
+            return reservation, 0
+
+    def settle(self, reservation, actual_tokens):
+        """Replaces the projected cost of an admitted request with its real cost."""
+        with self._lock:
+            if any(event is reservation for event in self._events):
+                self._tokens += actual_tokens - reservation[1]
+            reservation[1] = actual_tokens
+            self._lock.notify_all()
+
+    def used(self):
+        """Number of requests sent in the current window."""
+        with self._lock:
+            self._prune(time.monotonic())
+            return len(self._events)
+
+    def tokens_used(self):
+        """Tokens (projected or actual) used in the current window."""
+        with self._lock:
+            self._prune(time.monotonic())
+            return self._tokens
@@ -0,0 +1,123 @@
+# Priority aware scheduler in front of generate, for several agent sessions sharing one quota.
+# Requests wait in a queue until it is their turn and the rate limiter has room:
+#   - priority classes: interactive requests always go before batch ones, and batch requests leave a
+#     headroom of the quota free so an interactive turn arriving later does not wait for a slot
+#   - weighted fair queuing between sessions of the same class (virtual finish tags), so one large
+#     batch job cannot starve the others
+#   - deadlines: a request whose deadline is close jumps ahead of its class, and one that cannot be
+#     served before its deadline is rejected instead of wasting quota on an answer nobody waits for
+
+import itertools
+import logging
+import threading
+import time
+
+from rate_limiter import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+PRIORITIES = {INTERACTIVE: 0, BATCH: 1}
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class _Ticket:
+    __slots__ = ("session", "priority", "tokens", "deadline", "finish_tag", "order")
+
+    def __init__(self, session, priority, tokens, deadline, finish_tag, order):
+        self.session = session
+        self.priority = priority
+        self.tokens = tokens
+        self.deadline = deadline
+        self.finish_tag = finish_tag
+        self.order = order
+
+
+class RequestScheduler:
+    def __init__(self, rate_limiter=None, interactive_reserve=0.2, urgent_slack=5.0):
+        """
+        Args:
+            rate_limiter: The shared RateLimiter (a default one is created if None).
+            interactive_reserve: Fraction of the requests per minute that batch requests leave free.
+            urgent_slack: A request whose deadline is less than this many seconds away goes first in its class.
+        """
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.interactive_reserve = interactive_reserve
+        self.urgent_slack = urgent_slack
+        self.weights = {}
+        self._waiting = []
+        self._finish_tags = {}  # session -> finish tag of its last request
+        self._virtual_time = 0.0
+        self._counter = itertools.count()
+        self._lock = threading.Condition()
+
+    def set_weight(self, session, weight):
+        """Sessions with a bigger weight get a proportionally bigger share of their class."""
+        with self._lock:
+            self.weights[session] = weight
+
+    def _key(self, ticket, now):
+        urgent = ticket.deadline is not None and ticket.deadline - now <= self.urgent_slack
+        return (PRIORITIES.get(ticket.priority, 1), not urgent,
+                ticket.deadline if urgent else 0, ticket.finish_tag, ticket.order)
+
+    def acquire(self, session, priority=INTERACTIVE, estimated_tokens=0, deadline=None):
+        """
+        Blocks until the request may be sent.
+
+        Args:
+            session: Id of the agent session sending the request.
+            priority: INTERACTIVE or BATCH.
+            estimated_tokens: Projected token cost of the request.
+            deadline: Optional time.monotonic() value after which the answer is useless.
+
+        Returns:
+            The rate limiter reservation, to settle with the real token cost.
+
+        Raises:
+            DeadlineExceeded: If the request could not be admitted before its deadline.
+        """
+        with self._lock:
+            cost = max(estimated_tokens, 1) / self.weights.get(session, 1.0)
+            start = max(self._virtual_time, self._finish_tags.get(session, 0.0))
+            ticket = _Ticket(session, priority, estimated_tokens, deadline, start + cost, next(self._counter))
+            self._finish_tags[session] = ticket.finish_tag
+            self._waiting.append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    if deadline is not None and now >= deadline:
+                        raise DeadlineExceeded(f"Request of session {session} not admitted before its deadline")
+                    head = min(self._waiting, key=lambda t: self._key(t, now))
+                    wait_time = None
+                    if head is ticket:
+                        headroom = 0
+                        if priority != INTERACTIVE:
+                            headroom = int(self.rate_limiter.requests_per_minute * self.interactive_reserve)
+                        reservation, wait_time = self.rate_limiter.try_acquire(estimated_tokens, headroom)
+                        if reservation is not None:
+                            self._virtual_time = max(self._virtual_time, start)
+                            return reservation
+                        if deadline is not None and now + wait_time > deadline:
+                            # Admission control: the quota frees up too late for this request
+                            raise DeadlineExceeded(f"Request of session {session} cannot be sent before its "
+                                                   f"deadline (quota frees up in {wait_time:.1f}s)")
+                    if deadline is not None:
+                        wait_time = min(wait_time or deadline - now, deadline - now)
+                    # Woken up early whenever another request leaves the queue
+                    self._lock.wait(wait_time)
+            finally:
+                self._waiting.remove(ticket)
+                self._lock.notify_all()
+
+    def queued(self):
+        """Number of waiting requests per priority class."""
+        with self._lock:
+            counts = {name: 0 for name in PRIORITIES}
+            for ticket in self._waiting:
+                counts[ticket.priority] = counts.get(ticket.priority, 0) + 1
+            return counts
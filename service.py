@@ -0,0 +1,273 @@
+# Long running local service: accepts tasks over HTTP (TCP or a Unix socket) and solves them with warm
+# agent sessions, so a task does not pay interpreter startup, SDK import, client creation and tool
+# loading every time.
+#
+# - `workers` GeminiHandlers are created once at startup and reused, all sharing one client, one
+#   scheduler (rate limits), one usage tracker and one SingleFlight
+# - tasks run on a bounded thread pool, at most `max_pending` more wait for a worker (503 beyond that)
+# - progress is streamed back as NDJSON, one event per line (see GeminiHandler.solve_task)
+#
+# Endpoints:
+#   POST /tasks   {"prompt": "...", "model": "...", "resume": "<session id>", "stream": true}
+#   GET  /health  workers, queue and token usage
+#
+# Usage:
+#   python service.py --port 8765                 (or --unix /tmp/evolve.sock)
+#   curl -N localhost:8765/tasks -d '{"prompt": "Calculate 5 * 4"}'
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from agent_logging import setup_logging
+from rate_limiter import RateLimiter
+from scheduler import INTERACTIVE, PRIORITIES, RequestScheduler
+from singleflight import SingleFlight
+from usage_tracker import UsageTracker
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 1024 * 1024
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class AgentService:
+    def __init__(self, workers=4, model="gemini-2.0-flash", requests_per_minute=30, tokens_per_minute=None,
+                 max_pending=64, usage_log_path=None, handler_options=None):
+        """
+        Args:
+            workers: Number of warm agent sessions, i.e. of tasks solved concurrently.
+            model: Default model of the tasks.
+            requests_per_minute: Request quota shared by all the sessions.
+            tokens_per_minute: Token quota shared by all the sessions.
+            max_pending: Tasks allowed to wait for a free worker before new ones are rejected.
+            usage_log_path: Optional JSONL file receiving the token usage of every turn.
+            handler_options: Extra keyword arguments for every GeminiHandler.
+        """
+        self.workers = workers
+        self.model = model
+        self.max_pending = max_pending
+        self.handler_options = handler_options or {}
+        self.scheduler = RequestScheduler(RateLimiter(requests_per_minute=requests_per_minute,
+                                                      tokens_per_minute=tokens_per_minute))
+        self.usage_tracker = UsageTracker(log_path=usage_log_path)
+        self.singleflight = SingleFlight()
+        self._handlers = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="service")
+        self._pending = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def warm_up(self, client=None):
+        """Creates the handlers (imports the SDK and loads the tools) before the first task arrives."""
+        from gemini_handler import GeminiHandler
+        start = time.perf_counter()
+        for _ in range(self.workers):
+            handler = GeminiHandler(client=client, scheduler=self.scheduler, usage_tracker=self.usage_tracker,
+                                    singleflight=self.singleflight, **self.handler_options)
+            client = handler.client
+            self._handlers.put(handler)
+        logger.info("%d agent sessions ready in %.2fs", self.workers, time.perf_counter() - start)
+
+    def _solve(self, task, on_event):
+        handler = self._handlers.get()
+        with self._lock:
+            self._pending -= 1
+            self._running += 1
+        try:
+            handler.priority = task.get("priority", INTERACTIVE)
+            return handler.solve_task(task.get("prompt"), model=task.get("model") or self.model,
+                                      resume=task.get("resume"), on_event=on_event)
+        finally:
+            with self._lock:
+                self._running -= 1
+            self._handlers.put(handler)
+
+    def submit(self, task, on_event=None):
+        """
+        Queues a task on the worker pool.
+
+        Returns:
+            A concurrent.futures.Future of the final answer.
+
+        Raises:
+            HttpError: If the task is invalid or the queue is full.
+        """
+        if not task.get("prompt") and not task.get("resume"):
+            raise HttpError(400, "A task needs a 'prompt' (or a 'resume' session id)")
+        if task.get("priority", INTERACTIVE) not in PRIORITIES:
+            raise HttpError(400, f"Unknown priority {task['priority']!r}")
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise HttpError(503, "Too many pending tasks, retry later")
+            self._pending += 1
+        future = self._executor.submit(self._solve, task, on_event)
+        future.add_done_callback(self._count)
+        return future
+
+    def _count(self, future):
+        with self._lock:
+            if future.exception() is None:
+                self._completed += 1
+            else:
+                self._failed += 1
+
+    def health(self):
+        with self._lock:
+            state = {"workers": self.workers, "running": self._running, "pending": self._pending,
+                     "completed": self._completed, "failed": self._failed}
+        state.update(uptime=round(time.time() - self.started, 1), queued_requests=self.scheduler.queued(),
+                     usage=self.usage_tracker.summary())
+        return state
+
+    # --- HTTP ---
+
+    async def _read_request(self, reader):
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        if not request_line:
+            return None
+        try:
+            method, path, _ = request_line.split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "Malformed request line")
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method, path.split("?", 1)[0], body
+
+    @staticmethod
+    async def _respond(writer, status, payload):
+        body = json.dumps(payload, default=str).encode()
+        writer.write(f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+
+    async def _stream_task(self, writer, task):
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+
+        def on_event(event):
+            # Called from the worker thread
+            loop.call_soon_threadsafe(events.put_nowait, event)
+
+        future = asyncio.wrap_future(self.submit(task, on_event))
+        future.add_done_callback(lambda _: events.put_nowait(None))
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nConnection: close\r\n\r\n")
+        writer.write(json.dumps({"type": "queued", "pending": self._pending}).encode() + b"\n")
+        await writer.drain()
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            writer.write(json.dumps(event, default=str).encode() + b"\n")
+            await writer.drain()
+        if future.exception() is not None:
+            error = future.exception()
+            writer.write(json.dumps({"type": "error", "error": f"{type(error).__name__}: {error}"}).encode() + b"\n")
+            await writer.drain()
+
+    async def handle(self, reader, writer):
+        try:
+            request = await self._read_request(reader)
+            if request is None:
+                return
+            method, path, body = request
+            if path == "/health":
+                await self._respond(writer, 200, self.health())
+            elif path == "/tasks":
+                if method != "POST":
+                    raise HttpError(405, "Use POST")
+                try:
+                    task = json.loads(body or b"{}")
+                except json.JSONDecodeError as e:
+                    raise HttpError(400, f"Invalid JSON: {e}")
+                if task.get("stream", True):
+                    await self._stream_task(writer, task)
+                else:
+                    result = await asyncio.wrap_future(self.submit(task))
+                    await self._respond(writer, 200, {"result": result})
+            else:
+                raise HttpError(404, f"No route for {path}")
+        except HttpError as e:
+            await self._respond(writer, e.status, {"error": str(e)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            # The client went away, a task it started keeps running to completion
+            logger.debug("Client disconnected")
+        except Exception as e:
+            logger.exception("Request failed")
+            await self._respond(writer, 500, {"error": f"{type(e).__name__}: {e}"})
+        finally:
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def serve(self, host="127.0.0.1", port=8765, unix_socket=None):
+        if unix_socket:
+            if os.path.exists(unix_socket):
+                os.unlink(unix_socket)
+            server = await asyncio.start_unix_server(self.handle, path=unix_socket)
+            logger.info("Listening on unix:%s", unix_socket)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+            logger.info("Listening on http://%s:%d", host, server.sockets[0].getsockname()[1])
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve solve_task over HTTP with warm agent sessions.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None, help="Listen on this Unix socket instead of TCP")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="Number of concurrent agent sessions")
+    parser.add_argument("-m", "--model", default="gemini-2.0-flash")
+    parser.add_argument("--rpm", type=int, default=30, help="Requests per minute shared by all sessions")
+    parser.add_argument("--tpm", type=int, default=None, help="Tokens per minute shared by all sessions")
+    parser.add_argument("--max-pending", type=int, default=64, help="Tasks allowed to wait for a worker")
+    parser.add_argument("--usage-log", default=None, help="JSONL file receiving the token usage of every turn")
+    parser.add_argument("--quiet", action="store_true", help="Only log warnings and errors")
+    args = parser.parse_args(argv)
+
+    setup_logging(quiet=args.quiet or None)
+    service = AgentService(workers=args.workers, model=args.model, requests_per_minute=args.rpm,
+                           tokens_per_minute=args.tpm, max_pending=args.max_pending, usage_log_path=args.usage_log)
+    service.warm_up()
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# Durable session checkpoints for solve_task.
+# Every session is an append-only JSONL file: one "start" record followed by one "turn" record per
+# completed model turn. A process that dies mid task can be resumed from the last complete turn
+# without paying again for the model calls that were already made.
+
+import json
+import logging
+import os
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SESSIONS_DIR = "sessions"
+
+
+class SessionStore:
+    def __init__(self, directory=DEFAULT_SESSIONS_DIR, fsync=True):
+        """
+        Args:
+            directory: Folder holding one <session_id>.jsonl log per session.
+            fsync: If True every record is flushed to disk before returning.
+        """
+        self.directory = directory
+        self.fsync = fsync
+
+    @staticmethod
+    def new_session_id():
+        return time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:8]
+
+    def path_for(self, session_id):
+        return os.path.join(self.directory, f"{session_id}.jsonl")
+
+    def exists(self, session_id):
+        return os.path.exists(self.path_for(session_id))
+
+    def _append(self, session_id, record):
+        os.makedirs(self.directory, exist_ok=True)
+        line = json.dumps(record, separators=(",", ":"), ensure_ascii=False, default=str)
+        with open(self.path_for(session_id), "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+
+    def start(self, session_id, prompt, model):
+        self._append(session_id, {"type": "start", "ts": time.time(), "prompt": prompt, "model": model})
+
+    def append_turn(self, session_id, turn, entries, tool_results=None, finished=False, state=None):
+        """
+        Records one completed turn.
+
+        Args:
+            session_id: The session to append to.
+            turn: Index of the turn (0-based).
+            entries: Conversation entries added during this turn.
+            tool_results: Raw results of the tools executed during this turn.
+            finished: True if this turn ended the task.
+            state: Any extra loop state needed to continue the task.
+        """
+        self._append(session_id, {
+            "type": "turn",
+            "ts": time.time(),
+            "turn": turn,
+            "entries": entries,
+            "tool_results": tool_results or [],
+            "finished": finished,
+            "state": state or {},
+        })
+
+    def load(self, session_id):
+        """
+        Rebuilds the state of a session from its log.
+
+        Returns:
+            A dict with prompt, model, conversation, turns (number of completed turns),
+            finished and state (the loop state of the last turn).
+
+        Raises:
+            FileNotFoundError: If there is no log for session_id.
+        """
+        session = {"prompt": None, "model": None, "conversation": [], "turns": 0, "finished": False, "state": {}}
+        good_end = 0  # offset just after the last complete line
+        partial = False
+        with open(self.path_for(session_id), "rb+") as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.endswith(b"\n"):
+                    # A crash while writing leaves a partial last line, everything before it is still valid
+                    logger.warning("Dropping truncated record %d in session %s", line_number, session_id)
+                    partial = True
+                    break
+                good_end += len(line)
+                try:
+                    record = json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    logger.warning("Skipping unreadable record %d in session %s", line_number, session_id)
+                    continue
+                if record["type"] == "start":
+                    session["prompt"] = record["prompt"]
+                    session["model"] = record["model"]
+                elif record["type"] == "turn":
+                    session["conversation"].extend(record["entries"])
+                    session["turns"] = record["turn"] + 1
+                    session["finished"] = record["finished"]
+                    session["state"] = record.get("state", {})
+            if partial:
+                # Cut the partial line off, the turns appended after a resume must start on a line of their own
+                f.truncate(good_end)
+        return session
+
+    def list_sessions(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(f[:-6] for f in os.listdir(self.directory) if f.endswith(".jsonl"))
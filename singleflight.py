@@ -0,0 +1,93 @@
+# Singleflight request coalescing.
+# Concurrent callers asking for the same thing (same canonical key) share one in-flight execution: the
+# first caller runs it, the others block until it ends and get the same result (or the same exception).
+# Nothing is cached once the call is over, a later caller runs it again. Works with any number of
+# threads, which is how the handlers run concurrent sessions.
+
+import hashlib
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def _json_default(obj):
+    # google-genai types are pydantic models, tools are functions
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json", exclude_none=True)
+    if callable(obj) and hasattr(obj, "__qualname__"):
+        return f"{getattr(obj, '__module__', '')}.{obj.__qualname__}"
+    return repr(obj)
+
+
+def canonical_key(*parts):
+    """Stable hash of any JSON-like structure (dict key order does not matter)."""
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=_json_default)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """
+        Runs fn() unless a call with the same key is already running, in which case its result is shared.
+
+        Returns:
+            The result of fn().
+        """
+        return self.do_shared(key, fn)[0]
+
+    def do_shared(self, key, fn):
+        """
+        Like do(), but also tells whether the result was shared, so that what the call cost (e.g. its token
+        usage) is only accounted for once, by the caller that ran it.
+
+        Returns:
+            (result of fn(), False if this caller ran it or True if it joined another caller's call)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+                leader = True
+        if not leader:
+            logger.debug("Joining in-flight call %s", key[:12])
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
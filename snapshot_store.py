@@ -0,0 +1,349 @@
+# Content addressed snapshots of the workspace, to roll back what the agent wrote (including its own tools/).
+# Layout of the store directory:
+#   objects/ab/cdef...   file contents, named by their sha256, so identical contents are stored once
+#   manifests/<id>.json  one per snapshot: {relative path: [sha256, mode, size]}
+#   statcache.json       size, mtime and inode of every file at its last hash
+# Only files whose size/mtime/inode changed since they were last hashed are read again, so taking a
+# snapshot costs one stat per file plus the changed bytes, and an unchanged tree gives back the
+# previous snapshot without writing anything.
+# Several instances (the handler's, the snapshot tools', possibly in a sandbox worker) can share a store:
+# every operation changing it holds a lock on <store>/store.lock.
+
+import contextlib
+import difflib
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the threads of one process are serialized
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SNAPSHOTS_DIR = ".snapshots"
+# Besides tooling and the agent's own stores, the runtime outputs: restoring an old snapshot must not
+# rewrite or delete the terminal log or the results of a batch run
+DEFAULT_EXCLUDE = (".git", ".snapshots", "__pycache__", "*.pyc", ".venv", "venv", "node_modules",
+                   "sessions", "memory", "file_edit_debug", ".archive", "terminal_output.log", "results.jsonl")
+PRUNE_BATCH = 20
+# Ids are generated by snapshot(); anything else (e.g. "../x" coming from the model) is rejected
+SNAPSHOT_ID_PATTERN = re.compile(r"\d{8}-\d{6}-[0-9a-f]{6}")
+
+
+class SnapshotStore:
+    def __init__(self, root=".", directory=None, exclude=DEFAULT_EXCLUDE, max_file_size=20 * 1024 * 1024,
+                 keep=200):
+        """
+        Args:
+            root: The workspace to snapshot.
+            directory: Where the store lives, defaults to <root>/.snapshots.
+            exclude: File or directory name patterns that are never snapshotted nor touched by restore.
+            max_file_size: Larger files are left out of snapshots.
+            keep: Number of snapshots kept, older ones are pruned (None keeps everything).
+        """
+        self.root = os.path.abspath(root)
+        self.directory = os.path.abspath(directory or os.path.join(self.root, DEFAULT_SNAPSHOTS_DIR))
+        self.exclude = tuple(exclude)
+        self.max_file_size = max_file_size
+        self.keep = keep
+        self._objects = os.path.join(self.directory, "objects")
+        self._manifests = os.path.join(self.directory, "manifests")
+        self._stat_cache_path = os.path.join(self.directory, "statcache.json")
+        self._lock_path = os.path.join(self.directory, "store.lock")
+        self._stat_cache = None
+        self._latest = None  # (id, files) of the latest snapshot
+        self._lock = threading.RLock()
+        self._lock_held = False
+        self._seen_mtimes = None  # of the manifests and the stat cache when the lock was last released
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Holds the store against other threads and processes (re-entrant: restore takes a snapshot)."""
+        with self._lock:
+            if self._lock_held:
+                yield
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self._lock_path, "a") as lock:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                self._lock_held = True
+                try:
+                    # Forget what another instance may have changed since
+                    manifests, stat_cache = self._seen_mtimes or (None, None)
+                    if manifests is None or self._mtime(self._manifests) != manifests:
+                        self._latest = None
+                    if stat_cache is None or self._mtime(self._stat_cache_path) != stat_cache:
+                        self._stat_cache = None
+                    yield
+                finally:
+                    self._seen_mtimes = (self._mtime(self._manifests), self._mtime(self._stat_cache_path))
+                    self._lock_held = False
+
+    # --- storage helpers ---
+
+    def _excluded(self, name):
+        return any(fnmatch.fnmatch(name, pattern) for pattern in self.exclude)
+
+    def _blob_path(self, digest):
+        return os.path.join(self._objects, digest[:2], digest[2:])
+
+    def _write_atomic(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def _load_stat_cache(self):
+        if self._stat_cache is None:
+            try:
+                with open(self._stat_cache_path, encoding="utf-8") as f:
+                    self._stat_cache = json.load(f)
+            except (OSError, ValueError):
+                self._stat_cache = {}
+        return self._stat_cache
+
+    def _walk(self):
+        """Yields (relative path, os.stat_result) of every file of the workspace that is not excluded."""
+        stack = [self.root]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if self._excluded(entry.name):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    if os.path.abspath(entry.path) != self.directory:
+                        stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    st = entry.stat(follow_symlinks=False)
+                    if st.st_size <= self.max_file_size:
+                        yield os.path.relpath(entry.path, self.root).replace(os.sep, "/"), st
+
+    def _scan(self, store_blobs):
+        """Current state of the workspace as a manifest, hashing only the files changed since the last scan."""
+        cache = self._load_stat_cache()
+        files = {}
+        hashed = 0
+        seen = set()
+        for rel, st in self._walk():
+            seen.add(rel)
+            signature = [st.st_size, st.st_mtime_ns, st.st_ino]
+            cached = cache.get(rel)
+            digest = cached[3] if cached and cached[:3] == signature else None
+            if digest is None or (store_blobs and not os.path.exists(self._blob_path(digest))):
+                try:
+                    with open(os.path.join(self.root, rel), "rb") as f:
+                        data = f.read()
+                except OSError:
+                    continue
+                digest = hashlib.sha256(data).hexdigest()
+                hashed += 1
+                if store_blobs and not os.path.exists(self._blob_path(digest)):
+                    self._write_atomic(self._blob_path(digest), data)
+                cache[rel] = signature + [digest]
+            files[rel] = [digest, st.st_mode & 0o7777, st.st_size]
+        for rel in set(cache) - seen:
+            del cache[rel]
+        return files, hashed
+
+    def _save_stat_cache(self):
+        self._write_atomic(self._stat_cache_path, json.dumps(self._stat_cache, separators=(",", ":")).encode())
+
+    def _manifest_path(self, snapshot_id):
+        if not isinstance(snapshot_id, str) or not SNAPSHOT_ID_PATTERN.fullmatch(snapshot_id):
+            raise ValueError(f"Invalid snapshot id: {snapshot_id!r}")
+        return os.path.join(self._manifests, f"{snapshot_id}.json")
+
+    def load(self, snapshot_id):
+        with open(self._manifest_path(snapshot_id), encoding="utf-8") as f:
+            return json.load(f)
+
+    # --- public API ---
+
+    def list_snapshots(self):
+        """All snapshots, oldest first, without their file lists."""
+        if not os.path.isdir(self._manifests):
+            return []
+        snapshots = []
+        for name in sorted(os.listdir(self._manifests)):
+            if name.endswith(".json"):
+                manifest = self.load(name[:-5])
+                snapshots.append({"id": manifest["id"], "ts": manifest["ts"], "label": manifest["label"],
+                                  "files": len(manifest["files"])})
+        return sorted(snapshots, key=lambda snapshot: snapshot["ts"])
+
+    def latest(self):
+        snapshots = self.list_snapshots()
+        return snapshots[-1]["id"] if snapshots else None
+
+    def snapshot(self, label=""):
+        """
+        Records the current state of the workspace.
+
+        Returns:
+            The snapshot id. If nothing changed since the latest snapshot, its id is returned instead.
+        """
+        with self._locked():
+            start = time.perf_counter()
+            files, hashed = self._scan(store_blobs=True)
+            self._save_stat_cache()
+            if self._latest is None:
+                previous = self.latest()
+                self._latest = (previous, self.load(previous)["files"] if previous else None)
+            previous, previous_files = self._latest
+            if previous is not None and previous_files == files and os.path.exists(self._manifest_path(previous)):
+                logger.debug("Workspace unchanged since snapshot %s", previous)
+                return previous
+            snapshot_id = time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+            manifest = {"id": snapshot_id, "ts": time.time(), "label": label, "files": files}
+            self._write_atomic(self._manifest_path(snapshot_id), json.dumps(manifest).encode())
+            self._latest = (snapshot_id, files)
+            logger.info("Snapshot %s: %d files, %d hashed in %.3fs", snapshot_id, len(files), hashed,
+                        time.perf_counter() - start)
+            # Pruning reads every manifest, so it runs once per batch of new snapshots
+            if self.keep and len(os.listdir(self._manifests)) > self.keep + PRUNE_BATCH:
+                self.prune(self.keep)
+            return snapshot_id
+
+    def diff(self, old_id, new_id=None):
+        """
+        Files added, removed and modified between two snapshots (new_id=None compares with the workspace).
+
+        Returns:
+            Dict with sorted 'added', 'removed' and 'modified' path lists.
+        """
+        with self._locked():
+            old = self.load(old_id)["files"]
+            new = self.load(new_id)["files"] if new_id else self._scan(store_blobs=False)[0]
+        return {
+            "added": sorted(set(new) - set(old)),
+            "removed": sorted(set(old) - set(new)),
+            "modified": sorted(p for p in set(old) & set(new) if old[p][0] != new[p][0]),
+        }
+
+    def _read_blob(self, digest):
+        with open(self._blob_path(digest), "rb") as f:
+            return f.read()
+
+    def patch(self, old_id, new_id=None, path=None, max_lines=400):
+        """Unified diff of the text files that changed between two snapshots (or with the workspace)."""
+        changes = self.diff(old_id, new_id)
+        old = self.load(old_id)["files"]
+        new = self.load(new_id)["files"] if new_id else None
+        lines = []
+        for rel in changes["modified"] + changes["added"] + changes["removed"]:
+            if path is not None and rel != path:
+                continue
+            before = self._read_blob(old[rel][0]) if rel in old else b""
+            if new is None:
+                try:
+                    with open(os.path.join(self.root, rel), "rb") as f:
+                        after = f.read()
+                except OSError:
+                    after = b""
+            else:
+                after = self._read_blob(new[rel][0]) if rel in new else b""
+            try:
+                before_text, after_text = before.decode("utf-8"), after.decode("utf-8")
+            except UnicodeDecodeError:
+                lines.append(f"Binary file {rel} differs")
+                continue
+            lines.extend(difflib.unified_diff(before_text.splitlines(), after_text.splitlines(),
+                                              f"{old_id}/{rel}", f"{new_id or 'workspace'}/{rel}", lineterm=""))
+            if len(lines) >= max_lines:
+                lines = lines[:max_lines] + ["... (diff truncated)"]
+                break
+        return "\n".join(lines)
+
+    def restore(self, snapshot_id, paths=None, delete_new=True):
+        """
+        Puts the workspace back in the state of a snapshot. Only files whose content differs are rewritten.
+
+        Args:
+            snapshot_id: The snapshot to restore.
+            paths: Optional list of relative paths (or directory prefixes) to restore, default everything.
+            delete_new: Delete the files created after the snapshot (within `paths`).
+
+        Returns:
+            Dict with the 'restored' and 'deleted' path lists.
+        """
+        def selected(rel):
+            return paths is None or any(rel == p.rstrip("/") or rel.startswith(p.rstrip("/") + "/") for p in paths)
+
+        self._manifest_path(snapshot_id)
+        with self._locked():
+            # Taking a snapshot first makes the restore itself undoable
+            self.snapshot(label=f"before restoring {snapshot_id}")
+            target = self.load(snapshot_id)["files"]
+            current = self._scan(store_blobs=False)[0]
+            restored, deleted = [], []
+            for rel, (digest, mode, _) in target.items():
+                if not selected(rel) or (rel in current and current[rel][0] == digest and current[rel][1] == mode):
+                    continue
+                destination = os.path.join(self.root, rel)
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(destination), suffix=".tmp")
+                os.close(fd)
+                shutil.copyfile(self._blob_path(digest), temp_path)
+                os.chmod(temp_path, mode)
+                os.replace(temp_path, destination)
+                restored.append(rel)
+            if delete_new:
+                for rel in current:
+                    if rel not in target and selected(rel):
+                        os.unlink(os.path.join(self.root, rel))
+                        deleted.append(rel)
+            logger.info("Restored snapshot %s: %d files rewritten, %d deleted", snapshot_id, len(restored), len(deleted))
+            return {"restored": sorted(restored), "deleted": sorted(deleted)}
+
+    def prune(self, keep):
+        """Deletes all but the `keep` most recent snapshots and the contents no remaining snapshot uses."""
+        with self._locked():
+            snapshots = self.list_snapshots()
+            if len(snapshots) <= keep:
+                return 0
+            for snapshot in snapshots[:len(snapshots) - keep]:
+                os.unlink(self._manifest_path(snapshot["id"]))
+            used = set()
+            for snapshot in snapshots[len(snapshots) - keep:]:
+                used.update(entry[0] for entry in self.load(snapshot["id"])["files"].values())
+            removed = 0
+            for prefix in os.listdir(self._objects):
+                for name in os.listdir(os.path.join(self._objects, prefix)):
+                    if prefix + name not in used:
+                        os.unlink(os.path.join(self._objects, prefix, name))
+                        removed += 1
+            return removed
+
+
+_default = None
+
+
+def default_store():
+    """The store in DEFAULT_SNAPSHOTS_DIR of the current directory, shared by the handler and the tools."""
+    global _default
+    if _default is None:
+        _default = SnapshotStore()
+    return _default
@@ -0,0 +1,93 @@
+# Cold start report: runs `import gemini_handler` + GeminiHandler() in a fresh interpreter with
+# -X importtime and shows where the time goes, compared with a target.
+#
+# Usage:
+#   python gemini_handler.py --profile-startup
+#   python startup_profile.py --top 20 --target 0.2
+#
+# The target (seconds, default 0.3 or EVOLVE_STARTUP_TARGET) covers the import and the handler
+# construction, not the interpreter itself nor the SDK, which is only imported by the first request.
+# The exit code is 1 when the target is missed, so the report can run in CI.
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+STARTUP_TARGET_SECONDS = float(os.environ.get("EVOLVE_STARTUP_TARGET", "0.3"))
+
+_CHILD = """
+import json, time
+start = time.perf_counter()
+import gemini_handler
+imported = time.perf_counter()
+gemini_handler.GeminiHandler()
+ready = time.perf_counter()
+print(json.dumps({"import": imported - start, "handler": ready - imported,
+                  "sdk_loaded": gemini_handler.genai.__class__.__name__ != "LazyModule"}))
+"""
+
+_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def parse_importtime(stderr):
+    """Returns [(module, self_us, cumulative_us, depth)] from the -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if match:
+            rows.append((match.group(4), int(match.group(1)), int(match.group(2)), len(match.group(3)) // 2))
+    return rows
+
+
+def profile_startup(cwd=None, top=15):
+    """Measures a cold start in a subprocess and returns the timings and the import tree."""
+    cwd = cwd or os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", _CHILD], cwd=cwd, env=env,
+                            capture_output=True, text=True, timeout=120)
+    if result.returncode != 0:
+        raise RuntimeError(f"Startup probe failed:\n{result.stderr[-2000:]}")
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    rows = parse_importtime(result.stderr)
+    return {
+        "import_seconds": timings["import"],
+        "handler_seconds": timings["handler"],
+        "total_seconds": timings["import"] + timings["handler"],
+        "sdk_loaded": timings["sdk_loaded"],
+        "modules": len(rows),
+        "top_cumulative": sorted((r for r in rows if r[3] <= 1), key=lambda r: r[2], reverse=True)[:top],
+        "top_self": sorted(rows, key=lambda r: r[1], reverse=True)[:top],
+    }
+
+
+def format_report(report, target):
+    lines = [
+        f"Cold start: {report['total_seconds'] * 1000:.1f} ms (import {report['import_seconds'] * 1000:.1f} ms, "
+        f"GeminiHandler() {report['handler_seconds'] * 1000:.1f} ms), {report['modules']} modules imported",
+        f"Target: {target * 1000:.0f} ms -> {'OK' if report['total_seconds'] <= target else 'MISSED'}",
+    ]
+    if report["sdk_loaded"]:
+        lines.append("Warning: google.genai was imported during startup")
+    lines.append("\nSlowest imports (cumulative, ms):")
+    lines.extend(f"  {cumulative / 1000:8.1f}  {name}" for name, _, cumulative, _ in report["top_cumulative"])
+    lines.append("\nSlowest modules (self, ms):")
+    lines.extend(f"  {own / 1000:8.1f}  {name}" for name, own, _, _ in report["top_self"])
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile the cold start of the agent.")
+    parser.add_argument("--profile-startup", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--top", type=int, default=15, help="Number of modules listed")
+    parser.add_argument("--target", type=float, default=STARTUP_TARGET_SECONDS, help="Cold start target in seconds")
+    args = parser.parse_args(argv)
+    report = profile_startup(top=args.top)
+    print(format_report(report, args.target))
+    return 0 if report["total_seconds"] <= args.target else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
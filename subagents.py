@@ -0,0 +1,128 @@
+# Sub-agent fan-out / fan-in.
+# The model can split a large task into independent parts with the spawn_subagents tool: every part is
+# solved by a child GeminiHandler session, the children run concurrently, and only their condensed
+# answers come back to the parent conversation. Children share the parent's client, scheduler (so the
+# rate limits hold for the whole tree), usage tracker, SingleFlight, prompt cache, snapshot store, tool
+# output archive and loaded tools (a child never reloads the tool modules its siblings are running).
+#
+# Limits: the depth of the tree (children of depth max_depth cannot spawn), the number of children per
+# call, how many run at once, and a token budget shared by the whole tree of one root task.
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OPTIONS = {
+    "max_depth": 1,  # 1: children cannot spawn sub-agents themselves
+    "max_children": 8,  # per spawn_subagents call
+    "max_parallel": 4,
+    "token_budget": 500_000,  # prompt + output tokens of all the sub-agents of one root task
+    "min_child_tokens": 5_000,  # a child is not started with less than this
+    "result_chars": 2_000,  # longer answers are cut before going back to the parent
+}
+
+SUBAGENT_PROMPT = """You are a sub-agent working on one part of a larger task for a parent agent.
+
+Your task:
+{task}
+{context}
+Work only on this task, the other parts are handled by other agents. When you are done, answer with a \
+concise summary of your findings or of what you changed (at most {words} words), then !FINISHED_TASK!."""
+
+
+class TokenBudget:
+    """Tokens left for the sub-agents of one root task, shared by all levels of the tree."""
+
+    def __init__(self, total):
+        self.total = total
+        self.used = 0
+        self._reserved = 0
+        self._lock = threading.Lock()
+
+    def remaining(self):
+        with self._lock:
+            return max(self.total - self.used - self._reserved, 0)
+
+    def reserve(self, tokens):
+        """Reserves up to `tokens` and returns how many were granted."""
+        with self._lock:
+            granted = max(min(tokens, self.total - self.used - self._reserved), 0)
+            self._reserved += granted
+            return granted
+
+    def charge(self, reserved, actual):
+        with self._lock:
+            self._reserved -= reserved
+            self.used += actual
+
+
+def _run_child(parent, task, context, model, budget, max_tokens, options):
+    from gemini_handler import GeminiHandler
+    child = GeminiHandler(
+        client=parent.client, scheduler=parent.scheduler, rate_limiter=parent.rate_limiter,
+        usage_tracker=parent.usage_tracker, singleflight=parent.singleflight, prompt_cache=parent.prompt_cache,
+        snapshots=parent.snapshot_store, sandbox_tools=parent.tool_sandbox, archive=parent.tool_archive,
+        memory=parent.memory, priority=parent.priority, sessions_dir=parent.session_store.directory, history_size=2,
+        progress_options=dict(parent.progress_options, max_tokens=max_tokens),
+        subagents=options, depth=parent.depth + 1, subagent_budget=budget, tools_from=parent,
+    )
+    context = f"\nContext from the parent agent:\n{context}\n" if context else ""
+    prompt = SUBAGENT_PROMPT.format(task=task, context=context, words=options["result_chars"] // 8)
+    result = {"task": task}
+    try:
+        answer = child.solve_task(prompt, model=model)
+        answer = (answer or "").replace("!FINISHED_TASK!", "").strip()
+        if len(answer) > options["result_chars"]:
+            answer = answer[:options["result_chars"]] + " [...]"
+        result.update(status="ok", result=answer)
+    except Exception as e:
+        logger.exception("Sub-agent failed on: %s", task)
+        result.update(status="error", error=f"{type(e).__name__}: {e}")
+    usage = child.last_task_usage
+    result.update(session_id=child.session_id, turns=usage["turns"], tokens=usage["total_tokens"])
+    return result
+
+
+def run_subagents(parent, tasks, context=None, model=None):
+    """
+    Solves every task with a child session of `parent`, concurrently.
+
+    Returns:
+        One dict per task, in order: task, status ('ok', 'error' or 'skipped'), result or error, session_id,
+        turns and tokens.
+    """
+    options = parent.subagent_options
+    if parent.depth >= options["max_depth"]:
+        return [{"error": f"Sub-agents cannot spawn sub-agents beyond depth {options['max_depth']}."}]
+    tasks = [t for t in tasks if t and t.strip()]
+    if not tasks:
+        return [{"error": "No task given."}]
+    if len(tasks) > options["max_children"]:
+        return [{"error": f"At most {options['max_children']} sub-agents per call, got {len(tasks)}. "
+                          f"Group the work into fewer, larger tasks."}]
+    budget = parent.subagent_budget
+    if budget is None:
+        budget = parent.subagent_budget = TokenBudget(options["token_budget"])
+    model = model or parent.current_model
+    share = budget.remaining() // len(tasks)
+    results = [None] * len(tasks)
+    grants = []
+    for i, task in enumerate(tasks):
+        granted = budget.reserve(share) if share >= options["min_child_tokens"] else 0
+        if not granted:
+            results[i] = {"task": task, "status": "skipped",
+                          "error": f"Sub-agent token budget exhausted ({budget.used}/{budget.total} used)."}
+        grants.append(granted)
+    logger.info("Spawning %d sub-agents (depth %d, %d tokens each)", sum(1 for g in grants if g),
+                parent.depth + 1, share)
+
+    with ThreadPoolExecutor(max_workers=min(options["max_parallel"], len(tasks)),
+                            thread_name_prefix=f"subagent-{parent.depth + 1}") as pool:
+        futures = {i: pool.submit(_run_child, parent, tasks[i], context, model, budget, grants[i], options)
+                   for i in range(len(tasks)) if grants[i]}
+        for i, future in futures.items():
+            results[i] = future.result()
+            budget.charge(grants[i], results[i].get("tokens", 0))
+    return results
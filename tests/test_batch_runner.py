@@ -0,0 +1,65 @@
+import json
+import logging
+
+from batch_runner import BatchRunner
+
+
+class FakeHandler:
+    session_id = "session"
+    last_task_usage = {"prompt_tokens": 10, "output_tokens": 2}
+
+    def __init__(self, solved):
+        self.solved = solved
+
+    def solve_task(self, prompt, model=None):
+        self.solved.append(prompt)
+        if prompt == "boom":
+            raise RuntimeError("model error")
+        return f"done: {prompt}"
+
+
+def _write_lines(path, records):
+    path.write_text("".join(json.dumps(record) + "\n" for record in records))
+
+
+def _results(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_resume_skips_completed_tasks(tmp_path, monkeypatch):
+    tasks, output = tmp_path / "tasks.jsonl", tmp_path / "results.jsonl"
+    _write_lines(tasks, [{"id": "a", "prompt": "first"}, {"id": "b", "prompt": "second"},
+                         {"id": "c", "prompt": "third"}])
+    # a succeeded in an earlier run, b failed and is retried
+    _write_lines(output, [{"task_id": "a", "status": "ok"}, {"task_id": "b", "status": "error"}])
+    solved = []
+    runner = BatchRunner(str(tasks), str(output), concurrency=1, resume=True)
+    monkeypatch.setattr(runner, "_handler", lambda: FakeHandler(solved))
+    stats = runner.run()
+    assert solved == ["second", "third"]
+    assert (stats.done, stats.failed) == (2, 0)
+    assert [(r["task_id"], r["status"]) for r in _results(output)][2:] == [("b", "ok"), ("c", "ok")]
+
+
+def test_failures_are_recorded_against_the_task(tmp_path, monkeypatch, caplog):
+    tasks, output = tmp_path / "tasks.jsonl", tmp_path / "results.jsonl"
+    _write_lines(tasks, [{"id": "a", "prompt": "boom"}, {"id": "b", "prompt": "fine"}])
+    runner = BatchRunner(str(tasks), str(output), concurrency=1, stats_interval=0)
+
+    def broken_handler():
+        raise ValueError("no API key")
+
+    monkeypatch.setattr(runner, "_handler", broken_handler)
+    with caplog.at_level(logging.INFO, logger="batch_runner"):
+        stats = runner.run()
+    results = _results(output)
+    assert [(r["task_id"], r["status"], r["error"]) for r in results] == [
+        ("a", "error", "ValueError: no API key"), ("b", "error", "ValueError: no API key")]
+    assert results[0]["session_id"] is None and results[0]["usage"] == {}
+    assert stats.failed == 2
+    assert sum("Progress:" in record.getMessage() for record in caplog.records) == 2
+
+    solved = []
+    monkeypatch.setattr(runner, "_handler", lambda: FakeHandler(solved))
+    runner.run()
+    assert _results(output)[2]["error"] == "RuntimeError: model error"
@@ -0,0 +1,19 @@
+import os
+
+from tools.file_batch import write_files
+
+
+def test_new_files_get_the_umask_permissions(tmp_path):
+    old = os.umask(0o027)
+    try:
+        assert write_files({str(tmp_path / "a.txt"): "a"}).startswith("Committed")
+    finally:
+        os.umask(old)
+    assert os.stat(tmp_path / "a.txt").st_mode & 0o777 == 0o640
+
+
+def test_rollback_removes_created_directories(tmp_path):
+    (tmp_path / "z_file").write_text("not a directory")
+    result = write_files({str(tmp_path / "a_new" / "deep" / "a.txt"): "a", str(tmp_path / "z_file" / "b.txt"): "b"})
+    assert "Nothing was changed" in result
+    assert not (tmp_path / "a_new").exists()
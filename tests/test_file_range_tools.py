@@ -0,0 +1,24 @@
+from tools.file_range_tools import search_file
+
+
+def test_regex_anchors_match_at_line_boundaries(tmp_path):
+    path = tmp_path / "code.py"
+    path.write_text("import os\n\ndef first():\n    pass\n\nclass A:\n    def method(self):\n        pass\n")
+
+    result = search_file(str(path), "^def ", regex=True)
+    assert result.startswith("1 matching lines")
+    assert "3: def first():" in result
+
+    result = search_file(str(path), "pass$", regex=True)
+    assert result.startswith("2 matching lines")
+    assert "4:     pass" in result and "8:         pass" in result
+
+
+def test_continuation_does_not_skip_matches_in_context(tmp_path):
+    path = tmp_path / "log.txt"
+    path.write_text("".join(f"{'hit' if i in (1, 2, 3) else 'other'} {i}\n" for i in range(1, 11)))
+
+    result = search_file(str(path), "hit", max_results=1, context_lines=2)
+    assert "continue with start_line=2" in result
+    result = search_file(str(path), "hit", max_results=5, start_line=2)
+    assert result.startswith("2 matching lines")
@@ -0,0 +1,46 @@
+import pytest
+
+pytest.importorskip("google.genai")
+
+import tool_archive  # noqa: E402
+from gemini_handler import GeminiHandler  # noqa: E402
+from snapshot_store import SnapshotStore  # noqa: E402
+from tool_archive import ToolArchive  # noqa: E402
+
+
+def test_feature_tools_are_pinned(tmp_path, monkeypatch):
+    monkeypatch.setenv(tool_archive.ENABLED_ENV, "")
+    handler = GeminiHandler(sessions_dir=str(tmp_path), client=object(), preflight_tools=False, tool_top_k=3,
+                            archive=ToolArchive(tmp_path / "archive"), snapshots=SnapshotStore(tmp_path))
+    prompt = "remember this fact and recall memories later"
+    names = [func.__name__ for func in handler._select_tools(prompt, [])]
+    assert "read_archive" in names
+    assert "restore_snapshot" in names
+
+
+def test_subset_only_grows_within_a_task(tmp_path):
+    handler = GeminiHandler(sessions_dir=str(tmp_path), client=object(), preflight_tools=False, tool_top_k=2)
+    first = [func.__name__ for func in handler._select_tools("calculate a sum", [])]
+    conversation = [{"role": "model", "parts": [{"function_call": {"name": "read_directory", "args": {}}}]}]
+    second = [func.__name__ for func in handler._select_tools("calculate a sum", conversation)]
+    assert set(first) < set(second)
+    assert "read_directory" in second
+
+
+def test_estimate_counts_the_output_once_and_only_new_parts(tmp_path):
+    handler = GeminiHandler(sessions_dir=str(tmp_path), client=object(), preflight_tools=False)
+    conversation = [{"role": "user", "parts": [{"text": "go"}]},
+                    {"role": "model", "parts": [{"text": "x" * 4000}]},
+                    {"role": "user", "parts": [{"text": "y" * 400}]}]
+    usage = {"prompt_tokens": 1000, "output_tokens": 1000}
+    estimate = handler._estimate_tokens(conversation, usage, 1)
+    assert 2100 <= estimate <= 2110
+
+
+def test_reload_restarts_a_shared_sandbox(tmp_path):
+    from tool_sandbox import ToolSandbox
+    sandbox = ToolSandbox(workers=0)
+    handler = GeminiHandler(sessions_dir=str(tmp_path), client=object(), preflight_tools=False, sandbox_tools=sandbox)
+    generation = sandbox._generation
+    handler.reload_tools()
+    assert sandbox._generation == generation + 1
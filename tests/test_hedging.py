@@ -0,0 +1,54 @@
+import threading
+import time
+
+from hedging import Hedger
+
+
+def _warm(hedger, seconds=0.01):
+    for _ in range(hedger.min_samples):
+        hedger.latencies.add(seconds)
+
+
+def test_no_hedge_if_the_call_finished_while_waiting_for_a_slot():
+    hedger = Hedger(min_samples=2, min_delay=0.05)
+    _warm(hedger)
+    finished = threading.Event()
+    calls = []
+    settled = []
+
+    def fn():
+        calls.append(1)
+        time.sleep(0.1)
+        finished.set()
+        return "primary"
+
+    def before_hedge():
+        finished.wait()
+        time.sleep(0.01)
+        return "slot"
+
+    assert hedger.call(fn, before_hedge, lambda reservation, result: settled.append((reservation, result))) == "primary"
+    assert len(calls) == 1
+    assert hedger.hedges == 0
+    assert settled == [("slot", None)]
+
+
+def test_losing_hedge_is_settled_with_its_result():
+    hedger = Hedger(min_samples=2, min_delay=0.05)
+    _warm(hedger)
+    settled = threading.Event()
+    outcome = []
+    answers = iter([("primary", 0.1), ("hedge", 0.3)])
+
+    def fn():
+        answer, delay = next(answers)
+        time.sleep(delay)
+        return answer
+
+    def after_hedge(reservation, result):
+        outcome.append((reservation, result))
+        settled.set()
+
+    assert hedger.call(fn, lambda: "slot", after_hedge) == "primary"
+    assert settled.wait(2)
+    assert outcome == [("slot", "hedge")]
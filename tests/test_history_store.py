@@ -0,0 +1,27 @@
+from history_store import HistoryEntry, HistoryStore
+
+
+def test_maxlen_zero_spills_every_entry(tmp_path):
+    store = HistoryStore(maxlen=0, spill_path=str(tmp_path / "history.jsonl"))
+    for n in range(3):
+        store.append(HistoryEntry(role="model", content=str(n)))
+    assert len(store) == 0
+    assert [entry.content for entry in store.query()] == ["0", "1", "2"]
+
+
+def test_evicted_entries_are_spilled_in_order(tmp_path):
+    store = HistoryStore(maxlen=2, spill_path=str(tmp_path / "history.jsonl"))
+    for n in range(5):
+        store.append(HistoryEntry(role="model", content=str(n), tool_calls=["calculator"] if n % 2 else []))
+    assert [entry.content for entry in store] == ["3", "4"]
+    assert [entry.content for entry in store.query(tool="calculator")] == ["1", "3"]
+
+
+def test_recent_returns_the_last_entries():
+    store = HistoryStore(maxlen=5)
+    for n in range(3):
+        store.append(HistoryEntry(role="model", content=str(n)))
+    assert [entry.content for entry in store.recent(2)] == ["1", "2"]
+    assert [entry.content for entry in store.recent()] == ["0", "1", "2"]
+    assert store.recent(0) == []
+    assert store.recent(-1) == []
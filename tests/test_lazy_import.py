@@ -0,0 +1,83 @@
+import inspect
+import sys
+from typing import List, Optional
+
+from lazy_import import LazyModule, lazy_functions, lazy_module
+from startup_profile import format_report, parse_importtime
+
+TOOL_SOURCE = '''
+from typing import List, Optional
+
+import sys
+sys.modules[__name__].imports = getattr(sys.modules[__name__], "imports", 0) + 1
+
+
+def add(values: List[int], start: int = 0, label: Optional[str] = None) -> str:
+    """Adds the values."""
+    return f"{label or 'sum'}={start + sum(values)}"
+
+
+def _private():
+    pass
+'''
+
+
+def _module(tmp_path, monkeypatch, name, source):
+    (tmp_path / f"{name}.py").write_text(source)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, name, raising=False)
+    return str(tmp_path / f"{name}.py")
+
+
+def test_lazy_module_imports_on_first_attribute(tmp_path, monkeypatch):
+    _module(tmp_path, monkeypatch, "heavy_dependency", "VALUE = 42\n")
+    module = lazy_module("heavy_dependency")
+    assert isinstance(module, LazyModule) and not module.is_loaded
+    assert "heavy_dependency" not in sys.modules
+    assert module.VALUE == 42
+    assert module.is_loaded and sys.modules["heavy_dependency"].VALUE == 42
+    module.VALUE = 7
+    assert sys.modules["heavy_dependency"].VALUE == 7
+    # Already imported modules are returned as they are
+    assert lazy_module("heavy_dependency") is sys.modules["heavy_dependency"]
+
+
+def test_lazy_functions_import_on_first_call(tmp_path, monkeypatch):
+    path = _module(tmp_path, monkeypatch, "lazy_tool", TOOL_SOURCE)
+    functions = lazy_functions(path, "lazy_tool")
+    assert [function.__name__ for function in functions] == ["add"]
+    add = functions[0]
+    assert "lazy_tool" not in sys.modules
+    assert add.__doc__ == "Adds the values."
+    assert str(inspect.signature(add)) == str(inspect.Signature([
+        inspect.Parameter("values", inspect.Parameter.POSITIONAL_OR_KEYWORD, annotation=List[int]),
+        inspect.Parameter("start", inspect.Parameter.POSITIONAL_OR_KEYWORD, default=0, annotation=int),
+        inspect.Parameter("label", inspect.Parameter.POSITIONAL_OR_KEYWORD, default=None,
+                          annotation=Optional[str])], return_annotation=str))
+    assert add([1, 2], start=3) == "sum=6"
+    assert add([1], label="total") == "total=1"
+    assert sys.modules["lazy_tool"].imports == 1
+
+
+def test_lazy_functions_give_up_on_what_needs_the_module(tmp_path, monkeypatch):
+    decorated = _module(tmp_path, monkeypatch, "decorated_tool",
+                        "import functools\n\n@functools.lru_cache\ndef tool(x: int) -> int:\n    return x\n")
+    assert lazy_functions(decorated, "decorated_tool") is None
+    custom_type = _module(tmp_path, monkeypatch, "typed_tool",
+                          "from pathlib import Path\n\ndef tool(p: Path) -> str:\n    return str(p)\n")
+    assert lazy_functions(custom_type, "typed_tool") is None
+
+
+def test_startup_report_from_importtime():
+    stderr = ("import time: self [us] | cumulative | imported package\n"
+              "import time:       200 |        200 |   json.decoder\n"
+              "import time:      1000 |       1200 | json\n"
+              "import time:      3000 |       3000 | gemini_handler\n")
+    rows = parse_importtime(stderr)
+    assert rows == [("json.decoder", 200, 200, 1), ("json", 1000, 1200, 0), ("gemini_handler", 3000, 3000, 0)]
+    report = {"import_seconds": 0.2, "handler_seconds": 0.15, "total_seconds": 0.35, "sdk_loaded": True,
+              "modules": 3, "top_cumulative": rows[:1], "top_self": rows[2:]}
+    text = format_report(report, target=0.3)
+    assert "Cold start: 350.0 ms" in text and "-> MISSED" in text
+    assert "google.genai was imported" in text
+    assert "3.0  gemini_handler" in text
@@ -0,0 +1,38 @@
+import multiprocessing
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from memory_store import MemoryStore
+
+
+def _writer(directory, worker):
+    store = MemoryStore(directory)
+    for i in range(50):
+        store.add(f"worker {worker} memory {i}", kind=f"w{worker}")
+
+
+def test_concurrent_writers_keep_rows_aligned(tmp_path):
+    processes = [multiprocessing.Process(target=_writer, args=(str(tmp_path), w)) for w in range(4)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    store = MemoryStore(str(tmp_path))
+    assert len(store) == 200
+    for memory_id in range(200):
+        record = store.get(memory_id)
+        assert record["id"] == memory_id
+        assert record["text"].startswith(f"worker {record['kind'][1:]} ")
+
+
+def test_kind_filter_returns_top_k_when_the_kind_is_rare(tmp_path):
+    store = MemoryStore(str(tmp_path))
+    for i in range(300):
+        store.add(f"deploy the service step {i}", kind="note")
+    for i in range(5):
+        store.add(f"unrelated lesson {i}", kind="lesson")
+    results = store.search("deploy the service", top_k=5, kind="lesson")
+    assert len(results) == 5
+    assert all(r["kind"] == "lesson" for r in results)
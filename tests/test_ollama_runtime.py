@@ -0,0 +1,72 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Exp"))
+
+from ollama_runtime import OllamaRuntime  # noqa: E402
+from ollama_stub_server import StubOllamaServer  # noqa: E402
+
+
+@pytest.fixture
+def stub():
+    server = StubOllamaServer(load_seconds=0.2, generate_seconds=0.05, parallel=2).start()
+    yield server
+    server.stop()
+
+
+def test_preload_loads_every_model(stub):
+    runtime = OllamaRuntime(["a", "b"], host=stub.url, ping_interval=0)
+    runtime.start()
+    assert runtime.resident_models() == {"a", "b"}
+    load = runtime.report()["latency"]
+    assert load["a"]["load"]["count"] == 1
+    assert load["a"]["load"]["max"] == pytest.approx(0.2)
+    # Already resident: loading again costs nothing
+    assert runtime.load("a") == 0
+
+
+def test_keep_alive_pings_keep_the_model_resident(stub):
+    runtime = OllamaRuntime(["a"], host=stub.url, keep_alive="0.3s", ping_interval=0.1).start()
+    try:
+        time.sleep(0.6)
+    finally:
+        runtime.stop()
+    assert runtime.report()["latency"]["a"]["load"]["count"] == 1
+    assert len([request for request in stub.requests if request == ("POST", "/api/generate")]) >= 3
+
+
+def test_keep_alive_records_a_reload_after_expiry(stub):
+    # keep_alive shorter than the ping interval: every ping finds the model unloaded
+    runtime = OllamaRuntime(["a"], host=stub.url, keep_alive="0.05s", ping_interval=0.2).start()
+    try:
+        time.sleep(0.7)
+    finally:
+        runtime.stop()
+    assert runtime.report()["latency"]["a"]["load"]["count"] >= 2
+
+
+def test_slots_queue_requests_beyond_parallel(stub):
+    runtime = OllamaRuntime(["a"], host=stub.url, parallel=1, ping_interval=0)
+    states = []
+
+    def work():
+        with runtime.slot("a"):
+            states.append(runtime.load_state())
+            time.sleep(0.1)
+
+    threads = [threading.Thread(target=work) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(state["active"] == 1 for state in states)
+    assert max(state["queued"] for state in states) >= 1
+    stats = runtime.report()["latency"]["a"]
+    assert stats["queue"]["count"] == 3
+    assert stats["queue"]["max"] >= 0.15
+    assert stats["generation"]["count"] == 3
+    assert runtime.load_state() == {"active": 0, "queued": 0, "parallel": 1}
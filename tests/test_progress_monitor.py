@@ -0,0 +1,33 @@
+from progress_monitor import HINT, STOP, ProgressMonitor
+
+
+def _call(n):
+    return [("read_file", {"path": f"f{n}.txt"}, {"result": str(n)})]
+
+
+def test_repeats_far_apart_are_not_a_loop():
+    monitor = ProgressMonitor(max_turns=None, repeat_threshold=3, repeat_window=4, stall_turns=100)
+    status = [("run_shell_command", {"command": "git status"}, {"result": "clean"})]
+    for n in range(30):
+        calls = status if n % 5 == 0 else _call(n)
+        assert monitor.observe("", calls) is None
+
+
+def test_ladder_step_resets_the_repeat_count():
+    monitor = ProgressMonitor(max_turns=None, repeat_threshold=3, stall_turns=100, max_cycle_length=0, max_hints=2)
+    same = _call(0)
+    assert monitor.observe("", same) is None
+    assert monitor.observe("", same) is None
+    assert monitor.observe("", same)[0] == HINT
+    # One more repeat right after the hint is not yet a new loop
+    assert monitor.observe("", same) is None
+
+
+def test_budgets_continue_after_restore():
+    monitor = ProgressMonitor(max_turns=5, max_tokens=1000)
+    for n in range(3):
+        monitor.observe("", _call(n), tokens=300)
+    resumed = ProgressMonitor(max_turns=5, max_tokens=1000)
+    resumed.restore(monitor.state())
+    assert resumed.observe("", _call(3), tokens=300) == (STOP, "token budget of 1000 reached")
+    assert resumed.turns == 4
@@ -0,0 +1,74 @@
+import prompt_cache
+from prompt_cache import GeminiCacheBackend, LocalCacheBackend, PromptCache
+
+
+def test_alternating_tool_sets_reuse_their_caches():
+    backend = LocalCacheBackend()
+    cache = PromptCache(backend, max_per_model=2)
+    first = cache.get("model", "prompt", [], tools_key="tools-a")
+    second = cache.get("model", "prompt", [], tools_key="tools-b")
+    for _ in range(5):
+        assert cache.get("model", "prompt", [], tools_key="tools-a") == first
+        assert cache.get("model", "prompt", [], tools_key="tools-b") == second
+    assert backend.created == 2
+
+    cache.get("model", "prompt", [], tools_key="tools-c")
+    assert backend.created == 3
+    assert backend.deleted == 1  # tools-a was the least recently used
+    assert first not in backend.contents
+
+
+class FlakyBackend(LocalCacheBackend):
+    def __init__(self, errors):
+        super().__init__()
+        self.errors = list(errors)
+        self.attempts = 0
+
+    def create(self, model, system_prompt, tools, ttl_seconds):
+        self.attempts += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return super().create(model, system_prompt, tools, ttl_seconds)
+
+
+class ApiError(Exception):
+    def __init__(self, code):
+        super().__init__(f"error {code}")
+        self.code = code
+
+
+def test_transient_failures_are_retried_with_backoff(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(prompt_cache.time, "time", lambda: now[0])
+    backend = FlakyBackend([ApiError(503), ConnectionError("reset")])
+    cache = PromptCache(backend)
+    assert cache.get("model", "prompt", [], tools_key="t") is None
+    assert cache.get("model", "prompt", [], tools_key="t") is None
+    assert backend.attempts == 1  # waiting for the retry delay
+    now[0] += prompt_cache.RETRY_DELAY + 1
+    assert cache.get("model", "prompt", [], tools_key="t") is None
+    now[0] += prompt_cache.RETRY_DELAY + 1
+    assert cache.get("model", "prompt", [], tools_key="t") is None  # the delay doubled
+    now[0] += prompt_cache.RETRY_DELAY
+    assert cache.get("model", "prompt", [], tools_key="t") is not None
+    assert backend.attempts == 3
+
+
+def test_client_errors_are_not_retried(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(prompt_cache.time, "time", lambda: now[0])
+    backend = FlakyBackend([ApiError(400)])
+    cache = PromptCache(backend)
+    assert cache.get("model", "prompt", [], tools_key="t") is None
+    now[0] += prompt_cache.MAX_RETRY_DELAY + 1
+    assert cache.get("model", "prompt", [], tools_key="t") is None
+    assert backend.attempts == 1
+
+
+def test_gemini_backend_gets_its_client_on_first_use():
+    calls = []
+    backend = GeminiCacheBackend(client_factory=lambda: calls.append(1) or "client")
+    assert calls == []
+    assert backend.client == "client"
+    assert backend.client == "client"
+    assert calls == [1]
@@ -0,0 +1,64 @@
+import threading
+import time
+
+import pytest
+
+from rate_limiter import RateLimiter
+from scheduler import BATCH, INTERACTIVE, DeadlineExceeded, RequestScheduler
+
+
+def _admit_in_order(scheduler, requests):
+    """Queues every (session, priority, tokens) while the only slot is taken, returns the admission order."""
+    order = []
+    lock = threading.Lock()
+
+    def run(index, session, priority, tokens):
+        scheduler.acquire(session, priority, tokens)
+        with lock:
+            order.append(index)
+
+    threads = []
+    for index, (session, priority, tokens) in enumerate(requests):
+        thread = threading.Thread(target=run, args=(index, session, priority, tokens))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.02)  # queued in this order
+    for thread in threads:
+        thread.join(5)
+    return order
+
+
+def test_fair_queuing_between_sessions():
+    scheduler = RequestScheduler(RateLimiter(requests_per_minute=1, window=0.1))
+    scheduler.acquire("warm-up")  # the slot is taken while the others queue
+    requests = [("big", INTERACTIVE, 100)] * 4 + [("small", INTERACTIVE, 100)]
+    order = _admit_in_order(scheduler, requests)
+    # The small session's only request goes before the big session's second one
+    assert order.index(4) <= 1
+
+
+def test_interactive_goes_before_batch():
+    scheduler = RequestScheduler(RateLimiter(requests_per_minute=1, window=0.1), interactive_reserve=0)
+    scheduler.acquire("warm-up")
+    order = _admit_in_order(scheduler, [("batch", BATCH, 10), ("batch", BATCH, 10), ("user", INTERACTIVE, 10)])
+    assert order[0] == 2
+
+
+def test_request_that_cannot_make_its_deadline_is_rejected():
+    scheduler = RequestScheduler(RateLimiter(requests_per_minute=1, window=10))
+    scheduler.acquire("a")
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        scheduler.acquire("b", deadline=time.monotonic() + 1)
+    assert time.monotonic() - start < 0.5  # rejected up front, not after waiting
+    assert scheduler.queued() == {INTERACTIVE: 0, BATCH: 0}
+
+
+def test_full_interactive_reserve_still_admits_batch():
+    scheduler = RequestScheduler(RateLimiter(requests_per_minute=2, window=10), interactive_reserve=1.0)
+    assert scheduler.acquire("batch", BATCH) is not None
+
+
+def test_rate_limiter_rejects_an_empty_quota():
+    with pytest.raises(ValueError):
+        RateLimiter(requests_per_minute=0)
@@ -0,0 +1,102 @@
+import asyncio
+import json
+import threading
+
+from service import AgentService
+
+
+class FakeHandler:
+    def __init__(self):
+        self.priority = None
+        self.release = threading.Event()
+        self.release.set()
+
+    def solve_task(self, prompt, model=None, resume=None, on_event=None):
+        if prompt == "fail":
+            raise RuntimeError("model error")
+        if on_event:
+            on_event({"type": "turn", "turn": 1})
+        self.release.wait(5)
+        return f"{model}: {prompt}"
+
+
+def _service(**kwargs):
+    service = AgentService(workers=1, model="fake-model", **kwargs)
+    handler = FakeHandler()
+    service._handlers.put(handler)
+    return service, handler
+
+
+async def _request(port, method, path, payload=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: test\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    head, _, content = (await reader.read()).partition(b"\r\n\r\n")
+    writer.close()
+    return int(head.split()[1]), content
+
+
+def _serve(service, scenario):
+    async def run():
+        server = await asyncio.start_server(service.handle, "127.0.0.1", 0)
+        try:
+            return await scenario(server.sockets[0].getsockname()[1])
+        finally:
+            server.close()
+            await server.wait_closed()
+            service.close()
+
+    return asyncio.run(run())
+
+
+def test_health_and_plain_task():
+    service, _ = _service()
+
+    async def scenario(port):
+        status, body = await _request(port, "POST", "/tasks", {"prompt": "hi", "stream": False})
+        assert (status, json.loads(body)) == (200, {"result": "fake-model: hi"})
+        status, body = await _request(port, "GET", "/health")
+        return status, json.loads(body)
+
+    status, health = _serve(service, scenario)
+    assert status == 200
+    assert health["workers"] == 1 and health["completed"] == 1 and health["failed"] == 0
+
+
+def test_streams_events_then_the_error():
+    service, _ = _service()
+
+    async def scenario(port):
+        ok = await _request(port, "POST", "/tasks", {"prompt": "hi"})
+        failed = await _request(port, "POST", "/tasks", {"prompt": "fail"})
+        return ok, failed
+
+    (status, body), (_, failed) = _serve(service, scenario)
+    events = [json.loads(line) for line in body.splitlines()]
+    assert status == 200
+    assert [event["type"] for event in events] == ["queued", "turn"]
+    assert json.loads(failed.splitlines()[-1]) == {"type": "error", "error": "RuntimeError: model error"}
+    assert service.health()["failed"] == 1
+
+
+def test_rejects_invalid_and_excess_tasks():
+    service, handler = _service(max_pending=1)
+    handler.release.clear()
+
+    async def scenario(port):
+        results = [await _request(port, "POST", "/tasks", {"model": "x"}),
+                   await _request(port, "GET", "/nowhere")]
+        # The worker is busy with the first task, the second waits and the third is rejected
+        running = asyncio.ensure_future(_request(port, "POST", "/tasks", {"prompt": "a", "stream": False}))
+        while service.health()["running"] == 0:
+            await asyncio.sleep(0.01)
+        waiting = asyncio.ensure_future(_request(port, "POST", "/tasks", {"prompt": "b", "stream": False}))
+        while service.health()["pending"] == 0:
+            await asyncio.sleep(0.01)
+        results.append(await _request(port, "POST", "/tasks", {"prompt": "c", "stream": False}))
+        handler.release.set()
+        await asyncio.gather(running, waiting)
+        return [status for status, _ in results]
+
+    assert _serve(service, scenario) == [400, 404, 503]
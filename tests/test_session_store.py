@@ -0,0 +1,29 @@
+from session_store import SessionStore
+
+
+def test_resume_after_truncated_record(tmp_path):
+    store = SessionStore(str(tmp_path), fsync=False)
+    store.start("s", "prompt", "model")
+    store.append_turn("s", 0, [{"role": "model", "parts": [{"text": "a"}]}])
+    with open(store.path_for("s"), "a", encoding="utf-8") as f:
+        f.write('{"type":"turn","turn":1,"entr')  # crash in the middle of a write
+
+    assert store.load("s")["turns"] == 1
+    store.append_turn("s", 1, [{"role": "model", "parts": [{"text": "b"}]}])
+    store.append_turn("s", 2, [{"role": "model", "parts": [{"text": "c"}]}])
+
+    session = store.load("s")
+    assert session["turns"] == 3
+    assert [e["parts"][0]["text"] for e in session["conversation"]] == ["a", "b", "c"]
+
+
+def test_unreadable_record_is_skipped(tmp_path):
+    store = SessionStore(str(tmp_path), fsync=False)
+    store.start("s", "prompt", "model")
+    with open(store.path_for("s"), "a", encoding="utf-8") as f:
+        f.write("not json\n")
+    store.append_turn("s", 0, [{"role": "model", "parts": [{"text": "a"}]}])
+
+    session = store.load("s")
+    assert session["prompt"] == "prompt"
+    assert session["turns"] == 1
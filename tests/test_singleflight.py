@@ -0,0 +1,63 @@
+import threading
+import time
+
+import pytest
+
+from singleflight import SingleFlight, canonical_key
+
+
+def _concurrently(n, target):
+    results = [None] * n
+    errors = [None] * n
+
+    def run(i):
+        try:
+            results[i] = target()
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results, errors
+
+
+def test_followers_share_the_leader_result():
+    flight = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"answer": 42}
+
+    results, errors = _concurrently(4, lambda: flight.do_shared("k", slow))
+    assert errors == [None] * 4
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True]
+    assert all(result is results[0][0] for result, _ in results)
+    assert (flight.executions, flight.coalesced) == (1, 3)
+    assert flight.in_flight() == 0
+    # Nothing is cached once the call is over
+    assert flight.do("k", lambda: "again") == "again"
+
+
+def test_followers_get_the_leader_exception():
+    flight = SingleFlight()
+
+    def failing():
+        time.sleep(0.2)
+        raise RuntimeError("quota")
+
+    _, errors = _concurrently(3, lambda: flight.do("k", failing))
+    assert all(isinstance(e, RuntimeError) and str(e) == "quota" for e in errors)
+    assert flight.executions == 1
+    with pytest.raises(ValueError):
+        flight.do("k", lambda: int("x"))
+
+
+def test_canonical_key_ignores_dict_order():
+    assert canonical_key({"a": 1, "b": [1, 2]}) == canonical_key({"b": [1, 2], "a": 1})
+    assert canonical_key({"a": 1}) != canonical_key({"a": 2})
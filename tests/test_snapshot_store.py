@@ -0,0 +1,73 @@
+import os
+import threading
+
+import snapshot_store
+from snapshot_store import SnapshotStore
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def test_restore_keeps_runtime_outputs(tmp_path):
+    _write(tmp_path / "a.txt", "one")
+    store = SnapshotStore(tmp_path)
+    first = store.snapshot()
+    _write(tmp_path / "a.txt", "two")
+    _write(tmp_path / "terminal_output.log", "$ make\n")
+    _write(tmp_path / "results.jsonl", "{}\n")
+    result = store.restore(first)
+    assert result == {"restored": ["a.txt"], "deleted": []}
+    assert (tmp_path / "terminal_output.log").exists()
+    assert (tmp_path / "results.jsonl").exists()
+
+
+def test_restore_tool_keeps_new_files_by_default(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(snapshot_store, "_default", None)
+    from tools.snapshot_tools import restore_snapshot
+
+    _write(tmp_path / "a.txt", "one")
+    first = snapshot_store.default_store().snapshot()
+    _write(tmp_path / "new.txt", "new")
+    assert "Deleted: -" in restore_snapshot(first)
+    assert (tmp_path / "new.txt").exists()
+    assert "Deleted: new.txt" in restore_snapshot(first, delete_new=True)
+
+
+def test_instances_sharing_a_store_keep_it_consistent(tmp_path):
+    stores = [SnapshotStore(tmp_path, keep=2) for _ in range(2)]
+
+    def work(index, store):
+        for n in range(30):
+            _write(tmp_path / f"w{index}" / "f.txt", f"{index}-{n}")
+            store.snapshot()
+
+    threads = [threading.Thread(target=work, args=(i, s)) for i, s in enumerate(stores)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    store = SnapshotStore(tmp_path)
+    for snapshot in store.list_snapshots():
+        for digest, _, _ in store.load(snapshot["id"])["files"].values():
+            assert os.path.exists(store._blob_path(digest))
+
+
+def test_ids_outside_the_store_are_rejected(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(snapshot_store, "_default", None)
+    from tools.snapshot_tools import diff_snapshot, restore_snapshot
+
+    _write(tmp_path / "a.txt", "one")
+    store = snapshot_store.default_store()
+    store.snapshot()
+    _write(tmp_path / "outside.json", '{"id": "x", "files": {}}')
+    for bad in ("../../outside", "../manifests/x", "20240101-000000-abcdef/../../x", ""):
+        assert restore_snapshot(bad).startswith("Error restoring snapshot: Invalid snapshot id")
+        assert diff_snapshot(bad).startswith("Error diffing snapshot: Invalid snapshot id")
+    # Nothing was snapshotted or restored for the rejected ids
+    assert len(store.list_snapshots()) == 1
+    assert (tmp_path / "a.txt").read_text() == "one"
@@ -0,0 +1,19 @@
+import pytest
+
+pytest.importorskip("google.genai")
+
+from gemini_handler import GeminiHandler  # noqa: E402
+
+
+def test_children_share_the_parent_tools_without_reloading(tmp_path, monkeypatch):
+    parent = GeminiHandler(sessions_dir=str(tmp_path), client=object(), preflight_tools=False,
+                           subagents={"max_depth": 1})
+    monkeypatch.setattr(GeminiHandler, "reload_tools", lambda self: pytest.fail("child reloaded the tools"))
+    child = GeminiHandler(sessions_dir=str(tmp_path), client=object(), subagents={"max_depth": 1}, depth=1,
+                          tools_from=parent)
+    names = [func.__name__ for func in child.tools_functions]
+    assert "spawn_subagents" in [func.__name__ for func in parent.tools_functions]
+    assert "spawn_subagents" not in names  # depth 1 is the last level
+    assert names == [func.__name__ for func in parent.tools_functions if func.__name__ != "spawn_subagents"]
+    assert child.tool_specs["calculator"] is parent.tool_specs["calculator"]
+    assert child.tools_key != parent.tools_key
@@ -0,0 +1,22 @@
+import tool_archive
+from tools import terminal_tools
+
+COMMAND = "python -c \"print('x' * 10000)\""
+
+
+def test_long_output_is_logged_in_full_without_the_archive(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv(tool_archive.ENABLED_ENV, raising=False)
+    terminal_tools.run_shell_command(COMMAND)
+    assert "x" * 10000 in (tmp_path / "terminal_output.log").read_text()
+    assert not (tmp_path / ".archive").exists()
+
+
+def test_long_output_is_archived_with_the_archive_on(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(tool_archive, "_default", None)
+    monkeypatch.setenv(tool_archive.ENABLED_ENV, "1")
+    terminal_tools.run_shell_command(COMMAND)
+    log = (tmp_path / "terminal_output.log").read_text()
+    assert "read it with read_archive" in log
+    assert "x" * 10000 not in log
@@ -0,0 +1,33 @@
+import threading
+
+from tool_archive import ToolArchive
+
+
+def test_shrink_with_a_small_max_bytes_keeps_the_new_output(tmp_path):
+    archive = ToolArchive(tmp_path, inline_chars=100, max_bytes=50)
+    long_text = "\n".join(f"line {n}" for n in range(2000))
+    first = archive.shrink("x", {"result": long_text})
+    second = archive.shrink("y", {"result": long_text + "\nmore"})
+    assert archive.read(second["archived"], 0, second["chunks"]).endswith("more")
+    # The older output is the one pruned
+    assert not (tmp_path / f"{first['archived']}.json").exists()
+
+
+def test_concurrent_archives_store_the_same_output(tmp_path):
+    archives = [ToolArchive(tmp_path) for _ in range(4)]
+    text = "x" * 50_000
+    errors = []
+
+    def put(archive):
+        try:
+            archive.put(text)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=put, args=(archive,)) for archive in archives]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert not list(tmp_path.glob("*.tmp"))
@@ -0,0 +1,62 @@
+import json
+import subprocess
+
+import tool_benchmarks
+from tool_benchmarks import check_modules, compare
+
+BASELINE = {"cases": {"read_directory/tree": {"seconds": 0.010, "peak_bytes": 1_000_000, "syscalls": 100}}}
+
+
+def _result(seconds=0.010, peak_bytes=1_000_000, syscalls=100):
+    return {"read_directory/tree": {"seconds": seconds, "peak_bytes": peak_bytes, "syscalls": syscalls}}
+
+
+def test_compare_flags_only_what_exceeds_both_limits():
+    assert compare(_result(seconds=0.014, peak_bytes=1_200_000, syscalls=110), BASELINE) == {}
+    regressions = compare(_result(seconds=0.020, peak_bytes=2_000_000, syscalls=200), BASELINE)
+    assert [problem.split()[0] for problem in regressions["read_directory/tree"]] == [
+        "seconds", "peak_bytes", "syscalls"]
+    assert "limit +50%" in regressions["read_directory/tree"][0]
+    # Relative growth on tiny numbers is noise
+    tiny = {"cases": {"read_directory/tree": {"seconds": 0.0001, "peak_bytes": 1000, "syscalls": 1}}}
+    assert compare(_result(seconds=0.001, peak_bytes=10_000, syscalls=10), tiny) == {}
+    # Thresholds can be overridden per metric
+    assert list(compare(_result(seconds=0.014), BASELINE, {"seconds": 0.1})) == ["read_directory/tree"]
+
+
+def test_compare_errors_and_missing_baselines():
+    results = {"a": {"error": "ImportError: broken"}, "b": {"seconds": 10.0, "peak_bytes": 1, "syscalls": None}}
+    assert compare(results, BASELINE) == {"a": ["ImportError: broken"]}
+    assert compare(results, None) == {"a": ["ImportError: broken"]}
+
+
+def test_check_modules_groups_regressions_by_module(tmp_path, monkeypatch):
+    baseline = tmp_path / "baselines.json"
+    assert check_modules({"file_tools"}, baseline_path=str(baseline)) == {}
+    baseline.write_text(json.dumps(BASELINE))
+    commands = []
+
+    def run(command, **kwargs):
+        commands.append(command)
+        output = {"results": {}, "regressions": {"read_directory/tree": ["seconds 10 ms -> 30 ms"],
+                                                 "create_structure/tree": ["syscalls 1 -> 90"]}}
+        return subprocess.CompletedProcess(command, 1, stdout="log line\n" + json.dumps(output) + "\n", stderr="")
+
+    monkeypatch.setattr(tool_benchmarks.subprocess, "run", run)
+    assert check_modules({"file_tools", "calculator"}, baseline_path=str(baseline)) == {
+        "file_tools": ["read_directory/tree: seconds 10 ms -> 30 ms", "create_structure/tree: syscalls 1 -> 90"]}
+    assert commands[0][-2:] == ["--only", "calculator,file_tools"]
+
+    def crash(command, **kwargs):
+        return subprocess.CompletedProcess(command, 1, stdout="", stderr="SyntaxError: invalid syntax")
+
+    monkeypatch.setattr(tool_benchmarks.subprocess, "run", crash)
+    assert check_modules({"calculator"}, baseline_path=str(baseline)) == {
+        "calculator": ["benchmark run failed: SyntaxError: invalid syntax"]}
+
+    def hang(command, timeout=None, **kwargs):
+        raise subprocess.TimeoutExpired(command, timeout)
+
+    monkeypatch.setattr(tool_benchmarks.subprocess, "run", hang)
+    assert check_modules({"calculator"}, baseline_path=str(baseline), timeout=1) == {
+        "calculator": ["benchmarks did not finish in 1s"]}
@@ -0,0 +1,27 @@
+import os
+
+from tool_preflight import preflight
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SOURCES = {
+    "good": 'def greet(name: str) -> str:\n    """Greets.\n\n    Args:\n        name: Who.\n    """\n    return name\n',
+    "broken_import": "import module_that_does_not_exist\n",
+    "raises": 'raise RuntimeError("boom at import")\n',
+    "syntax": "def oops(:\n",
+    "hangs": "import time\ntime.sleep(30)\n",
+}
+
+
+def test_preflight_reports_the_modules_that_fail(tmp_path, monkeypatch):
+    # The modules import tool_schema from the repo, the way the live tools do
+    monkeypatch.setenv("PYTHONPATH", ROOT)
+    (tmp_path / "tools").mkdir()
+    for name, source in SOURCES.items():
+        (tmp_path / "tools" / f"{name}.py").write_text(source)
+    results = preflight(SOURCES, cwd=str(tmp_path), timeout=2)
+    assert results["good"] is None
+    assert results["broken_import"] == "ModuleNotFoundError: No module named 'module_that_does_not_exist'"
+    assert results["raises"] == "RuntimeError: boom at import"
+    assert results["syntax"].startswith("SyntaxError:") and "(line 1)" in results["syntax"]
+    assert results["hangs"] == "import did not finish in 2s"
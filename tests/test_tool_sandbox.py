@@ -0,0 +1,108 @@
+import resource
+import sys
+
+import pytest
+
+from tool_sandbox import ToolCrashedError, ToolSandbox, ToolSandboxError, ToolTimeoutError
+
+TOOLS = '''
+import os
+import resource
+import subprocess
+import time
+
+
+def pid():
+    return os.getpid()
+
+
+def sleep(seconds):
+    time.sleep(seconds)
+
+
+def crash():
+    os._exit(3)
+
+
+def allocate(mb):
+    return len(bytearray(mb * 1024 * 1024))
+
+
+def spin():
+    while True:
+        pass
+
+
+def fail():
+    raise ValueError("bad input")
+
+
+def address_space_limit():
+    return resource.getrlimit(resource.RLIMIT_AS)[0]
+
+
+def run_shell_command(command):
+    return subprocess.run(command, shell=True, capture_output=True, text=True).stdout.strip()
+'''
+
+
+@pytest.fixture
+def sandbox(tmp_path, monkeypatch):
+    package = tmp_path / "sandboxed_tools"
+    package.mkdir()
+    (package / "__init__.py").write_text("")
+    (package / "probe.py").write_text(TOOLS)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    sandbox = ToolSandbox(tools_dir=str(package), workers=1, memory_mb=512, cpu_seconds=1, wall_seconds=5)
+    yield sandbox
+    sandbox.close()
+
+
+def test_limits_apply_to_tools_but_not_to_shell_commands(sandbox):
+    limited = sandbox.call("sandboxed_tools.probe", "address_space_limit", {})
+    assert limited == 512 * 1024 * 1024
+    shell = sandbox.call("sandboxed_tools.probe", "run_shell_command",
+                         {"command": f"{sys.executable} -c 'import resource; "
+                                     f"print(resource.getrlimit(resource.RLIMIT_AS)[0])'"})
+    assert int(shell) == resource.getrlimit(resource.RLIMIT_AS)[0]
+    # The limits are back for the next call
+    assert sandbox.call("sandboxed_tools.probe", "address_space_limit", {}) == limited
+
+
+def test_wall_clock_timeout_replaces_the_worker(sandbox):
+    before = sandbox.call("sandboxed_tools.probe", "pid", {})
+    with pytest.raises(ToolTimeoutError):
+        sandbox.call("sandboxed_tools.probe", "sleep", {"seconds": 10}, wall_seconds=0.5)
+    after = sandbox.call("sandboxed_tools.probe", "pid", {})
+    assert after != before
+
+
+def test_crashed_worker_is_recycled(sandbox):
+    with pytest.raises(ToolCrashedError, match="exit code 3"):
+        sandbox.call("sandboxed_tools.probe", "crash", {})
+    assert sandbox.call("sandboxed_tools.probe", "pid", {}) > 0
+
+
+def test_memory_limit(sandbox):
+    with pytest.raises(ToolCrashedError, match="memory limit"):
+        sandbox.call("sandboxed_tools.probe", "allocate", {"mb": 1024})
+    assert sandbox.call("sandboxed_tools.probe", "allocate", {"mb": 16}) == 16 * 1024 * 1024
+
+
+def test_cpu_limit(sandbox):
+    with pytest.raises(ToolCrashedError):
+        sandbox.call("sandboxed_tools.probe", "spin", {})
+    assert sandbox.call("sandboxed_tools.probe", "pid", {}) > 0
+
+
+def test_tool_exception_keeps_the_worker(sandbox):
+    before = sandbox.call("sandboxed_tools.probe", "pid", {})
+    with pytest.raises(ToolSandboxError, match="ValueError: bad input"):
+        sandbox.call("sandboxed_tools.probe", "fail", {})
+    assert sandbox.call("sandboxed_tools.probe", "pid", {}) == before
+
+
+def test_restart_respawns_the_workers(sandbox):
+    before = sandbox.call("sandboxed_tools.probe", "pid", {})
+    sandbox.restart()
+    assert sandbox.call("sandboxed_tools.probe", "pid", {}) != before
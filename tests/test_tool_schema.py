@@ -0,0 +1,32 @@
+from typing import Optional
+
+import pytest
+
+from tool_schema import ToolArgumentError, ToolSpec
+
+
+def write_note(text: str, title: Optional[str] = None, count: Optional[int] = None) -> str:
+    """
+    Args:
+        text: The note.
+        title: Optional title.
+        count: Optional count.
+    """
+    return text
+
+
+def test_only_json_null_is_none_for_optional():
+    spec = ToolSpec(write_note)
+    assert spec.validate({"text": "a", "title": "null"})["title"] == "null"
+    assert spec.validate({"text": "a", "title": "None"})["title"] == "None"
+    assert spec.validate({"text": "a", "title": None})["title"] is None
+    with pytest.raises(ToolArgumentError):
+        spec.validate({"text": "a", "count": "none"})
+
+
+def test_unknown_arguments_are_reported():
+    spec = ToolSpec(write_note)
+    with pytest.raises(ToolArgumentError) as error:
+        spec.validate({"text": "a", "titel": "x"})
+    assert "titel: unknown argument" in str(error.value)
+    assert "Expected write_note(" in str(error.value)
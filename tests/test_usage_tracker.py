@@ -0,0 +1,10 @@
+from usage_tracker import UsageTracker
+
+
+def test_hedge_tokens_count_but_are_not_a_turn():
+    tracker = UsageTracker()
+    tracker.record({"total_tokens": 100}, "m", task="t")
+    tracker.record({"total_tokens": 90}, "m", task="t", hedge=True)
+    assert tracker.task("t")["turns"] == 1
+    assert tracker.task("t")["hedges"] == 1
+    assert tracker.task("t")["total_tokens"] == 190
@@ -0,0 +1,265 @@
+# Compressed, chunked archive of large tool outputs.
+# A full read_directory dict or a long build log would otherwise be kept whole in the conversation, the
+# history and the session checkpoints, and sent back to the model on every following turn. Instead, an
+# output longer than `inline_chars` is stored here and the model gets a preview (its head and tail) and a
+# handle; the read_archive tool (tools/archive_tools.py) returns any chunk of it on demand.
+#
+# Layout of the archive directory, one pair of files per output (content addressed, so an identical output
+# is stored once):
+#   <handle>.chunks  the compressed chunks, back to back
+#   <handle>.json    codec, size, and the offset, length and first line of every chunk
+# Chunks are cut at line boundaries and compressed independently, so reading one only decompresses it.
+# zstandard is used when installed, zlib otherwise; the codec is recorded per output.
+
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from lazy_import import lazy_module
+
+zstandard = lazy_module("zstandard")
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ARCHIVE_DIR = ".archive"
+# Set once a handler archives tool outputs (then the model has read_archive): only then do the tools
+# archive long outputs themselves. An environment variable, so sandbox workers see it too
+ENABLED_ENV = "AGENT_TOOL_ARCHIVE"
+HANDLE_PREFIX = "arc-"
+MAX_CACHED_INDEXES = 64
+
+
+def _default_codec():
+    return "zstd" if importlib.util.find_spec("zstandard") is not None else "zlib"
+
+
+def _compress(data, codec, level):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    return zlib.compress(data, level)
+
+
+def _decompress(data, codec):
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def _split_lines(text, chunk_chars):
+    """Splits text in pieces of about chunk_chars characters, cut after a newline when there is one."""
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_chars, len(text))
+        if end < len(text):
+            newline = text.rfind("\n", start + chunk_chars // 2, end)
+            if newline != -1:
+                end = newline + 1
+        yield text[start:end]
+        start = end
+
+
+class ToolArchive:
+    def __init__(self, directory=DEFAULT_ARCHIVE_DIR, inline_chars=12_000, preview_chars=2_000,
+                 chunk_chars=8_000, codec=None, level=6, max_bytes=256 * 1024 * 1024):
+        """
+        Args:
+            directory: Where the archived outputs are stored.
+            inline_chars: Outputs up to this size (as JSON) are left in the conversation.
+            preview_chars: Size of the preview replacing an archived output.
+            chunk_chars: Size of the chunks returned by read_archive.
+            codec: "zstd" or "zlib" (default: zstd if installed).
+            level: Compression level.
+            max_bytes: The oldest outputs are deleted when the archive grows past this size.
+        """
+        self.directory = directory
+        self.inline_chars = inline_chars
+        self.preview_chars = preview_chars
+        self.chunk_chars = chunk_chars
+        self.codec = codec or _default_codec()
+        self.level = level
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index_cache = OrderedDict()  # handle -> index, least recently used first
+        self._written = 0  # bytes written since the size of the directory was last checked
+
+    def _paths(self, handle):
+        if not handle.startswith(HANDLE_PREFIX) or not handle[len(HANDLE_PREFIX):].isalnum():
+            raise KeyError(f"Invalid archive handle {handle!r}")
+        base = os.path.join(self.directory, handle)
+        return base + ".chunks", base + ".json"
+
+    def put(self, text, label=""):
+        """Stores text and returns its handle."""
+        data = text.encode("utf-8")
+        handle = HANDLE_PREFIX + hashlib.sha256(data).hexdigest()[:16]
+        chunks_path, index_path = self._paths(handle)
+        with self._lock:
+            if os.path.exists(index_path):
+                os.utime(index_path)  # recently used outputs are pruned last
+                return handle
+            os.makedirs(self.directory, exist_ok=True)
+            chunks = []
+            offset = line = 0
+            # Unique temporary names: several archives (threads, processes) may store the same output at once
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                for piece in _split_lines(text, self.chunk_chars):
+                    compressed = _compress(piece.encode("utf-8"), self.codec, self.level)
+                    f.write(compressed)
+                    chunks.append({"offset": offset, "length": len(compressed), "line": line + 1,
+                                   "chars": len(piece)})
+                    offset += len(compressed)
+                    line += piece.count("\n")
+            index = {"handle": handle, "label": label, "codec": self.codec, "created": time.time(),
+                     "chars": len(text), "bytes": len(data), "lines": line + (0 if text.endswith("\n") else 1),
+                     "stored_bytes": offset, "chunks": chunks}
+            os.replace(tmp_path, chunks_path)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(index, f, separators=(",", ":"))
+            # The index is written last: it marks a complete output
+            os.replace(tmp_path, index_path)
+            self._cache(handle, index)
+            self._written += offset
+            if self.max_bytes and self._written > self.max_bytes // 10:
+                self._written = 0
+                self._prune(keep=handle)
+        logger.debug("Archived %d chars as %s (%d bytes, %d chunks, %s)", len(text), handle, offset,
+                     len(chunks), self.codec)
+        return handle
+
+    def info(self, handle):
+        """
+        Returns the index of an archived output.
+
+        Raises:
+            KeyError: If there is no output with this handle.
+        """
+        with self._lock:
+            index = self._index_cache.get(handle)
+            if index is not None:
+                self._index_cache.move_to_end(handle)
+                return index
+        _, index_path = self._paths(handle)
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            raise KeyError(f"No archived output {handle}")
+        with self._lock:
+            self._cache(handle, index)
+        return index
+
+    def _cache(self, handle, index):
+        # Called with the lock held
+        self._index_cache[handle] = index
+        while len(self._index_cache) > MAX_CACHED_INDEXES:
+            self._index_cache.popitem(last=False)
+
+    def read(self, handle, chunk=0, count=1):
+        """Returns the text of `count` chunks starting at `chunk` (0-based)."""
+        index = self.info(handle)
+        chunks = index["chunks"][chunk:chunk + count] if chunk >= 0 else []
+        if not chunks:
+            raise IndexError(f"{handle} has chunks 0 to {len(index['chunks']) - 1}, not {chunk}")
+        chunks_path, _ = self._paths(handle)
+        with open(chunks_path, "rb") as f:
+            f.seek(chunks[0]["offset"])
+            data = f.read(sum(c["length"] for c in chunks))
+        pieces = []
+        position = 0
+        for c in chunks:
+            pieces.append(_decompress(data[position:position + c["length"]], index["codec"]).decode("utf-8"))
+            position += c["length"]
+        return "".join(pieces)
+
+    def preview(self, text):
+        """The head and the tail of text, preview_chars in total."""
+        if len(text) <= self.preview_chars:
+            return text
+        head = self.preview_chars * 2 // 3
+        tail = self.preview_chars - head
+        return f"{text[:head]}\n[... {len(text) - head - tail} characters not shown ...]\n{text[-tail:]}"
+
+    def shrink(self, name, payload):
+        """
+        Replaces a tool's function_response payload by a preview and a handle if it is longer than
+        inline_chars, otherwise returns it unchanged.
+        """
+        if "result" in payload and len(payload) == 1 and isinstance(payload["result"], str):
+            text = payload["result"]
+        else:
+            text = json.dumps(payload, indent=1, ensure_ascii=False)
+        if len(text) <= self.inline_chars:
+            return payload
+        try:
+            handle = self.put(text, label=name)
+            index = self.info(handle)
+        except Exception as e:
+            logger.warning("Could not archive the output of %s: %s", name, e)
+            return payload
+        return {
+            "archived": handle,
+            "chars": index["chars"],
+            "lines": index["lines"],
+            "chunks": len(index["chunks"]),
+            "preview": self.preview(text),
+            "note": f"The output of {name} is too long to show in full. Call read_archive(handle='{handle}', "
+                    f"chunk=N) to read chunk N (0 to {len(index['chunks']) - 1}) of it.",
+        }
+
+    def _prune(self, keep=None):
+        # Deletes the least recently stored or used outputs until the archive is under max_bytes, except
+        # `keep` (the output just stored, whatever its size)
+        entries = []
+        total = 0
+        for file in os.listdir(self.directory):
+            if file.startswith(HANDLE_PREFIX) and file.endswith(".json"):
+                handle = file[:-5]
+                chunks_path, index_path = self._paths(handle)
+                try:
+                    size = os.path.getsize(chunks_path) + os.path.getsize(index_path)
+                    if handle != keep:
+                        entries.append((os.path.getmtime(index_path), handle, size))
+                except OSError:
+                    continue
+                total += size
+        entries.sort()
+        for _, handle, size in entries:
+            if total <= self.max_bytes:
+                break
+            for path in self._paths(handle)[::-1]:  # the index first, so a half deleted output is never read
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            self._index_cache.pop(handle, None)
+            total -= size
+            logger.debug("Pruned %s from the archive", handle)
+
+
+_default = None
+
+
+def default_archive():
+    """The archive in DEFAULT_ARCHIVE_DIR used by the tools."""
+    global _default
+    if _default is None:
+        _default = ToolArchive()
+    return _default
+
+
+def enable_tool_archive():
+    os.environ[ENABLED_ENV] = "1"
+
+
+def tool_archive_enabled():
+    """True if the model can read archived outputs (a handler has the archive on)."""
+    return os.environ.get(ENABLED_ENV) == "1"
@@ -0,0 +1,333 @@
+# Micro-benchmarks of the tool hot paths, with stored baselines and a regression check.
+# Every case runs one tool on a synthetic workspace generated in a temporary directory (a deep and wide
+# tree of small files, a large source file, a huge terminal log) and records:
+# - seconds: median wall time of one call (perf_counter)
+# - peak_bytes: peak Python memory allocated during one call (tracemalloc)
+# - syscalls: read + write syscalls of one call, from /proc/self/io (None where it does not exist)
+#
+# Usage:
+#   python tool_benchmarks.py --save            run everything and store the results as the baseline
+#   python tool_benchmarks.py                   run and compare with the baseline (exit code 1 on regression)
+#   python tool_benchmarks.py --only file_tools --scale 0.5
+#
+# GeminiHandler(benchmark_tools=True) runs the cases of the tool modules changed on disk in a subprocess
+# before reloading them, and keeps the previous version of a module that regressed.
+
+import argparse
+import importlib
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(ROOT, "tool_baselines.json")
+# A metric regresses when it grows by more than this fraction of the baseline...
+THRESHOLDS = {"seconds": 0.5, "peak_bytes": 0.25, "syscalls": 0.25}
+# ...and by more than this absolute amount, so noise on tiny numbers is ignored
+MIN_DELTAS = {"seconds": 0.002, "peak_bytes": 256 * 1024, "syscalls": 16}
+
+
+class Case:
+    def __init__(self, name, module, function, kwargs, cwd=".", number=1, repeat=5):
+        """
+        Args:
+            name: Unique name of the case, the key of its baseline.
+            module: Tool module, relative to tools/ (e.g. "file_tools").
+            function: Name of the tool in that module.
+            kwargs: Arguments of the call.
+            cwd: Working directory of the call, relative to the workspace.
+            number: Calls per timed sample, for tools too fast to time one by one.
+            repeat: Number of timed samples.
+        """
+        self.name = name
+        self.module = module
+        self.function = function
+        self.kwargs = kwargs
+        self.cwd = cwd
+        self.number = number
+        self.repeat = repeat
+
+
+def _write_lines(path, count, template):
+    with open(path, "w", encoding="utf-8") as f:
+        for start in range(0, count, 10_000):
+            f.write("".join(template.format(i=i) for i in range(start, min(start + 10_000, count))))
+
+
+def make_workspace(root, scale=1.0):
+    """
+    Generates the synthetic workspace of the cases in root.
+
+    Returns:
+        The number of files and directories created.
+    """
+    def scaled(n):
+        return max(int(n * scale), 1)
+
+    files = directories = 0
+    # Wide tree: branching^depth directories with a few small source files each
+    branching, depth, per_dir = 4, 4, scaled(4)
+    level = [os.path.join(root, "tree")]
+    for _ in range(depth):
+        next_level = []
+        for parent in level:
+            for b in range(branching):
+                path = os.path.join(parent, f"pkg_{b}")
+                os.makedirs(path)
+                directories += 1
+                for f in range(per_dir):
+                    _write_lines(os.path.join(path, f"module_{f}.py"), 40, "value_{i} = {i} * 2  # generated\n")
+                    files += 1
+                next_level.append(path)
+        level = next_level
+    # Deep chain: one long path, the worst case of the recursive tools
+    path = os.path.join(root, "tree", "deep")
+    for d in range(scaled(60)):
+        path = os.path.join(path, f"level_{d}")
+        os.makedirs(path)
+        directories += 1
+        _write_lines(os.path.join(path, "notes.txt"), 5, "line {i}\n")
+        files += 1
+    os.makedirs(os.path.join(root, "edit"))
+    _write_lines(os.path.join(root, "edit", "large.py"), scaled(200_000), "def function_{i}(x):  return x + {i}\n")
+    os.makedirs(os.path.join(root, "logs"))
+    _write_lines(os.path.join(root, "logs", "terminal_output.log"), scaled(500_000),
+                 "$ make step_{i}\n[{i:08d}] compiling unit {i} ... done in 0.{i}s\n")
+    os.makedirs(os.path.join(root, "shell"))
+    return files + 2, directories + 3
+
+
+def default_cases(scale=1.0):
+    middle = max(int(100_000 * scale), 20)
+    return [
+        Case("read_directory/tree", "file_tools", "read_directory",
+             {"path": "tree", "add_line_numbers": True}, repeat=3),
+        Case("create_structure/tree", "file_tools", "create_structure",
+             {"path": "tree", "prefix": "", "respect_gitignore": False}, repeat=5),
+        # Same number of lines in and out, so every call leaves the file as it found it
+        Case("edit_file_lines/large", "file_edit", "edit_file_lines",
+             {"file_path": "large.py", "start_line": middle, "end_line": middle + 9,
+              "new_content": "".join(f"def function_{i}(x):  return x + {i}\n" for i in range(middle - 1, middle + 9))},
+             cwd="edit", repeat=5),
+        Case("run_shell_command/echo", "terminal_tools", "run_shell_command",
+             {"command": "echo benchmark"}, cwd="shell", repeat=10),
+        Case("read_terminal_output/huge_log", "terminal_tools", "read_terminal_output",
+             {"last_n_lines": 50}, cwd="logs", repeat=5),
+        Case("calculator/multiply", "calculator", "calculator",
+             {"operation": "multiply", "number1": 12345, "number2": 6789}, number=10_000, repeat=5),
+    ]
+
+
+def _io_syscalls():
+    try:
+        with open("/proc/self/io", "r") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return int(fields["syscr"]) + int(fields["syscw"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def measure(call, number=1, repeat=5):
+    """Times call() and returns its median seconds, peak traced memory and syscalls per call."""
+    call()  # warm up: imports, page cache, lazy initialisation
+    overhead = _io_syscalls()
+    overhead = (_io_syscalls() - overhead) if overhead is not None else 0  # reading /proc/self/io itself
+    before = _io_syscalls()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            call()
+        samples.append((time.perf_counter() - start) / number)
+    after = _io_syscalls()
+    syscalls = None
+    if before is not None and after is not None:
+        syscalls = max(after - before - overhead, 0) / (number * repeat)
+    tracemalloc.start()
+    try:
+        call()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": statistics.median(samples), "min_seconds": min(samples), "peak_bytes": peak,
+            "syscalls": syscalls}
+
+
+def run_cases(cases, workspace):
+    results = {}
+    cwd = os.getcwd()
+    for case in cases:
+        try:
+            func = getattr(importlib.import_module(f"tools.{case.module}"), case.function)
+            os.chdir(os.path.join(workspace, case.cwd))
+            results[case.name] = measure(lambda: func(**case.kwargs), case.number, case.repeat)
+        except Exception as e:
+            logger.error("Benchmark %s failed: %s", case.name, e)
+            results[case.name] = {"error": f"{type(e).__name__}: {e}"}
+        finally:
+            os.chdir(cwd)
+        logger.info("%s: %s", case.name, results[case.name])
+    return results
+
+
+def run_benchmarks(modules=None, scale=1.0):
+    """
+    Runs the cases (of the given tool modules only, if any) on a fresh synthetic workspace.
+
+    Returns:
+        {case name: {"seconds", "min_seconds", "peak_bytes", "syscalls"} or {"error"}}
+    """
+    cases = [c for c in default_cases(scale) if modules is None or c.module in modules]
+    if not cases:
+        return {}
+    workspace = tempfile.mkdtemp(prefix="tool-bench-")
+    try:
+        make_workspace(workspace, scale)
+        return run_cases(cases, workspace)
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+
+def load_baseline(path=BASELINE_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(results, scale=1.0, path=BASELINE_PATH):
+    # Cases not run this time keep their previous baseline
+    baseline = load_baseline(path) or {}
+    cases = dict(baseline.get("cases", {}))
+    cases.update({name: r for name, r in results.items() if "error" not in r})
+    baseline = {"scale": scale, "python": platform.python_version(), "machine": platform.machine(),
+                "saved": time.strftime("%Y-%m-%d %H:%M:%S"), "cases": cases}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+    return baseline
+
+
+def compare(results, baseline, thresholds=None):
+    """
+    Compares results with the baseline cases. A case that failed is a regression, a case without a
+    baseline is not.
+
+    Returns:
+        {case name: [readable regressions]}, only for the cases that regressed.
+    """
+    thresholds = dict(THRESHOLDS, **(thresholds or {}))
+    regressions = {}
+    for name, result in results.items():
+        if "error" in result:
+            regressions[name] = [result["error"]]
+            continue
+        old = (baseline or {}).get("cases", {}).get(name)
+        if not old:
+            continue
+        for metric, threshold in thresholds.items():
+            before, now = old.get(metric), result.get(metric)
+            if before is None or now is None:
+                continue
+            if now > before * (1 + threshold) and now - before > MIN_DELTAS[metric]:
+                regressions.setdefault(name, []).append(f"{metric} {_format(metric, before)} -> {_format(metric, now)} "
+                                   f"(+{(now / before - 1) * 100 if before else float('inf'):.0f}%, "
+                                   f"limit +{threshold * 100:.0f}%)")
+    return regressions
+
+
+def _format(metric, value):
+    if metric == "seconds":
+        return f"{value * 1000:.2f} ms" if value >= 0.001 else f"{value * 1e6:.2f} us"
+    if metric == "peak_bytes":
+        return f"{value / 1024:.0f} KiB"
+    return f"{value:.1f}"
+
+
+def check_modules(modules, baseline_path=BASELINE_PATH, timeout=300):
+    """
+    Benchmarks the tool modules as they are on disk in a separate interpreter, so code that is not
+    loaded yet never runs in this process.
+
+    Returns:
+        {module: [readable regressions]}, only for the modules that regressed (nothing without a baseline).
+    """
+    if not os.path.exists(baseline_path):
+        logger.info("No tool benchmark baseline at %s, skipping the check", baseline_path)
+        return {}
+    command = [sys.executable, os.path.join(ROOT, "tool_benchmarks.py"), "--json", "--baseline", baseline_path,
+               "--only", ",".join(sorted(modules))]
+    try:
+        result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {module: [f"benchmarks did not finish in {timeout}s"] for module in modules}
+    try:
+        regressions = json.loads(result.stdout.strip().splitlines()[-1])["regressions"]
+    except (IndexError, ValueError, KeyError):
+        return {module: [f"benchmark run failed: {result.stderr.strip()[-500:]}"] for module in modules}
+    case_modules = {case.name: case.module for case in default_cases()}
+    by_module = {}
+    for name, problems in regressions.items():
+        by_module.setdefault(case_modules.get(name), []).extend(f"{name}: {p}" for p in problems)
+    return by_module
+
+
+def format_results(results, baseline=None):
+    lines = [f"{'case':32} {'time':>12} {'peak memory':>12} {'syscalls':>9} {'vs baseline':>12}"]
+    for name, result in results.items():
+        if "error" in result:
+            lines.append(f"{name:32} ERROR {result['error']}")
+            continue
+        old = (baseline or {}).get("cases", {}).get(name)
+        change = f"{(result['seconds'] / old['seconds'] - 1) * 100:+.0f}%" if old and old.get("seconds") else "-"
+        syscalls = "-" if result["syscalls"] is None else f"{result['syscalls']:.1f}"
+        lines.append(f"{name:32} {_format('seconds', result['seconds']):>12} "
+                     f"{_format('peak_bytes', result['peak_bytes']):>12} {syscalls:>9} {change:>12}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the tools and check for regressions.")
+    parser.add_argument("--only", default=None, help="Comma separated tool modules to benchmark (e.g. file_tools)")
+    parser.add_argument("--scale", type=float, default=None, help="Workspace size factor (default: the baseline's)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument("--time-threshold", type=float, default=THRESHOLDS["seconds"],
+                        help="Allowed slowdown as a fraction of the baseline")
+    parser.add_argument("--memory-threshold", type=float, default=THRESHOLDS["peak_bytes"])
+    parser.add_argument("--json", action="store_true", help="Print the results and regressions as JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    baseline = None if args.save else load_baseline(args.baseline)
+    scale = args.scale or (baseline or {}).get("scale", 1.0)
+    modules = set(args.only.split(",")) if args.only else None
+    results = run_benchmarks(modules, scale)
+    if args.save:
+        save_baseline(results, scale, args.baseline)
+    regressions = compare(results, baseline, {"seconds": args.time_threshold,
+                                              "peak_bytes": args.memory_threshold})
+    if args.json:
+        print(json.dumps({"results": results, "regressions": regressions}))
+    else:
+        print(format_results(results, baseline))
+        if args.save:
+            print(f"\nBaseline saved to {args.baseline}")
+        for name, problems in regressions.items():
+            for problem in problems:
+                print(f"REGRESSION {name}: {problem}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+# Pre-flight check of tool modules before a hot reload.
+# The agent can write any file into tools/, and reload_tools imports it into the running process: a syntax
+# error, an exception at import time or an import that hangs would break or stall the agent itself.
+# preflight() compiles every candidate module here (cheap, runs nothing) and then imports it in its own
+# short-lived interpreter with a time limit, where its tools must also get a valid schema. Only the modules
+# that pass are swapped into the live registry, the others keep their last good version.
+
+import logging
+import os
+import subprocess
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+PREFLIGHT_TIMEOUT = 10  # seconds allowed to import one module
+
+_CHILD = """
+import inspect, json, sys
+from tool_schema import ToolSpec
+module = __import__(sys.argv[1], fromlist=["_"])
+tools = [f for n, f in inspect.getmembers(module, inspect.isfunction)
+         if not n.startswith("_") and f.__module__ == module.__name__]
+for tool in tools:
+    ToolSpec(tool)
+print(json.dumps([tool.__name__ for tool in tools]))
+"""
+
+
+def _last_line(text):
+    lines = [line for line in text.strip().splitlines() if line.strip()]
+    return lines[-1].strip() if lines else ""
+
+
+def preflight(sources, package="tools", cwd=".", timeout=PREFLIGHT_TIMEOUT):
+    """
+    Checks that tool modules compile and import cleanly, each in a separate interpreter.
+
+    Args:
+        sources: {module name (in the package): source code}, as it is on disk.
+        package: Package of the tool modules.
+        cwd: Directory containing the package.
+        timeout: Seconds allowed to import one module.
+
+    Returns:
+        {module name: None if it passed, otherwise the reason it failed}
+    """
+    results = {}
+    processes = {}
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    for module_name, source in sources.items():
+        path = os.path.join(cwd, package, f"{module_name}.py")
+        try:
+            compile(source, path, "exec")
+        except SyntaxError as e:
+            results[module_name] = f"SyntaxError: {e.msg} (line {e.lineno})"
+            continue
+        # All the modules are imported concurrently, so one slow import only delays its own result
+        processes[module_name] = subprocess.Popen(
+            [sys.executable, "-c", _CHILD, f"{package}.{module_name}"], cwd=cwd, env=env,
+            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+    deadline = time.monotonic() + timeout
+    for module_name, process in processes.items():
+        try:
+            stdout, stderr = process.communicate(timeout=max(deadline - time.monotonic(), 0.1))
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            results[module_name] = f"import did not finish in {timeout}s"
+            continue
+        if process.returncode != 0:
+            results[module_name] = _last_line(stderr) or f"import failed with exit code {process.returncode}"
+            continue
+        logger.debug("Pre-flight of %s.%s passed, tools: %s", package, module_name, _last_line(stdout))
+        results[module_name] = None
+    return results
@@ -0,0 +1,244 @@
+# Out-of-process execution of tools.
+# Tools written by the agent run in a pool of warm worker processes that already imported every module
+# in tools/. Each call is bounded by a CPU time limit and an address space limit (rlimits, enforced by
+# the kernel inside the worker, set for each call) and by a wall clock limit (enforced by the parent, which kills the
+# worker). A worker that dies or goes over a limit is replaced, the agent loop itself is never blocked
+# or polluted by a runaway tool. Calls and results travel pickled over a pipe.
+# Processes started by a tool inherit the worker's rlimits, so the tools running other programs
+# (run_shell_command: compilers, test suites, ...) get the limits the worker started with instead.
+
+import atexit
+import importlib
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import traceback
+import weakref
+
+try:
+    import resource
+except ImportError:  # Not available on Windows, limits are then wall clock only
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Tools whose calls run without the CPU and memory limits (the wall clock limit still applies)
+UNLIMITED_TOOLS = ("run_shell_command",)
+
+_sandboxes = weakref.WeakSet()
+
+
+@atexit.register
+def _close_all():
+    for sandbox in list(_sandboxes):
+        sandbox.close()
+
+
+class ToolSandboxError(Exception):
+    pass
+
+
+class ToolTimeoutError(ToolSandboxError):
+    pass
+
+
+class ToolCrashedError(ToolSandboxError):
+    pass
+
+
+def _set_limit(kind, soft):
+    _, hard = resource.getrlimit(kind)
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(kind, (soft, hard))
+
+
+def _worker_main(conn, tools_dir, memory_mb, unlimited_tools=UNLIMITED_TOOLS):
+    # Runs inside the worker process
+    original = {kind: resource.getrlimit(kind) for kind in (resource.RLIMIT_AS, resource.RLIMIT_CPU)} \
+        if resource is not None else {}
+    package = os.path.basename(os.path.normpath(tools_dir))
+    modules = {}
+    for file in sorted(os.listdir(tools_dir)):
+        if file.endswith(".py") and file != "__init__.py":
+            name = f"{package}.{file[:-3]}"
+            try:
+                modules[name] = importlib.import_module(name)
+            except Exception as e:
+                logger.warning("Sandbox worker could not import %s: %s", name, e)
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        if message is None:
+            return
+        module_name, func_name, kwargs, cpu_seconds = message
+        if resource is not None:
+            for kind, limits in original.items():
+                resource.setrlimit(kind, limits)
+            if func_name not in unlimited_tools:
+                if memory_mb:
+                    _set_limit(resource.RLIMIT_AS, memory_mb * 1024 * 1024)
+                if cpu_seconds:
+                    usage = resource.getrusage(resource.RUSAGE_SELF)
+                    used = int(usage.ru_utime + usage.ru_stime)
+                    # SIGXCPU terminates the worker once it has used cpu_seconds more than it already did
+                    _set_limit(resource.RLIMIT_CPU, used + int(cpu_seconds) + 1)
+        try:
+            module = modules.get(module_name) or importlib.import_module(module_name)
+            modules[module_name] = module
+            result = getattr(module, func_name)(**kwargs)
+            reply = ("ok", result)
+        except MemoryError:
+            conn.send(("memory", f"Tool '{func_name}' exceeded the memory limit"))
+            return  # The heap may be fragmented beyond repair, let the parent start a fresh worker
+        except Exception as e:
+            reply = ("error", f"{type(e).__name__}: {e}", traceback.format_exc(limit=5))
+        try:
+            conn.send(reply)
+        except Exception:
+            # Unpicklable results are sent in their string form
+            conn.send(("ok", str(reply[1])))
+
+
+class _Worker:
+    def __init__(self, ctx, tools_dir, memory_mb, unlimited_tools):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, tools_dir, memory_mb, unlimited_tools),
+                                   daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.generation = 0
+
+    def alive(self):
+        return self.process.is_alive()
+
+    def kill(self):
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=1)
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (OSError, BrokenPipeError):
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.kill()
+
+
+class ToolSandbox:
+    def __init__(self, tools_dir="tools", workers=2, cpu_seconds=30, memory_mb=1024, wall_seconds=60,
+                 unlimited_tools=UNLIMITED_TOOLS):
+        """
+        Args:
+            tools_dir: Package directory whose modules are pre-imported by each worker.
+            workers: Number of warm worker processes.
+            cpu_seconds: CPU time a single call may use before the worker is killed.
+            memory_mb: Address space limit of each worker in megabytes (0 disables it).
+            wall_seconds: Wall clock time a single call may take before the worker is killed.
+            unlimited_tools: Names of the tools run without the CPU and memory limits, because the
+                programs they start would inherit them.
+        """
+        self.tools_dir = tools_dir
+        self.size = workers
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.wall_seconds = wall_seconds
+        self.unlimited_tools = tuple(unlimited_tools)
+        # spawn gives clean workers that do not inherit the agent's threads or open clients
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._closed = False
+        for _ in range(workers):
+            self._idle.put(self._spawn())
+        _sandboxes.add(self)
+
+    def _spawn(self):
+        worker = _Worker(self._ctx, self.tools_dir, self.memory_mb, self.unlimited_tools)
+        worker.generation = self._generation
+        return worker
+
+    def _acquire(self):
+        worker = self._idle.get()
+        if worker.generation != self._generation or not worker.alive():
+            worker.stop()
+            worker = self._spawn()
+        return worker
+
+    def _release(self, worker):
+        if self._closed:
+            worker.stop()
+        else:
+            self._idle.put(worker)
+
+    def restart(self):
+        """Makes every worker re-import the tools, to be called after the tools changed on disk."""
+        with self._lock:
+            self._generation += 1
+        logger.debug("Tool sandbox workers will be restarted (generation %d)", self._generation)
+
+    def call(self, module_name, func_name, kwargs, cpu_seconds=None, wall_seconds=None):
+        """
+        Runs module_name.func_name(**kwargs) in a worker and returns its result.
+
+        Raises:
+            ToolTimeoutError: If the call went over the wall clock limit.
+            ToolCrashedError: If the worker died (CPU or memory limit, segfault, os._exit, ...).
+            ToolSandboxError: If the tool raised an exception.
+        """
+        cpu_seconds = self.cpu_seconds if cpu_seconds is None else cpu_seconds
+        wall_seconds = self.wall_seconds if wall_seconds is None else wall_seconds
+        worker = self._acquire()
+        start = time.monotonic()
+        try:
+            worker.conn.send((module_name, func_name, kwargs, cpu_seconds))
+            if not worker.conn.poll(wall_seconds):
+                worker.kill()
+                worker = self._spawn()
+                raise ToolTimeoutError(f"Tool '{func_name}' killed after {wall_seconds}s wall clock limit")
+            reply = worker.conn.recv()
+            if reply[0] == "memory":
+                # The worker exits by itself after a MemoryError
+                worker.kill()
+                worker = self._spawn()
+        except (EOFError, OSError, BrokenPipeError):
+            worker.process.join(timeout=1)
+            code = worker.process.exitcode
+            worker.kill()
+            worker = self._spawn()
+            raise ToolCrashedError(f"Tool '{func_name}' worker died (exit code {code}), "
+                                   f"probably over the {cpu_seconds}s CPU or {self.memory_mb}MB memory limit")
+        finally:
+            self._release(worker)
+        logger.debug("Sandboxed %s.%s took %.3fs", module_name, func_name, time.monotonic() - start)
+
+        status = reply[0]
+        if status == "ok":
+            return reply[1]
+        if status == "memory":
+            raise ToolCrashedError(reply[1])
+        logger.debug("Sandboxed tool traceback:\n%s", reply[2])
+        raise ToolSandboxError(reply[1])
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                break
@@ -0,0 +1,284 @@
+# JSON schemas and argument validation for tools, built once per tool from its full type hints.
+# - function_declaration(func) describes a tool with accurate nested schemas (Optional, Union, Literal,
+#   typed lists and dicts) for both the Gemini and the OpenAI compatible (Ollama) handlers
+# - ToolSpec.validate(args) checks the arguments sent by the model before the tool runs, coerces the
+#   safe cases (numeric strings, 5.0 for an int, "true" for a bool, JSON strings for lists/dicts, a
+#   single value for a list) and otherwise returns one compact error listing every problem and the
+#   expected signature, so the model can fix all of them in its next turn
+
+import enum
+import inspect
+import json
+import logging
+import re
+import types as py_types
+import typing
+
+logger = logging.getLogger(__name__)
+
+_NONE_TYPE = type(None)
+_INT_RE = re.compile(r"[+-]?\d+")
+_FLOAT_RE = re.compile(r"[+-]?(\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?")
+_PRIMITIVES = {str: "string", int: "integer", float: "number", bool: "boolean"}
+_UNIONS = (typing.Union, getattr(py_types, "UnionType", typing.Union))  # Optional[X] and X | None
+
+
+class ToolArgumentError(ValueError):
+    pass
+
+
+def parameter_descriptions(docstring):
+    """Descriptions of the parameters listed in the Args: section of a Google style docstring."""
+    descriptions = {}
+    if not docstring:
+        return descriptions
+    match = re.search(r"Args:\s*\n(.*?)(?=\n\s*(?:Returns|Raises|Yields|Examples?):|\Z)", docstring, re.DOTALL)
+    if not match:
+        return descriptions
+    current = None
+    for line in match.group(1).splitlines():
+        param = re.match(r"^\s*(\w+)\s*(?:\([^)]*\))?:\s*(.*)$", line)
+        if param and (current is None or len(line) - len(line.lstrip()) <= descriptions[current][1]):
+            current = param.group(1)
+            descriptions[current] = [param.group(2).strip(), len(line) - len(line.lstrip())]
+        elif current and line.strip():
+            descriptions[current][0] += " " + line.strip()
+    return {name: text for name, (text, _) in descriptions.items()}
+
+
+def _unwrap_optional(annotation):
+    args = typing.get_args(annotation)
+    if typing.get_origin(annotation) in _UNIONS and _NONE_TYPE in args:
+        rest = [a for a in args if a is not _NONE_TYPE]
+        return (rest[0] if len(rest) == 1 else typing.Union[tuple(rest)]), True
+    return annotation, False
+
+
+def json_schema(annotation):
+    """JSON schema of a type annotation ({} means any value)."""
+    if annotation is inspect.Parameter.empty or annotation is typing.Any:
+        return {}
+    inner, optional = _unwrap_optional(annotation)
+    if optional:
+        schema = json_schema(inner)
+        if isinstance(schema.get("type"), str):
+            return dict(schema, type=[schema["type"], "null"])
+        return {"anyOf": [schema, {"type": "null"}]} if schema else {}
+    if annotation in _PRIMITIVES:
+        return {"type": _PRIMITIVES[annotation]}
+    if annotation is _NONE_TYPE:
+        return {"type": "null"}
+    if inspect.isclass(annotation) and issubclass(annotation, enum.Enum):
+        return {"type": "string", "enum": [str(member.value) for member in annotation]}
+    origin, args = typing.get_origin(annotation), typing.get_args(annotation)
+    if annotation in (list, tuple, set) or origin in (list, tuple, set, frozenset):
+        schema = {"type": "array"}
+        if origin is tuple and args and args[-1] is not Ellipsis:
+            schema.update(prefixItems=[json_schema(a) for a in args], minItems=len(args), maxItems=len(args))
+        elif args:
+            schema["items"] = json_schema(args[0])
+        return schema
+    if annotation is dict or origin is dict:
+        schema = {"type": "object"}
+        if len(args) == 2 and json_schema(args[1]):
+            schema["additionalProperties"] = json_schema(args[1])
+        return schema
+    if origin is typing.Literal:
+        values = list(args)
+        types_ = {_PRIMITIVES.get(type(v)) for v in values}
+        schema = {"enum": values}
+        if len(types_) == 1 and None not in types_:
+            schema["type"] = types_.pop()
+        return schema
+    if origin in _UNIONS:
+        return {"anyOf": [json_schema(a) for a in args]}
+    # Any other class: the model can only send it as text
+    return {"type": "string"}
+
+
+def _type_name(schema):
+    if not schema:
+        return "any"
+    if "anyOf" in schema:
+        return " | ".join(_type_name(s) for s in schema["anyOf"])
+    if "enum" in schema:
+        return "one of " + ", ".join(json.dumps(v) for v in schema["enum"])
+    kind = schema.get("type")
+    if isinstance(kind, list):
+        return " | ".join(_type_name(dict(schema, type=k)) for k in kind)
+    if kind == "array" and "items" in schema:
+        return f"array of {_type_name(schema['items'])}"
+    if kind == "object" and "additionalProperties" in schema:
+        return f"object of {_type_name(schema['additionalProperties'])}"
+    return kind
+
+
+def _short(value, limit=40):
+    text = json.dumps(value, default=str)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def coerce(value, annotation, path="value"):
+    """
+    Converts value to the annotated type when that is unambiguous.
+
+    Raises:
+        ToolArgumentError: If the value does not match the type.
+    """
+    if annotation is inspect.Parameter.empty or annotation is typing.Any:
+        return value
+    inner, optional = _unwrap_optional(annotation)
+    if optional:
+        if value is None:
+            return None  # only a JSON null, "none" or "null" may well be the text meant
+        return coerce(value, inner, path)
+    if annotation is bool:
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.strip().lower() in ("true", "false"):
+            return value.strip().lower() == "true"
+        if isinstance(value, (int, float)) and value in (0, 1):
+            return bool(value)
+    elif annotation is int:
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+        if isinstance(value, float) and value.is_integer():
+            return int(value)  # JSON numbers from the API are often doubles
+        if isinstance(value, str) and _INT_RE.fullmatch(value.strip()):
+            return int(value.strip())
+    elif annotation is float:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+        if isinstance(value, str) and _FLOAT_RE.fullmatch(value.strip()):
+            return float(value.strip())
+    elif annotation is str:
+        if isinstance(value, str):
+            return value
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return str(value)
+    else:
+        origin, args = typing.get_origin(annotation), typing.get_args(annotation)
+        if inspect.isclass(annotation) and issubclass(annotation, enum.Enum):
+            for member in annotation:
+                if value == member.value or str(value) == str(member.value) or value == member.name:
+                    return member
+        elif annotation in (list, tuple, set) or origin in (list, tuple, set, frozenset):
+            if isinstance(value, str) and value.strip().startswith("["):
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    pass
+            if not isinstance(value, (list, tuple)):
+                value = [value]  # a single item where a list is expected
+            container = origin or annotation
+            if origin is tuple and args and args[-1] is not Ellipsis:
+                if len(value) != len(args):
+                    raise ToolArgumentError(f"{path}: expected {len(args)} items, got {len(value)}")
+                items = [coerce(v, a, f"{path}[{i}]") for i, (v, a) in enumerate(zip(value, args))]
+            else:
+                item_type = args[0] if args else inspect.Parameter.empty
+                items = [coerce(v, item_type, f"{path}[{i}]") for i, v in enumerate(value)]
+            return list(items) if container is list else container(items)
+        elif annotation is dict or origin is dict:
+            if isinstance(value, str) and value.strip().startswith("{"):
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    pass
+            if isinstance(value, dict):
+                if len(args) == 2:
+                    return {str(k): coerce(v, args[1], f"{path}.{k}") for k, v in value.items()}
+                return dict(value)
+        elif origin is typing.Literal:
+            for option in args:
+                if value == option or (isinstance(value, str) and str(option) == value):
+                    return option
+        elif origin in _UNIONS:
+            for option in args:
+                try:
+                    return coerce(value, option, path)
+                except ToolArgumentError:
+                    continue
+        else:
+            return value  # not something the schema can describe, let the tool decide
+    raise ToolArgumentError(f"{path}: expected {_type_name(json_schema(annotation))}, got {_short(value)}")
+
+
+class ToolSpec:
+    """Schema and argument validator of one tool, computed once when the tools are (re)loaded."""
+
+    def __init__(self, func):
+        self.func = func
+        self.name = func.__name__
+        signature = inspect.signature(func)
+        try:
+            hints = typing.get_type_hints(func)
+        except Exception:
+            hints = {}
+        doc = inspect.getdoc(func) or ""
+        described = parameter_descriptions(doc)
+        self.parameters = {}  # name -> (annotation, default)
+        properties = {}
+        required = []
+        for name, param in signature.parameters.items():
+            if param.kind in (inspect.Parameter.VAR_POSITIONAL, inspect.Parameter.VAR_KEYWORD):
+                continue
+            annotation = hints.get(name, param.annotation)
+            self.parameters[name] = (annotation, param.default)
+            schema = json_schema(annotation)
+            if name in described:
+                schema["description"] = described[name]
+            properties[name] = schema
+            if param.default is inspect.Parameter.empty:
+                required.append(name)
+        self.accepts_extra = any(p.kind is inspect.Parameter.VAR_KEYWORD for p in signature.parameters.values())
+        self.schema = {"type": "object", "properties": properties}
+        if required:
+            self.schema["required"] = required
+        self.description = doc.split("\n\n")[0].strip()
+        self.full_description = re.split(r"\n\s*Args:", doc)[0].strip() or self.description
+        self.usage = f"{self.name}(" + ", ".join(
+            f"{name}: {_type_name(properties[name])}" + ("" if name in required else " = optional")
+            for name in properties) + ")"
+
+    def declaration(self):
+        """Name, description and JSON schema of the parameters."""
+        return {"name": self.name, "description": self.full_description, "parameters": self.schema}
+
+    def openai_tool(self):
+        return {"type": "function", "function": {"name": self.name, "description": self.full_description,
+                                                 "parameters": self.schema}}
+
+    def validate(self, args):
+        """
+        Returns the coerced arguments.
+
+        Raises:
+            ToolArgumentError: With every problem found and the expected signature.
+        """
+        args = dict(args or {})
+        coerced = {}
+        errors = []
+        for name, (annotation, default) in self.parameters.items():
+            if name not in args:
+                if default is inspect.Parameter.empty:
+                    errors.append(f"{name}: missing required argument")
+                continue
+            try:
+                coerced[name] = coerce(args.pop(name), annotation, name)
+            except ToolArgumentError as e:
+                errors.append(str(e))
+        if args:
+            if self.accepts_extra:
+                coerced.update(args)
+            else:
+                # Usually a misspelled parameter, the value the model meant would otherwise be lost silently
+                errors.extend(f"{name}: unknown argument" for name in sorted(args))
+        if errors:
+            raise ToolArgumentError(f"Invalid arguments for {self.name}: {'; '.join(errors)}. "
+                                    f"Expected {self.usage}")
+        return coerced
+
+
+def function_declaration(func):
+    return ToolSpec(func).declaration()
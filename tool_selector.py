@@ -0,0 +1,86 @@
+# Per-turn tool subset selection.
+# The agent keeps adding tools to tools/, and every declaration is sent with every request. ToolSelector
+# builds a small TF-IDF index over the tool names and docstrings and picks the top-k tools that match the
+# task, plus a few pinned core tools and the tools already used. GeminiHandler selects once per task and then
+# only adds the tools the model calls, so the declarations stay stable and the prompt cache is reused.
+
+import inspect
+import math
+import re
+from collections import Counter
+
+DEFAULT_PINNED = ("create_file", "run_shell_command")
+
+_STOPWORDS = frozenset("""
+a an and are as at be by for from if in into is it its of on or that the this to was were will with
+you your returns return args arg true false none string str int bool list dict optional default given
+""".split())
+
+
+def tokenize(text):
+    # Splits snake_case and camelCase so "read_directory" and "readDirectory" both give read + directory
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", text).replace("_", " ").lower()
+    tokens = []
+    for word in re.findall(r"[a-z0-9]+", text):
+        if len(word) < 2 or word in _STOPWORDS:
+            continue
+        # Very light stemming, enough to match "files" with "file" and "lines" with "line"
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+class ToolSelector:
+    def __init__(self, top_k=8, pinned=DEFAULT_PINNED):
+        """
+        Args:
+            top_k: Number of tools picked by relevance (pinned and recently used tools come on top).
+            pinned: Names of the tools that are always attached.
+        """
+        self.top_k = top_k
+        self.pinned = set(pinned)
+        self._functions = []
+        self._vectors = []  # one sparse {term: weight} vector per tool, L2 normalized
+        self._idf = {}
+
+    def build(self, functions):
+        """(Re)builds the index, to be called whenever the tools are reloaded."""
+        self._functions = list(functions)
+        documents = []
+        for func in self._functions:
+            # The name is repeated so it weighs more than any single docstring word
+            doc = inspect.getdoc(func) or ""
+            documents.append(Counter(tokenize(func.__name__) * 3 + tokenize(doc)))
+        n = len(documents)
+        document_frequency = Counter(term for document in documents for term in document)
+        self._idf = {term: math.log((1 + n) / (1 + df)) + 1 for term, df in document_frequency.items()}
+        self._vectors = [self._weigh(document) for document in documents]
+
+    def _weigh(self, counts):
+        vector = {term: (1 + math.log(count)) * self._idf[term] for term, count in counts.items() if term in self._idf}
+        norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+        return {term: w / norm for term, w in vector.items()}
+
+    def scores(self, query):
+        """Cosine similarity between the query and every tool, in index order."""
+        query_vector = self._weigh(Counter(tokenize(query)))
+        return [sum(weight * vector.get(term, 0.0) for term, weight in query_vector.items())
+                for vector in self._vectors]
+
+    def select(self, query, recent_tools=()):
+        """
+        Returns the tools to attach, in their original order.
+
+        Args:
+            query: The task prompt.
+            recent_tools: Names of tools already called, always kept.
+        """
+        if len(self._functions) <= self.top_k + len(self.pinned):
+            return list(self._functions)
+        keep = self.pinned | set(recent_tools)
+        scores = self.scores(query)
+        ranked = sorted((i for i in range(len(self._functions)) if self._functions[i].__name__ not in keep),
+                        key=lambda i: scores[i], reverse=True)
+        chosen = {i for i in ranked[:self.top_k] if scores[i] > 0}
+        return [func for i, func in enumerate(self._functions) if i in chosen or func.__name__ in keep]
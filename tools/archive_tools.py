@@ -0,0 +1,37 @@
+# Access to the tool outputs that were too long for the conversation, see tool_archive.py
+
+import logging
+
+from tool_archive import default_archive
+
+logger = logging.getLogger(__name__)
+
+MAX_CHUNKS_PER_READ = 4
+
+
+def read_archive(handle: str, chunk: int = 0, count: int = 1) -> str:
+    """
+    Reads part of a tool output that was archived because it was too long (the result then has an 'archived' handle).
+
+    Args:
+        handle: The handle of the archived output, e.g. 'arc-3f2a9c0d1b7e4a5f'.
+        chunk: The first chunk to read, from 0 to the number of chunks minus 1.
+        count: The number of consecutive chunks to read (at most 4).
+
+    Returns:
+        A header with the chunk and line numbers followed by the text of the chunks, or an error message.
+    """
+    count = max(min(count, MAX_CHUNKS_PER_READ), 1)
+    try:
+        archive = default_archive()
+        index = archive.info(handle)
+        text = archive.read(handle, chunk, count)
+    except (KeyError, IndexError) as e:
+        return f"Error: {e.args[0]}"
+    except Exception as e:
+        return f"Error reading archive: {e}"
+    last = min(chunk + count, len(index["chunks"])) - 1
+    end_line = index["chunks"][last + 1]["line"] - 1 if last + 1 < len(index["chunks"]) else index["lines"]
+    logger.debug("read_archive %s chunks %d-%d", handle, chunk, last)
+    return (f"[{handle} ({index['label']}): chunks {chunk}-{last} of 0-{len(index['chunks']) - 1}, "
+            f"lines {index['chunks'][chunk]['line']}-{end_line} of {index['lines']}]\n{text}")
@@ -1,4 +1,8 @@
+import logging
 from typing import Union
+
+logger = logging.getLogger(__name__)
+
 def calculator(operation: str, number1: int, number2: int) -> Union[float, str]:
     """
     Performs a basic arithmetic operation between two numbers.
@@ -23,6 +27,6 @@ def calculator(operation: str, number1: int, number2: int) -> Union[float, str]:
         result = number1 / number2
     else:
         result = "Invalid operation"
-    print(result)
+    logger.debug("calculator %s(%s, %s) = %s", operation, number1, number2, result)
     
     return {"result:": result}
\ No newline at end of file
@@ -0,0 +1,177 @@
+# Many file changes in one tool call.
+# Every new content is first written to a temp file next to its target, all temp files are fsync'ed,
+# then they are renamed over their targets and each touched directory is fsync'ed once. If anything
+# fails before or during the renames, the files already replaced are put back, so a batch is applied
+# completely or not at all.
+
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+FSYNC = True
+
+
+def _fsync_dir(directory):
+    try:
+        fd = os.open(directory or ".", os.O_RDONLY)
+    except OSError:
+        return  # not supported on this platform
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _stage(target, content, append):
+    """Writes the future content of target to a temp file in the same directory and returns its path."""
+    directory = os.path.dirname(target) or "."
+    temp_path = os.path.join(directory, f".{os.path.basename(target)}.{uuid.uuid4().hex[:12]}.tmp")
+    # Created 0666 minus the umask, as open() would create the target (mkstemp would make it 0600)
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if append and os.path.exists(target):
+                with open(target, "rb") as original:
+                    shutil.copyfileobj(original, f, 1024 * 1024)
+            f.write(content.encode("utf-8"))
+            f.flush()
+            if FSYNC:
+                os.fsync(f.fileno())
+        if os.path.exists(target):
+            shutil.copymode(target, temp_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return temp_path
+
+
+def _backup(target):
+    """Keeps the current version of target reachable (hard link, or copy) until the batch is committed."""
+    if not os.path.exists(target):
+        return None
+    directory = os.path.dirname(target) or "."
+    fd, backup_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(target)}.", suffix=".bak")
+    os.close(fd)
+    os.unlink(backup_path)
+    try:
+        os.link(target, backup_path)
+    except OSError:
+        shutil.copy2(target, backup_path)
+    return backup_path
+
+
+def write_files(files: Dict[str, str], appends: Optional[Dict[str, str]] = None,
+                deletes: Optional[List[str]] = None) -> str:
+    """
+    Creates, overwrites, appends to and deletes many files in one call. Use it instead of calling create_file once
+    per file when scaffolding a project or making a change that touches several files. The changes are applied
+    atomically: either all of them are written, or none is.
+
+    Args:
+        files: Mapping of file path to the full content to write. Parent directories are created if they do not exist.
+        appends: Optional mapping of file path to text to append at the end of the file (created if missing).
+        deletes: Optional list of file paths to delete.
+
+    Returns:
+        A compact summary with one line per changed file, or the error that stopped the batch (nothing is changed then).
+    """
+    files = files or {}
+    appends = appends or {}
+    deletes = deletes or []
+    changes = [(path, content, False) for path, content in files.items()]
+    changes += [(path, content, True) for path, content in appends.items()]
+
+    seen = set()
+    for path in [c[0] for c in changes] + list(deletes):
+        normalized = os.path.normpath(os.path.abspath(path))
+        if normalized in seen:
+            return f"Error: {path} appears more than once in the batch, nothing was changed."
+        seen.add(normalized)
+    for path, _, _ in changes:
+        if os.path.isdir(path):
+            return f"Error: {path} is a directory. Nothing was changed."
+    for path in deletes:
+        if not os.path.isfile(path):
+            return f"Error: cannot delete {path}, it is not a file. Nothing was changed."
+    if not changes and not deletes:
+        return "Nothing to do."
+
+    staged = []  # (target, temp_path, backup_path, append, size)
+    backups = []  # (target, backup_path) of deleted files
+    committed = []  # targets already replaced
+    directories = set()
+    created_directories = []  # parents created by this call, removed again on rollback
+    try:
+        for directory in sorted({os.path.dirname(path) for path, _, _ in changes} - {""}):
+            missing = []
+            parent = directory
+            while parent and not os.path.isdir(parent):
+                missing.append(parent)
+                parent = os.path.dirname(parent)
+            for new_directory in reversed(missing):
+                try:
+                    os.mkdir(new_directory)
+                except FileExistsError:
+                    continue  # created concurrently, not ours to remove
+                created_directories.append(new_directory)
+        for path, content, append in changes:
+            temp_path = _stage(path, content, append)
+            try:
+                backup_path = _backup(path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+            staged.append((path, temp_path, backup_path, append, len(content.encode("utf-8"))))
+        for path in deletes:
+            backups.append((path, _backup(path)))
+
+        # Commit: renames are atomic, and are undone if one of them fails
+        for path, temp_path, _, _, _ in staged:
+            os.replace(temp_path, path)
+            committed.append(path)
+            directories.add(os.path.dirname(path))
+        for path, _ in backups:
+            os.unlink(path)
+            committed.append(path)
+            directories.add(os.path.dirname(path))
+    except Exception as e:
+        for path, temp_path, backup_path, _, _ in staged:
+            if path in committed:
+                if backup_path:
+                    os.replace(backup_path, path)
+                else:
+                    os.unlink(path)
+            elif os.path.exists(temp_path):
+                os.unlink(temp_path)
+        for path, backup_path in backups:
+            if path in committed:
+                os.replace(backup_path, path)
+        for backup_path in [s[2] for s in staged] + [b[1] for b in backups]:
+            if backup_path and os.path.exists(backup_path):
+                os.unlink(backup_path)
+        for directory in reversed(created_directories):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+        logger.debug("write_files rolled back: %s", e)
+        return f"Error: {e}. Nothing was changed."
+
+    if FSYNC:
+        for directory in directories:
+            _fsync_dir(directory)
+    for backup_path in [s[2] for s in staged] + [b[1] for b in backups]:
+        if backup_path:
+            os.unlink(backup_path)
+
+    lines = [f"Committed {len(staged) + len(backups)} changes:"]
+    for path, _, backup_path, append, size in staged:
+        action = "appended" if append else ("overwritten" if backup_path else "created")
+        lines.append(f"  {path}: {action} ({size} bytes)")
+    lines.extend(f"  {path}: deleted" for path, _ in backups)
+    return "\n".join(lines)
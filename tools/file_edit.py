@@ -1,6 +1,9 @@
 from typing import Tuple
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 def edit_file_lines(file_path: str, start_line: int, end_line: int, new_content: str) -> str:
     """
     Edits specific lines in a file, replacing them with new content.
@@ -14,7 +17,7 @@ def edit_file_lines(file_path: str, start_line: int, end_line: int, new_content:
     Returns:
         A string message indicating success or the error encountered.
     """
-    print(f"[DEBUG] edit_file_lines called for: {file_path}, lines {start_line}-{end_line}")
+    logger.debug("edit_file_lines called for: %s, lines %s-%s", file_path, start_line, end_line)
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
             lines = f.readlines()
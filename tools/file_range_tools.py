@@ -0,0 +1,195 @@
+# Random access reading of (possibly huge) text files.
+# A sparse line index is built once per file version (path + size + mtime): the file is mmap'ed and for
+# every INDEX_STEP bytes the line number and offset of the next line start are recorded (newlines are
+# counted with bytes.count, which runs in C). A line window is then found with a bisect plus a scan of at
+# most INDEX_STEP bytes, so reading lines 5_000_000-5_000_050 of a multi-GB log costs about as much as
+# reading lines 1-50 of a small file.
+
+import bisect
+import logging
+import mmap
+import os
+import re
+from array import array
+from collections import OrderedDict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+INDEX_STEP = 64 * 1024  # bytes between two index checkpoints
+MAX_WINDOW_LINES = 2000  # longest window returned by one call
+MAX_LINE_CHARS = 2000  # longer lines are cut
+MAX_CACHED_INDEXES = 32
+
+_indexes = OrderedDict()  # abspath -> _LineIndex
+
+
+class _LineIndex:
+    def __init__(self, path, version):
+        self.version = version
+        self.lines = array("q", [1])  # line number at each checkpoint
+        self.offsets = array("q", [0])  # byte offset of that line
+        self.total_lines = 0
+        size = version[0]
+        if size == 0:
+            return
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            line = 1
+            position = 0
+            while position < size:
+                end = min(position + INDEX_STEP, size)
+                line += mm[position:end].count(b"\n")
+                if end < size:
+                    # Checkpoint on the first line starting at or after `end`
+                    newline = mm.find(b"\n", end)
+                    if newline == -1:
+                        position = size
+                        break
+                    line += mm[end:newline + 1].count(b"\n")
+                    self.lines.append(line)
+                    self.offsets.append(newline + 1)
+                    position = newline + 1
+                else:
+                    position = end
+            ends_with_newline = mm[size - 1:size] == b"\n"
+        self.total_lines = line - 1 if ends_with_newline else line
+
+    def locate(self, line_number):
+        """Returns (line, offset) of the last checkpoint at or before line_number."""
+        i = bisect.bisect_right(self.lines, line_number) - 1
+        return self.lines[i], self.offsets[i]
+
+    def line_of_offset(self, mm, offset):
+        i = bisect.bisect_right(self.offsets, offset) - 1
+        return self.lines[i] + mm[self.offsets[i]:offset].count(b"\n")
+
+
+def _get_index(path):
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    version = (st.st_size, st.st_mtime_ns, st.st_ino)
+    index = _indexes.get(path)
+    if index is None or index.version != version:
+        index = _LineIndex(path, version)
+        _indexes[path] = index
+        logger.debug("Built line index of %s: %d lines, %d checkpoints", path, index.total_lines, len(index.lines))
+    _indexes.move_to_end(path)
+    while len(_indexes) > MAX_CACHED_INDEXES:
+        _indexes.popitem(last=False)
+    return index
+
+
+def _format_line(number, raw):
+    text = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+    if len(text) > MAX_LINE_CHARS:
+        text = text[:MAX_LINE_CHARS] + f"... [{len(text) - MAX_LINE_CHARS} more characters]"
+    return f"{number}: {text}"
+
+
+def _read_lines(mm, index, start_line, end_line):
+    checkpoint_line, offset = index.locate(start_line)
+    size = len(mm)
+    for _ in range(start_line - checkpoint_line):
+        newline = mm.find(b"\n", offset)
+        offset = size if newline == -1 else newline + 1
+    lines = []
+    for number in range(start_line, end_line + 1):
+        if offset >= size:
+            break
+        newline = mm.find(b"\n", offset)
+        end = size if newline == -1 else newline + 1
+        lines.append(_format_line(number, mm[offset:end]))
+        offset = end
+    return lines
+
+
+def read_file_range(file_path: str, start_line: int, end_line: int) -> str:
+    """
+    Reads a window of lines from a text file, with line numbers, without loading the whole file. Use it instead of
+    read_directory for large files (logs, data files) or when only a part of a file is needed.
+
+    Args:
+        file_path: The path of the file to read.
+        start_line: The first line to return (1-indexed, inclusive).
+        end_line: The last line to return (1-indexed, inclusive). At most 2000 lines are returned per call.
+
+    Returns:
+        The requested lines formatted as 'line_number: content', preceded by a header with the total number of lines,
+        or an error message.
+    """
+    try:
+        index = _get_index(file_path)
+        total = index.total_lines
+        start_line = max(1, int(start_line))
+        end_line = min(int(end_line), total, start_line + MAX_WINDOW_LINES - 1)
+        header = f"{file_path} ({total} lines), lines {start_line}-{end_line}:"
+        if total == 0 or start_line > total:
+            return f"{file_path} has {total} lines, nothing to show from line {start_line}."
+        with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            lines = _read_lines(mm, index, start_line, end_line)
+        return header + "\n" + "\n".join(lines)
+    except Exception as e:
+        return f"Error reading file range: {e}"
+
+
+def search_file(file_path: str, pattern: str, regex: bool = False, max_results: int = 50, context_lines: int = 0,
+                start_line: Optional[int] = None) -> str:
+    """
+    Searches a text file for a string or regular expression and returns the matching lines with their line numbers,
+    without loading the whole file.
+
+    Args:
+        file_path: The path of the file to search.
+        pattern: The text to look for (or a Python regular expression if regex is True).
+        regex: If True the pattern is a regular expression, otherwise it is matched literally.
+        max_results: The maximum number of matching lines to return.
+        context_lines: Number of lines to show before and after each match.
+        start_line: Optional line number to start searching from (1-indexed), to continue a previous search.
+
+    Returns:
+        The matching lines formatted as 'line_number: content' (context blocks separated by '--'), or a message
+        saying nothing was found, or an error message.
+    """
+    try:
+        index = _get_index(file_path)
+        # MULTILINE: ^ and $ match at line boundaries, the search starts at an offset inside the file
+        compiled = re.compile(pattern.encode() if regex else re.escape(pattern.encode()), re.MULTILINE)
+        blocks = []
+        last_shown = 0
+        last_match = 0
+        matches = 0
+        with open(file_path, "rb") as f:
+            if index.version[0] == 0:
+                return f"No match for '{pattern}' in {file_path} (empty file)."
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                position = 0
+                if start_line and start_line > 1:
+                    checkpoint_line, position = index.locate(start_line)
+                    for _ in range(start_line - checkpoint_line):
+                        newline = mm.find(b"\n", position)
+                        position = len(mm) if newline == -1 else newline + 1
+                while matches < max_results:
+                    match = compiled.search(mm, position)
+                    if match is None:
+                        break
+                    line_start = mm.rfind(b"\n", 0, match.start()) + 1
+                    line_number = index.line_of_offset(mm, line_start)
+                    first = max(line_number - context_lines, last_shown + 1)
+                    last = line_number + context_lines
+                    lines = _read_lines(mm, index, first, last)
+                    if blocks and context_lines and first > last_shown + 1:
+                        blocks.append("--")
+                    blocks.extend(lines)
+                    last_shown = max(last_shown, first + len(lines) - 1)
+                    last_match = line_number
+                    matches += 1
+                    newline = mm.find(b"\n", match.start())
+                    position = len(mm) if newline == -1 else newline + 1
+        if not blocks:
+            return f"No match for '{pattern}' in {file_path}."
+        # Continue after the last match, not after its context: matches in the context were not counted
+        more = f" (stopped after {max_results} matches, continue with start_line={last_match + 1})" \
+            if matches == max_results else ""
+        return f"{matches} matching lines in {file_path}{more}:\n" + "\n".join(blocks)
+    except Exception as e:
+        return f"Error searching file: {e}"
@@ -1,10 +1,10 @@
 # This file is used to read all the files in a directory, including subdirectories
 
+import logging
 import os
-import sys
 from typing import Dict, Any, Optional
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-print(os.path.dirname(__file__))
+
+logger = logging.getLogger(__name__)
 
 # Directory tree or folder hierarchy.
 def create_structure(path: Optional[str], prefix: str, respect_gitignore: bool) -> str:
@@ -19,7 +19,7 @@ def create_structure(path: Optional[str], prefix: str, respect_gitignore: bool)
     Returns:
         A string representing the directory tree structure.
     """
-    print(f"[DEBUG] create_structure called for: path={path}, prefix={prefix}, respect_gitignore={respect_gitignore}")
+    logger.debug("create_structure called for: path=%s, prefix=%s, respect_gitignore=%s", path, prefix, respect_gitignore)
     if not path:
         # Assume project root is two levels up from this file (agent_folder/tools/ -> Project_SYNTAX/)
         path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
@@ -68,14 +68,14 @@ def read_directory(path: str, add_line_numbers: bool) -> Dict[str, Any]:
     Returns:
         A dictionary mapping file paths to a tuple of (filename, content).
     """
-    print(f"[DEBUG] read_directory called for: path={path}, add_line_numbers={add_line_numbers}")
+    logger.debug("read_directory called for: path=%s, add_line_numbers=%s", path, add_line_numbers)
     information = {}
     
     # Check if path is a file instead of a directory
     if os.path.isfile(path):
         # Add check to ignore .DS_Store if the path is a single file
         if os.path.basename(path) == ".DS_Store":
-            print(f"Skipping .DS_Store file at: {path}")
+            logger.debug("Skipping .DS_Store file at: %s", path)
             return information # Return empty if it's a .DS_Store file
 
         with open(path, "r") as f:
@@ -92,16 +92,15 @@ def read_directory(path: str, add_line_numbers: bool) -> Dict[str, Any]:
     for directory in os.listdir(path):
         # Add check to ignore .DS_Store
         if directory == ".DS_Store":
-            print(f"Skipping .DS_Store directory entry: {os.path.join(path, directory)}")
+            logger.debug("Skipping .DS_Store directory entry: %s", os.path.join(path, directory))
             continue
 
         full_path = os.path.join(path, directory)
-        print(directory)
         if os.path.isdir(full_path):
             info = read_directory(full_path, add_line_numbers)
             information.update(info)
         else:
-            print(full_path)
+            logger.debug("Reading %s", full_path)
             with open(full_path, "r") as f:
                 content = f.read()
                 if add_line_numbers:
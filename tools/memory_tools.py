@@ -0,0 +1,57 @@
+# Long-term memory tools, backed by the vector store in memory_store.py
+
+import logging
+from typing import Any, Dict, List, Optional
+
+from memory_store import MemoryStore
+
+logger = logging.getLogger(__name__)
+
+_store = None
+
+
+def _get_store() -> MemoryStore:
+    global _store
+    if _store is None:
+        _store = MemoryStore()
+    return _store
+
+
+def save_memory(text: str, kind: str = "note", tags: Optional[List[str]] = None) -> str:
+    """
+    Saves a piece of information to long-term memory so it can be recalled in later tasks.
+
+    Args:
+        text: The information to remember. Write it so it is understandable without any other context.
+        kind: The category of the memory, e.g. 'note', 'fact', 'task_outcome' or 'lesson'.
+        tags: Optional list of short keywords describing the memory.
+
+    Returns:
+        A message with the id of the saved memory, or an error message.
+    """
+    try:
+        memory_id = _get_store().add(text, kind=kind, metadata={"tags": tags or []})
+        logger.debug("Saved memory %d (%s)", memory_id, kind)
+        return f"Memory saved with id {memory_id}."
+    except Exception as e:
+        return f"Error saving memory: {e}"
+
+
+def recall_memories(query: str, top_k: int = 5, kind: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Searches long-term memory for the memories most similar to the query.
+
+    Args:
+        query: What to look for, in natural language.
+        top_k: The maximum number of memories to return.
+        kind: If given, only memories of this category are returned (e.g. 'task_outcome').
+
+    Returns:
+        A list of memories, most relevant first, each with id, kind, text, tags, timestamp and similarity score.
+    """
+    try:
+        results = _get_store().search(query, top_k=top_k, kind=kind)
+    except Exception as e:
+        return [{"error": f"Error recalling memories: {e}"}]
+    return [{"id": r["id"], "kind": r["kind"], "text": r["text"], "tags": r["metadata"].get("tags", []),
+             "timestamp": r["ts"], "score": r["score"]} for r in results]
@@ -0,0 +1,88 @@
+# Workspace snapshot tools, backed by snapshot_store.py. The handler takes a snapshot before every turn
+# that writes files, these tools let the model inspect and roll back those changes. Both use the same store.
+
+import logging
+from typing import Any, Dict, List, Optional
+
+from snapshot_store import default_store
+
+logger = logging.getLogger(__name__)
+
+
+def list_snapshots(limit: int = 20) -> List[Dict[str, Any]]:
+    """
+    Lists the most recent workspace snapshots. A snapshot is taken automatically before every turn that writes files.
+
+    Args:
+        limit: The maximum number of snapshots to return, most recent first.
+
+    Returns:
+        A list of snapshots, each with id, timestamp, label (what it was taken before) and number of files.
+    """
+    try:
+        snapshots = default_store().list_snapshots()
+    except Exception as e:
+        return [{"error": f"Error listing snapshots: {e}"}]
+    return list(reversed(snapshots))[:limit]
+
+
+def take_snapshot(label: str = "") -> str:
+    """
+    Takes a snapshot of the workspace now, e.g. before a risky change.
+
+    Args:
+        label: A short description of why the snapshot was taken.
+
+    Returns:
+        The id of the snapshot, or an error message.
+    """
+    try:
+        return f"Snapshot {default_store().snapshot(label=label)} taken."
+    except Exception as e:
+        return f"Error taking snapshot: {e}"
+
+
+def diff_snapshot(snapshot_id: str, other_id: Optional[str] = None, show_patch: bool = False,
+                  path: Optional[str] = None) -> str:
+    """
+    Shows what changed between a snapshot and the current workspace (or another, later snapshot).
+
+    Args:
+        snapshot_id: The id of the older snapshot.
+        other_id: The id of the newer snapshot. If omitted the snapshot is compared with the current files.
+        show_patch: If True a unified diff of the changed text files is included.
+        path: If given, only this file (relative path) is diffed.
+
+    Returns:
+        The added, removed and modified files and optionally the unified diff, or an error message.
+    """
+    try:
+        store = default_store()
+        changes = store.diff(snapshot_id, other_id)
+        lines = [f"{kind}: {', '.join(paths) if paths else '-'}" for kind, paths in changes.items()]
+        if show_patch:
+            lines.append(store.patch(snapshot_id, other_id, path=path))
+        return "\n".join(lines)
+    except Exception as e:
+        return f"Error diffing snapshot: {e}"
+
+
+def restore_snapshot(snapshot_id: str, paths: Optional[List[str]] = None, delete_new: bool = False) -> str:
+    """
+    Rolls the workspace back to a snapshot. The current state is snapshotted first, so a restore can be undone too.
+
+    Args:
+        snapshot_id: The id of the snapshot to restore.
+        paths: Optional list of files or directories (relative paths) to restore. By default everything is restored.
+        delete_new: If True the files created after the snapshot (within paths) are deleted too.
+
+    Returns:
+        The restored and deleted files, or an error message.
+    """
+    try:
+        result = default_store().restore(snapshot_id, paths=paths, delete_new=delete_new)
+        logger.debug("Restored snapshot %s", snapshot_id)
+        return (f"Snapshot {snapshot_id} restored. Rewritten: {', '.join(result['restored']) or '-'}. "
+                f"Deleted: {', '.join(result['deleted']) or '-'}.")
+    except Exception as e:
+        return f"Error restoring snapshot: {e}"
@@ -1,8 +1,28 @@
 import subprocess
 import os
+from collections import deque
 from typing import Optional
 
 TERMINAL_LOG_FILE = "terminal_output.log"
+# With the tool archive on, longer outputs are stored compressed in it and the log keeps their head, tail
+# and handle. Otherwise the log gets the full output
+LOG_INLINE_CHARS = 4000
+
+
+def _log_text(command, output):
+    if len(output) <= LOG_INLINE_CHARS:
+        return output
+    try:
+        from tool_archive import default_archive, tool_archive_enabled
+        if not tool_archive_enabled():
+            return output
+        # Stripped like the tool's result, so an archive of the result by the handler is the same entry
+        handle = default_archive().put(output.strip(), label=f"$ {command}")
+    except Exception:
+        return output
+    head, tail = output[:LOG_INLINE_CHARS // 2], output[-LOG_INLINE_CHARS // 4:]
+    return (f"{head}\n[... {len(output)} characters in total, archived as {handle}, "
+            f"read it with read_archive ...]\n{tail}")
 
 
 def run_shell_command(command: str, use_sudo: bool = False, sudo_password: Optional[str] = None, sudo_user: str = "root") -> str:
@@ -32,7 +52,7 @@ def run_shell_command(command: str, use_sudo: bool = False, sudo_password: Optio
         output = result.stdout + result.stderr
         # Log the output
         with open(TERMINAL_LOG_FILE, "a", encoding="utf-8") as log:
-            log.write(f"$ {command}\n{output}\n")
+            log.write(f"$ {command}\n{_log_text(command, output)}\n")
         return output.strip()
     except Exception as e:
         return f"Error running command: {e}"
@@ -52,7 +72,8 @@ def read_terminal_output(last_n_lines: int = 20) -> str:
         return "No terminal output log found."
     try:
         with open(TERMINAL_LOG_FILE, "r", encoding="utf-8") as log:
-            lines = log.readlines()
-        return "".join(lines[-last_n_lines:]).strip()
+            # Only the last lines are kept in memory, however long the log is
+            lines = deque(log, maxlen=last_n_lines if last_n_lines > 0 else None)
+        return "".join(lines).strip()
     except Exception as e:
         return f"Error reading terminal output: {e}" 
\ No newline at end of file
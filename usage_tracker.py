@@ -0,0 +1,103 @@
+# Token and cost accounting.
+# Every model turn is recorded with its prompt, output and cached token counts, the task (solve_task
+# session) and the agent session it belongs to, the model, and whether it was triggered by tool results.
+# Rollups per task, per session and per model are kept incrementally, so reading them is O(1). A tracker
+# can be shared by several handlers and optionally appends every turn to a JSONL file.
+
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+TOKEN_FIELDS = ("prompt_tokens", "output_tokens", "cached_tokens", "total_tokens")
+
+
+def usage_from_gemini(usage_metadata):
+    """Token counts from a google-genai usage_metadata (missing counts are 0)."""
+    prompt = getattr(usage_metadata, "prompt_token_count", None) or 0
+    output = getattr(usage_metadata, "candidates_token_count", None) or 0
+    cached = getattr(usage_metadata, "cached_content_token_count", None) or 0
+    total = getattr(usage_metadata, "total_token_count", None) or prompt + output
+    return {"prompt_tokens": prompt, "output_tokens": output, "cached_tokens": cached, "total_tokens": total}
+
+
+def usage_from_openai(usage):
+    """Token counts from an OpenAI compatible (Ollama) usage object."""
+    prompt = getattr(usage, "prompt_tokens", None) or 0
+    output = getattr(usage, "completion_tokens", None) or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) or 0
+    total = getattr(usage, "total_tokens", None) or prompt + output
+    return {"prompt_tokens": prompt, "output_tokens": output, "cached_tokens": cached, "total_tokens": total}
+
+
+def _empty():
+    return {"turns": 0, "tool_turns": 0, "failed_call_turns": 0, "hedges": 0, **{field: 0 for field in TOKEN_FIELDS}}
+
+
+class UsageTracker:
+    def __init__(self, log_path=None):
+        """
+        Args:
+            log_path: Optional JSONL file receiving one record per turn.
+        """
+        self.log_path = log_path
+        self.tasks = defaultdict(_empty)
+        self.sessions = defaultdict(_empty)
+        self.models = defaultdict(_empty)
+        self.total = _empty()
+        self._lock = threading.Lock()
+
+    def record(self, usage, model, task=None, session=None, tool_triggered=False, tool_failed=False, hedge=False):
+        """
+        Records one model turn.
+
+        Args:
+            usage: Dict with the TOKEN_FIELDS (see usage_from_gemini / usage_from_openai).
+            model: Model that served the turn.
+            task: Id of the task (solve_task session id).
+            session: Id of the agent session (handler) running the task.
+            tool_triggered: True if the turn was sent to give tool results back to the model.
+            tool_failed: True if one of those tool calls failed (bad arguments, unknown tool, exception),
+                i.e. the turn was at least partly spent on fixing a call.
+            hedge: True for the duplicate of a slow request (see hedging.py): its tokens are counted but it is
+                not a turn of its own.
+        """
+        now = time.time()
+        with self._lock:
+            for bucket in (self.total, self.models[model],
+                           self.tasks[task] if task else None, self.sessions[session] if session else None):
+                if bucket is None:
+                    continue
+                bucket["hedges" if hedge else "turns"] += 1
+                bucket["tool_turns"] += 1 if tool_triggered and not hedge else 0
+                bucket["failed_call_turns"] += 1 if tool_failed and not hedge else 0
+                for field in TOKEN_FIELDS:
+                    bucket[field] += usage.get(field, 0)
+            if self.log_path:
+                record = {"ts": now, "model": model, "task": task, "session": session,
+                          "tool_triggered": tool_triggered, "tool_failed": tool_failed, "hedge": hedge, **usage}
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def task(self, task):
+        with self._lock:
+            return dict(self.tasks.get(task) or _empty())
+
+    def session(self, session):
+        with self._lock:
+            return dict(self.sessions.get(session) or _empty())
+
+    def summary(self):
+        with self._lock:
+            total = dict(self.total)
+            models = {model: dict(bucket) for model, bucket in self.models.items()}
+        lines = [f"{total['turns']} turns ({total['tool_turns']} after tool calls, {total['failed_call_turns']} after "
+                 f"failed calls): "
+                 f"{total['prompt_tokens']} prompt, {total['output_tokens']} output, {total['cached_tokens']} cached tokens"]
+        for model, bucket in sorted(models.items()):
+            lines.append(f"  {model}: {bucket['turns']} turns, {bucket['total_tokens']} tokens")
+        return "\n".join(lines)